@@ -0,0 +1 @@
+# Benchmarks for molpro_dirman - run from the molpro-dirman directory, eg: python -m benchmarks.walk
@@ -0,0 +1,120 @@
+# Memory per project and sort time for listings, as Paths with formatted timestamps vs the compact catalog - and
+# lookups answered from the mapped catalog file vs listings from the activity index, on a tree of --tree projects
+#
+#   PYTHONPATH=src python -m benchmarks.catalog [--projects 100000] [--tree 20000] [--runs 5]
+
+import gc
+import os
+import random
+import tempfile
+import argparse
+import tracemalloc
+from pathlib import Path
+
+from molpro_dirman.catalog import Catalog
+from molpro_dirman.catalog_file import CatalogFile
+from molpro_dirman.local_read import Project, format_timestamp
+
+from .prompt import time_ms
+
+ROOTS = (Path("/home/user/Projects"), Path("/mnt/archive/Projects"))
+PREFIXES = ("D", "DO", "HF", "T", "APJ", "ABCDEF")
+
+
+def listings(projects: int) -> list[tuple[Path, list[str]]]:
+  "Project names split over two roots, as listed"
+  rng = random.Random(0)
+  names = sorted({f"{rng.choice(PREFIXES)}-{rng.randrange(10_000_000):07d}" for _ in range(projects * 2)})[:projects]
+  return [(ROOTS[0], names[::2]), (ROOTS[1], names[1::2])]
+
+
+def timestamps(projects: int) -> list[tuple[float, bool]]:
+  rng = random.Random(1)
+  return [(rng.uniform(1.5e9, 1.8e9), True) for _ in range(projects)]
+
+
+def paths_listing(listed, activities) -> list[tuple[str, Path]]:
+  "As listings were held before the catalog - a Path per project, and its timestamp formatted for sorting"
+  paths = [root / name for root, names in listed for name in names]
+  for path in paths:
+    path.parts  # Cached on the Path by the first parts[-1]
+  return [(format_timestamp(ts), path) for (ts, _), path in zip(activities, paths)]
+
+
+def catalog_listing(listed, activities) -> Catalog:
+  catalog = Catalog.from_listings(listed)
+  catalog.set_activities(activities)
+  return catalog
+
+
+def bytes_per_project(build, projects: int) -> float:
+  "Memory allocated building a listing, per project - the inputs are built first, so aren't counted"
+  listed, activities = listings(projects), timestamps(projects)
+  gc.collect()
+  tracemalloc.start()
+  try:
+    result = build(listed, activities)
+    size, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  del result
+  return size / projects
+
+
+def lookups(projects: int, runs: int) -> dict[str, float]:
+  "ms per lookup on a tree of projects, from the catalog file and from the activity index's cached listings"
+  with tempfile.TemporaryDirectory() as tmp:
+    root = Path(tmp) / "Projects"
+    root.mkdir()
+    for _, names in listings(projects):
+      for name in names:
+        (root / name).mkdir()
+    os.environ.update({"MPDMAN_PROJECT_ROOTS": str(root), "MPDMAN_SYMLINK_DIRECTORY": tmp, "XDG_CACHE_HOME": f"{tmp}/cache"})
+    name = sorted(os.listdir(root))[projects // 2]
+    Project.catalog()  # Both caches built up front - only cache hits are timed
+    CatalogFile.load().close()
+
+    def from_file(lookup):
+      with CatalogFile.load() as catalog_file:
+        return lookup(catalog_file)
+
+    return {
+      "list names: activity index (ms)": time_ms(lambda: Project.catalog().names(), runs),
+      "list names: catalog file (ms)": time_ms(lambda: from_file(CatalogFile.names), runs),
+      "taken serials: activity index (ms)": time_ms(lambda: Project.catalog().serials("DO"), runs),
+      "taken serials: catalog file (ms)": time_ms(lambda: from_file(lambda f: f.serials("DO")), runs),
+      "is valid project: catalog file (ms)": time_ms(lambda: from_file(lambda f: f.contains(name)), runs),
+    }
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure project catalog memory and sort time")
+  parser.add_argument("--projects", type=int, default=100_000)
+  parser.add_argument("--tree", type=int, default=20_000, help="Projects created on disk for the lookup timings")
+  parser.add_argument("--runs", type=int, default=5)
+  args = parser.parse_args()
+
+  listed, activities = listings(args.projects), timestamps(args.projects)
+  old = paths_listing(listed, activities)
+  catalog = catalog_listing(listed, activities)
+
+  results = {
+    "memory: Paths + formatted timestamps (bytes / project)": bytes_per_project(paths_listing, args.projects),
+    "memory: catalog (bytes / project)": bytes_per_project(catalog_listing, args.projects),
+    "build: Paths + formatted timestamps (ms)": time_ms(lambda: paths_listing(listed, activities), args.runs),
+    "build: catalog (ms)": time_ms(lambda: catalog_listing(listed, activities), args.runs),
+    "sort: formatted timestamps, names (ms)": time_ms(
+      lambda: sorted(old, key=lambda r: (r[0], r[1].parts[-1]), reverse=True), args.runs
+    ),
+    "sort: catalog, numeric timestamps (ms)": time_ms(catalog.by_activity, args.runs),
+    "top 20: catalog (ms)": time_ms(lambda: catalog.by_activity(top=20), args.runs),
+  }
+  results.update(lookups(args.tree, args.runs))
+
+  print(f"{args.projects} projects in memory, {args.tree} on disk:")
+  for label, value in results.items():
+    print(f"  {label:<56} {value:10.2f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,162 @@
+# Time CLI commands against a synthetic tree, writing wall time / syscall counts / peak RSS to a JSON report
+#
+#   PYTHONPATH=src python -m benchmarks.commands [--preset medium] [--output report.json] [--compare old.json]
+#
+# Each run is forked from a process that has already imported the CLI, so the numbers cover the command itself
+# rather than interpreter startup (see benchmarks.startup for that). Syscalls made inside sqlite aren't counted.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+
+from molpro_dirman.config import Config
+from molpro_dirman.cli import app
+
+from .syscalls import count_syscalls
+from .tree import PRESETS, TreeSpec, build_tree, redirected_config
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+REPORT_VERSION = 1
+
+# In run order - commands that change the tree come last. Cold runs start with an empty cache directory.
+SCENARIOS = [
+  ("ls (cold)", ["ls"], True),
+  ("ls (warm)", ["ls"], False),
+  ("ls --top 10 (warm)", ["ls", "--top", "10"], False),
+  ("status (cold)", ["status"], True),
+  ("status (warm)", ["status"], False),
+  ("active (warm)", ["active"], False),
+  ("active --plain", ["active", "--plain"], False),
+  ("create", ["create", "--prefixes", "D", "--title", "Benchmark", "--description", "Created by benchmarks.commands"], False),
+  ("deactivate all", ["deactivate", "all"], False),
+]
+
+
+def run_command(argv: list[str]) -> dict:
+  "Run a CLI command in a forked child, returning its wall time, syscall counts and peak RSS"
+  read_fd, write_fd = os.pipe()
+  pid = os.fork()
+  if pid == 0:  # Child - run the command with output discarded, report back over the pipe
+    os.close(read_fd)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    status = 0
+    try:
+      with count_syscalls() as counts:
+        start = time.perf_counter()
+        try:
+          app(argv, prog_name="molpro_dirman", standalone_mode=False)
+        except Exception:
+          status = 1
+        elapsed = time.perf_counter() - start
+      os.write(write_fd, json.dumps({"seconds": elapsed, "ok": not status, "syscalls": dict(counts)}).encode())
+    finally:
+      os._exit(status)
+
+  os.close(write_fd)
+  with os.fdopen(read_fd) as fd:
+    data = fd.read()
+  _, _, rusage = os.wait4(pid, 0)
+  result = json.loads(data) if data else {"seconds": None, "ok": False, "syscalls": {}}
+  result["peak_rss_kb"] = rusage.ru_maxrss  # Kilobytes on Linux
+  return result
+
+
+def git_revision() -> str:
+  try:
+    return subprocess.run(
+      ["git", "describe", "--always", "--dirty"], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+
+def run_suite(spec: TreeSpec, runs: int) -> dict:
+  "Build a tree to the spec and run every scenario against it (best of n wall time), returning the report"
+  with tempfile.TemporaryDirectory() as tmp:
+    root = Path(tmp)
+    start = time.perf_counter()
+    tree = build_tree(root, spec)
+    tree["build_seconds"] = time.perf_counter() - start
+
+    results = {}
+    with redirected_config(root):
+      for label, argv, cold in SCENARIOS:
+        mutates = argv[0] in ("create", "deactivate")
+        best = None
+        for _ in range(1 if mutates else runs):  # Repeating these would measure a different tree
+          if cold:
+            shutil.rmtree(Config.cache_directory(), ignore_errors=True)
+          result = run_command(argv)
+          if best is None or (result["seconds"] or 0) < (best["seconds"] or 0):
+            best = result
+        results[label] = {"argv": argv, **best}
+
+  return {
+    "version": REPORT_VERSION,
+    "revision": git_revision(),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "spec": spec._asdict(),
+    "tree": tree,
+    "results": results,
+  }
+
+
+def print_report(report: dict, baseline: dict = None) -> None:
+  tree = report["tree"]
+  print(
+    f"{report['revision']}: {tree['projects']} projects, {tree['files']} files, {tree['symlinks']} symlinks "
+    f"(built in {tree['build_seconds']:.1f} s)"
+  )
+  for label, result in report["results"].items():
+    syscalls = sum(result["syscalls"].values())
+    line = f"  {label:<20} "
+    line += f"{result['seconds'] * 1000:9.1f} ms" if result["seconds"] is not None else "   crashed  "
+    line += f"  syscalls={syscalls:<8} rss={result['peak_rss_kb'] / 1024:6.1f} MiB"
+    before = (baseline or {}).get("results", {}).get(label)
+    if before and before["seconds"] and result["seconds"]:
+      line += f"  ({before['seconds'] / result['seconds']:.2f}x vs {baseline['revision']})"
+    if not result["ok"]:
+      line += "  FAILED"
+    print(line)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Time CLI commands against a synthetic project tree")
+  parser.add_argument("--preset", choices=PRESETS, default="medium")
+  parser.add_argument("--projects", type=int, help="Override the preset's project count")
+  parser.add_argument("--files", type=int, help="Override the preset's files per project")
+  parser.add_argument("--depth", type=int, help="Override the preset's directory depth")
+  parser.add_argument("--symlinks", type=int, help="Override the preset's aux symlink count")
+  parser.add_argument("--runs", type=int, default=3, help="Best of n, for commands that don't change the tree")
+  parser.add_argument("--output", type=Path, help="Write the JSON report here")
+  parser.add_argument("--compare", type=Path, help="A previous JSON report to compare against")
+  args = parser.parse_args()
+
+  overrides = {
+    field: value for field, value in (
+      ("projects", args.projects), ("files_per_project", args.files), ("depth", args.depth), ("symlinks", args.symlinks),
+    ) if value is not None
+  }
+  spec = PRESETS[args.preset]._replace(**overrides)
+  baseline = json.loads(args.compare.read_text()) if args.compare else None
+  if baseline and baseline["spec"] != spec._asdict():
+    print("Warning: the baseline report was made with a different tree spec", file=sys.stderr)
+
+  report = run_suite(spec, args.runs)
+  print_report(report, baseline)
+  if args.output:
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+  main()
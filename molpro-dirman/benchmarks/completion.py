@@ -0,0 +1,72 @@
+# Latency of shell completion for project names, in-process (cached / uncached) and as a whole process
+#
+#   PYTHONPATH=src python -m benchmarks.completion [--runs 20] [--projects 10000]
+
+import os
+import sys
+import random
+import argparse
+import tempfile
+import compileall
+import subprocess
+from pathlib import Path
+
+import molpro_dirman
+from molpro_dirman.completion import complete_projects, default_cache_file
+
+from .prompt import time_ms
+
+# Completions are requested on every tab press, so a whole process answering one should stay under this
+PROCESS_BUDGET_MS = 30
+TITLE_WORDS = ("motor", "controller", "enclosure", "fursuit", "laser", "stand", "sensor", "board", "pump", "gearbox")
+
+
+def build_home(home: Path, projects: int) -> None:
+  "A fake home dir holding projects with READMEs, as created by mpdman"
+  rng = random.Random(0)
+  for n in range(projects):
+    project = home / "Projects" / f"{rng.choice(('D', 'DO', 'HF', 'T'))}-{n:07d}"
+    project.mkdir(parents=True)
+    (project / "README.md").write_text(f"# {' '.join(rng.sample(TITLE_WORDS, 2)).title()}\n## {project.name}\n")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure shell completion latency")
+  parser.add_argument("--runs", type=int, default=20)
+  parser.add_argument("--projects", type=int, default=10_000)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    home = Path(tmp)
+    build_home(home, args.projects)
+    env = {**os.environ, "HOME": str(home), "XDG_CACHE_HOME": str(home / ".cache")}
+    os.environ.update(env)
+    cache_file = default_cache_file()
+
+    def uncached():
+      os.remove(cache_file) if os.path.exists(cache_file) else None
+      complete_projects("42")
+
+    results = {"in-process, uncached": time_ms(uncached, max(args.runs // 5, 3))}
+    for typed in ("", "do-00042", "42", "motor"):
+      results[f"in-process, cached: {typed!r}"] = time_ms(lambda: complete_projects(typed), args.runs)
+
+    def run(*command, **extra_env):
+      subprocess.run([sys.executable, *command], env={**env, **extra_env}, check=True, capture_output=True)
+
+    compileall.compile_dir(os.path.dirname(molpro_dirman.__file__), quiet=1)  # As installed - not recompiled per run
+    results["process: python -c pass (interpreter floor)"] = time_ms(lambda: run("-c", "pass"), args.runs)
+    results["process: bash completion of 'activate 42'"] = time_ms(lambda: run(
+      "-m", "molpro_dirman", _MOLPRO_DIRMAN_COMPLETE="complete_bash", COMP_WORDS="molpro_dirman activate 42", COMP_CWORD="2",
+    ), args.runs)
+
+  for label, ms in results.items():
+    print(f"  {label:<50} {ms:8.2f} ms")
+
+  if results["process: bash completion of 'activate 42'"] > PROCESS_BUDGET_MS:
+    print(f"Completion exceeded {PROCESS_BUDGET_MS} ms budget!")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,79 @@
+# Latency of the shell prompt segment, in-process (cached / uncached) and as a whole process
+#
+#   PYTHONPATH=src python -m benchmarks.prompt [--runs 50] [--dotfiles 2000]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from statistics import median
+
+from molpro_dirman.prompt import prompt_segment
+
+# Shell prompts redraw on every command, so the cached segment should be effectively free
+CACHED_BUDGET_MS = 10
+
+
+def build_home(home: Path, dotfiles: int) -> None:
+  "A fake home dir with an active project, an aux project, and plenty of unrelated clutter"
+  for name in ("DO-4256663", "T-1234567"):
+    (home / "Projects" / name).mkdir(parents=True)
+  os.symlink(home / "Projects" / "DO-4256663", home / "current_project")
+  os.symlink(home / "Projects" / "T-1234567", home / "project_T-1234567")
+  for n in range(dotfiles):
+    (home / f".dotfile_{n}").touch()
+
+
+def time_ms(func, runs: int) -> float:
+  samples = []
+  for _ in range(runs):
+    start = time.perf_counter()
+    func()
+    samples.append((time.perf_counter() - start) * 1000)
+  return median(samples)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure shell prompt segment latency")
+  parser.add_argument("--runs", type=int, default=50)
+  parser.add_argument("--dotfiles", type=int, default=2000)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    home = Path(tmp)
+    build_home(home, args.dotfiles)
+    env = {**os.environ, "HOME": str(home), "XDG_CACHE_HOME": str(home / ".cache")}
+    os.environ.update(env)
+    cache_file = str(home / ".cache" / "molpro_dirman" / "prompt")
+
+    def uncached():
+      os.remove(cache_file) if os.path.exists(cache_file) else None
+      prompt_segment(show_aux=True, cache_file=cache_file)
+
+    results = {
+      "in-process, uncached": time_ms(uncached, args.runs),
+      "in-process, cached": time_ms(lambda: prompt_segment(show_aux=True, cache_file=cache_file), args.runs),
+    }
+
+    def run(*command):
+      subprocess.run([sys.executable, *command], env=env, check=True, capture_output=True)
+
+    runs = max(args.runs // 5, 3)
+    results["process: python -c pass (interpreter floor)"] = time_ms(lambda: run("-c", "pass"), runs)
+    results["process: python -m molpro_dirman.prompt --aux"] = time_ms(lambda: run("-m", "molpro_dirman.prompt", "--aux"), runs)
+    results["process: python -m molpro_dirman prompt --aux"] = time_ms(lambda: run("-m", "molpro_dirman", "prompt", "--aux"), runs)
+    results["process: python -m molpro_dirman active (table)"] = time_ms(lambda: run("-m", "molpro_dirman", "active"), runs)
+
+  for label, ms in results.items():
+    print(f"  {label:<50} {ms:8.2f} ms")
+
+  if results["in-process, cached"] > CACHED_BUDGET_MS:
+    print(f"Cached prompt segment exceeded {CACHED_BUDGET_MS} ms budget!")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,111 @@
+# Check CLI import time against the startup budget, optionally comparing with another git revision
+#
+# Each entry point is timed as it runs - the fast path answers a real 'active --plain' (against an empty temporary tree),
+# so imports it defers until it's called are counted too.
+#
+#   PYTHONPATH=src python -m benchmarks.startup [--runs 10] [--baseline <git-ref>]
+
+import os
+import sys
+import argparse
+import tarfile
+import tempfile
+import subprocess
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+# Cumulative import time (ms) allowed for each entry point - see README.md "Startup budget"
+STARTUP_BUDGET_MS = {
+  "molpro_dirman.fastpath": 50,
+  "molpro_dirman.completion": 50,
+  "molpro_dirman.cli": 150,
+}
+# Code run for each entry point - the default is just importing it
+ENTRY_POINT_CODE = {
+  "molpro_dirman.fastpath": "from molpro_dirman.fastpath import run_fast_path; run_fast_path(['active', '--plain'])",
+}
+
+
+def import_time_ms(module: str, src_dir: Path, runs: int) -> Optional[float]:
+  """Best-of-n import time of an entry point, as reported by python -X importtime
+
+  The sum of the cumulative times of the top-level imports from the entry point's own on - so modules imported by
+  functions it calls are counted, as well as those imported with it"""
+  best = None
+  with tempfile.TemporaryDirectory() as tmp:
+    env = {
+      **os.environ, "PYTHONPATH": str(src_dir), "XDG_CACHE_HOME": f"{tmp}/cache", "MPDMAN_CONFIG": f"{tmp}/config.toml",
+      "MPDMAN_PROJECT_ROOTS": tmp, "MPDMAN_SYMLINK_DIRECTORY": tmp, "MPDMAN_NO_DAEMON": "1",
+    }
+    for _ in range(runs):
+      result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", ENTRY_POINT_CODE.get(module, f"import {module}")],
+        env=env, capture_output=True, text=True,
+      )
+      if result.returncode != 0:
+        return None  # Entry point doesn't exist at this revision
+
+      total, started = 0, False
+      for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or fields[2].startswith("  "):
+          continue  # Header, or imported by another module - already in its cumulative time
+        started |= fields[2].strip().startswith("molpro_dirman")
+        if started:
+          total += int(fields[1])
+      best = total / 1000 if best is None else min(best, total / 1000)
+  return best
+
+
+def extract_revision(ref: str, dest: Path) -> Path:
+  "Extract the package sources at a git revision, returning the src directory"
+  archive = subprocess.run(
+    ["git", "archive", "--format=tar", ref, "src"],
+    cwd=PACKAGE_DIR, capture_output=True, check=True,
+  ).stdout
+  with tarfile.open(fileobj=BytesIO(archive)) as tar:
+    tar.extractall(dest, filter="data")
+  return dest / "src"
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Check CLI import time against the startup budget")
+  parser.add_argument("--runs", type=int, default=10)
+  parser.add_argument("--baseline", help="Git revision to compare against, eg: HEAD~1")
+  args = parser.parse_args()
+
+  modules = ["molpro_dirman", *STARTUP_BUDGET_MS]
+  current = {m: import_time_ms(m, PACKAGE_DIR / "src", args.runs) for m in modules}
+
+  baseline = {}
+  if args.baseline:
+    with tempfile.TemporaryDirectory() as tmp:
+      baseline_src = extract_revision(args.baseline, Path(tmp))
+      # Before the CLI moved out of __main__, importing __main__ was the equivalent of importing cli
+      for m in [*modules, "molpro_dirman.__main__"]:
+        baseline[m] = import_time_ms(m, baseline_src, args.runs)
+      if baseline["molpro_dirman.cli"] is None:
+        baseline["molpro_dirman.cli"] = baseline["molpro_dirman.__main__"]
+
+  over_budget = False
+  for module in modules:
+    budget = STARTUP_BUDGET_MS.get(module)
+    line = f"  {module:<26} {current[module]:8.1f} ms"
+    if budget is not None:
+      line += f"  (budget {budget} ms)"
+      over_budget |= current[module] > budget
+    if args.baseline:
+      before = baseline.get(module)
+      line += f"  baseline: {before:.1f} ms" if before is not None else "  baseline: n/a"
+    print(line)
+
+  if over_budget:
+    print("Startup budget exceeded!")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,19 @@
+# Count filesystem syscalls made from Python, by wrapping the os functions that issue them
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from molpro_dirman.profiling import patched_syscalls
+
+
+@contextmanager
+def count_syscalls() -> Iterator[Counter]:
+  "Count stat / lstat / scandir / listdir / readlink calls made within the block - see profiling.patched_syscalls"
+  counts: Counter = Counter()
+
+  def count(name: str) -> None:
+    counts[name] += 1
+
+  with patched_syscalls(count):
+    yield counts
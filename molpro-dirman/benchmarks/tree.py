@@ -0,0 +1,98 @@
+# Synthetic project trees for benchmarks - a projects directory and a fake home of symlinks, with Config redirected at them
+
+import os
+import random
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+from molpro_dirman.config import Config, Prefixes, format_project_name, symlink_name
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+class TreeSpec(NamedTuple):
+  "Shape of a synthetic tree - files are spread evenly over each project's nested directories"
+  projects: int = 1_000
+  files_per_project: int = 20
+  depth: int = 3  # Directory levels below each project
+  dirs_per_level: int = 2
+  symlinks: int = 50  # Aux project symlinks in the fake home, plus the main one
+  home_clutter: int = 200  # Unrelated files / dirs in the fake home
+  seed: int = 0
+
+
+PRESETS = {
+  "small": TreeSpec(projects=200, files_per_project=10, depth=2, symlinks=10, home_clutter=50),
+  "medium": TreeSpec(),
+  "large": TreeSpec(projects=10_000, files_per_project=100, depth=4, symlinks=500, home_clutter=2_000),
+}
+
+
+def project_dirs(project_path: Path, depth: int, dirs_per_level: int) -> list[Path]:
+  "Every directory in a project, project root first - a complete tree of the given depth / fan-out"
+  dirs = [project_path]
+  level = [project_path]
+  for _ in range(depth):
+    level = [parent / f"dir_{n}" for parent in level for n in range(dirs_per_level)]
+    dirs.extend(level)
+  return dirs
+
+
+def build_tree(root: Path, spec: TreeSpec) -> dict:
+  "Generate a tree under root (projects in root/home/Projects, symlinks in root/home), returning a summary of it"
+  rng = random.Random(spec.seed)
+  home = root / "home"
+  projects_dir = home / "Projects"
+  projects_dir.mkdir(parents=True)
+  prefixes = list(Prefixes.definitions())
+  now = 1_700_000_000  # Fixed, so runs of the same spec are comparable
+
+  names: set[str] = set()
+  while len(names) < spec.projects:
+    chosen = rng.sample(prefixes, rng.randint(1, 3))
+    names.add(format_project_name(chosen, rng.randrange(1, 10_000_000)))
+
+  files = 0
+  for name in sorted(names):
+    dirs = project_dirs(projects_dir / name, spec.depth, spec.dirs_per_level)
+    for d in dirs:
+      d.mkdir()
+    (projects_dir / name / "README.md").write_text(f"# Benchmark project {name}\n## {name}\n\n\nSynthetic.")
+    for n in range(spec.files_per_project):
+      path = dirs[n % len(dirs)] / f"file_{n}.txt"
+      path.touch()
+      ts = now - rng.randrange(SECONDS_PER_YEAR)
+      os.utime(path, (ts, ts))
+    files += spec.files_per_project + 1
+
+  linked = rng.sample(sorted(names), min(spec.symlinks + 1, len(names)))
+  for n, name in enumerate(linked):
+    os.symlink(projects_dir / name, home / symlink_name(name, is_main=n == 0))
+
+  for n in range(spec.home_clutter):
+    (home / (f".dotfile_{n}" if n % 2 else f"clutter_{n}")).touch()
+
+  return {"projects": len(names), "files": files, "symlinks": len(linked), "home_entries": len(linked) + spec.home_clutter + 1}
+
+
+@contextmanager
+def redirected_config(root: Path) -> Iterator[None]:
+  "Point Config's directories (and the cache) at a synthetic tree, restoring them afterwards"
+  home = root / "home"
+  redirects = {
+    "base_project_directory": staticmethod(lambda: home / "Projects"),
+    "base_symlink_directory": staticmethod(lambda: home),
+    "cache_directory": staticmethod(lambda: root / "cache" / "molpro_dirman"),
+  }
+  originals = {name: Config.__dict__[name] for name in redirects}
+  registry = os.environ.pop("MPDMAN_REGISTRY_URL", None)  # Never let a benchmark register serials
+  for name, redirect in redirects.items():
+    setattr(Config, name, redirect)
+  try:
+    yield
+  finally:
+    for name, original in originals.items():
+      setattr(Config, name, original)
+    if registry is not None:
+      os.environ["MPDMAN_REGISTRY_URL"] = registry
@@ -0,0 +1,75 @@
+# Compare the legacy rglob-based last_modified walk against the scandir walker, on a synthetic tree
+#
+#   PYTHONPATH=src python -m benchmarks.walk [--dirs 200] [--files 20] [--ignored-dirs 20]
+
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from molpro_dirman.walk import walk_activity
+
+from .syscalls import count_syscalls
+
+
+def legacy_last_modified(path: Path) -> float:
+  "The original implementation - two stat() calls and a Path object per entry"
+  return max(max(obj.stat().st_atime, obj.stat().st_mtime) for obj in path.rglob('*'))
+
+
+def build_tree(root: Path, dirs: int, files: int, ignored_dirs: int) -> None:
+  "A project with nested source dirs, plus a node_modules tree that the walker should prune"
+  for d in range(dirs):
+    subdir = root / f"part_{d // 10}" / f"sub_{d}"
+    subdir.mkdir(parents=True, exist_ok=True)
+    for f in range(files):
+      (subdir / f"file_{f}.txt").touch()
+
+  for d in range(ignored_dirs):
+    subdir = root / "node_modules" / f"package_{d}"
+    subdir.mkdir(parents=True, exist_ok=True)
+    for f in range(files):
+      (subdir / f"index_{f}.js").touch()
+
+
+def measure(label: str, func, path: Path) -> dict:
+  with count_syscalls() as counts:
+    start = time.perf_counter()
+    func(path)
+    elapsed = time.perf_counter() - start
+  return {"implementation": label, "seconds": elapsed, **counts}
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare last_modified walk implementations")
+  parser.add_argument("--dirs", type=int, default=200)
+  parser.add_argument("--files", type=int, default=20)
+  parser.add_argument("--ignored-dirs", type=int, default=20)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    root = Path(tmp) / "D-0000001"
+    build_tree(root, args.dirs, args.files, args.ignored_dirs)
+    entries = sum(len(dirnames) + len(filenames) for _, dirnames, filenames in os.walk(root))
+    print(f"Synthetic tree: {entries} entries")
+
+    results = [
+      measure("legacy rglob", legacy_last_modified, root),
+      measure("scandir (no pruning)", lambda p: walk_activity(p, patterns=()), root),
+      measure("scandir (default pruning)", walk_activity, root),
+    ]
+
+  for result in results:
+    print(
+      f"  {result['implementation']:<28} {result['seconds'] * 1000:8.1f} ms  "
+      f"stat={result.get('stat', 0):<7} scandir={result.get('scandir', 0)}"
+    )
+
+  legacy_stats = results[0].get("stat", 0)
+  for result in results[1:]:
+    print(f"  {result['implementation']}: {legacy_stats / max(result.get('stat', 0), 1):.1f}x fewer stat calls")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,7 +1,29 @@
-from .config import *
-from .local_read import *
-from .local_write import *
+# Public names are resolved lazily (PEP 562), so fast CLI paths don't pay for importing rich or every submodule
 
-core_print = print  # Retain the original print function ptr
+import builtins
+import importlib
 
-from rich import print, print_json
+core_print = builtins.print  # Retain the original print function ptr
+
+# Later modules take precedence, as with the star imports these replace
+_LAZY_MODULES = (".local_write", ".local_read", ".config")
+_RICH_NAMES = ("print", "print_json")
+
+
+def __getattr__(name: str):
+  if name.startswith("_"):
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+  if name in _RICH_NAMES:
+    value = getattr(importlib.import_module("rich"), name)
+  else:
+    for module_name in _LAZY_MODULES:
+      module = importlib.import_module(module_name, __name__)
+      if hasattr(module, name):
+        value = getattr(module, name)
+        break
+    else:
+      raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+  globals()[name] = value
+  return value
@@ -0,0 +1,113 @@
+# Compact in-memory catalog of projects, parsed once from their names - for listings of 100k+ projects
+#
+# A project is a slotted record (no per-instance dict) holding its name, a bitmask of its prefix letters, its serial as
+# an int, its activity timestamp as a float and the id of its root, interned once per catalog. Path objects are only
+# made on demand, and listings sort on the numeric timestamps, formatting only the rows they print.
+
+import heapq
+from pathlib import Path
+from operator import attrgetter
+from typing import Iterable, Iterator, Optional
+
+NO_SERIAL = -1  # Serial of a directory whose name doesn't end in one
+ACTIVITY_ORDER = attrgetter("timestamp", "name")  # Sort key for records, most recently active last
+
+
+def prefix_mask(prefixes: str) -> int:
+  "Bitmask of prefix letters, bit 0 for 'A' - 0 if prefixes aren't all uppercase letters"
+  mask = 0
+  for letter in prefixes:
+    bit = ord(letter) - 65
+    if not 0 <= bit < 26:
+      return 0
+    mask |= 1 << bit
+  return mask
+
+
+def mask_prefixes(mask: int) -> str:
+  "Prefix letters set in a bitmask, in alphabetical order"
+  return "".join(chr(65 + bit) for bit in range(26) if mask >> bit & 1)
+
+
+class ProjectRecord:
+  "One project - timestamp is its last activity once known, complete false if that's a lower bound from a cut-short walk"
+  __slots__ = ("name", "prefixes", "serial", "root", "timestamp", "complete")
+
+  def __init__(self, name: str, root: int, timestamp: float = 0.0, complete: bool = True):
+    prefixes, _, serial = name.partition("-")
+    self.name = name
+    self.prefixes = prefix_mask(prefixes)
+    self.serial = int(serial) if serial.isascii() and serial.isdigit() else NO_SERIAL
+    self.root = root
+    self.timestamp = timestamp
+    self.complete = complete
+
+  def __repr__(self) -> str:
+    return f"ProjectRecord({self.name!r}, root={self.root}, timestamp={self.timestamp}, complete={self.complete})"
+
+
+class Catalog:
+  "Projects across every root, in listing order - records refer to their root by its index in roots"
+
+  def __init__(self):
+    self.roots: list[Path] = []
+    self.root_ids: dict[Path, int] = {}
+    self.records: list[ProjectRecord] = []
+
+  @classmethod
+  def from_listings(cls, listings: Iterable[tuple[Path, Iterable[str]]]) -> "Catalog":
+    "Catalog of the project names listed in each root"
+    catalog = cls()
+    for root, names in listings:
+      root_id = catalog.root_id(root)
+      catalog.records.extend(ProjectRecord(name, root_id) for name in names)
+    return catalog
+
+  @classmethod
+  def from_paths(cls, paths: Iterable[Path]) -> "Catalog":
+    "Catalog of project paths, in the order given"
+    catalog = cls()
+    catalog.records = [ProjectRecord(path.parts[-1], catalog.root_id(path.parent)) for path in paths]
+    return catalog
+
+  def root_id(self, root: Path) -> int:
+    "Interned id of a root, added if it's new"
+    root_id = self.root_ids.get(root)
+    if root_id is None:
+      root_id = self.root_ids[root] = len(self.roots)
+      self.roots.append(root)
+    return root_id
+
+  def __len__(self) -> int:
+    return len(self.records)
+
+  def __iter__(self) -> Iterator[ProjectRecord]:
+    return iter(self.records)
+
+  def path(self, record: ProjectRecord) -> Path:
+    return self.roots[record.root] / record.name
+
+  def paths(self) -> list[Path]:
+    return [self.roots[record.root] / record.name for record in self.records]
+
+  def names(self) -> list[str]:
+    return [record.name for record in self.records]
+
+  def serials(self, prefixes: str) -> set[int]:
+    "Serials in use with exactly this prefix combination (eg: 'DO')"
+    mask, start = prefix_mask(prefixes), f"{prefixes}-"
+    return {
+      record.serial for record in self.records
+      if record.prefixes == mask and record.serial != NO_SERIAL and record.name.startswith(start)
+    }
+
+  def set_activities(self, activities: Iterable[tuple[float, bool]]) -> None:
+    "Record (timestamp, complete) per project, in catalog order"
+    for record, (timestamp, complete) in zip(self.records, activities):
+      record.timestamp, record.complete = timestamp, complete
+
+  def by_activity(self, top: Optional[int] = None) -> list[ProjectRecord]:
+    "Records most recently active first (ties by name, descending), or just the top N"
+    if top is not None:
+      return heapq.nlargest(top, self.records, key=ACTIVITY_ORDER)
+    return sorted(self.records, key=ACTIVITY_ORDER, reverse=True)
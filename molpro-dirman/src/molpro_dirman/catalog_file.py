@@ -0,0 +1,201 @@
+# Memory-mapped binary index of project names, so short CLI invocations answer lookups without parsing a cache or
+# opening sqlite
+#
+# Layout (little-endian), version FORMAT_VERSION:
+#   header   HEADER - magic, version, record width, then the root and record counts
+#   roots    per project root: ROOT (mtime_ns, path length), UTF-8 path - padded to 8 bytes
+#   records  RECORD per project, sorted by (name, root) - name, prefix bitmask, serial, root number
+#
+# The file is current while each root's mtime still matches the one it was built with, ie: until a project is created /
+# removed. It's then rebuilt and atomically replaced - listing only the roots whose mtime changed, and copying the
+# others' records from the previous file. Lookups bisect the mapped records in place, decoding only the fields they
+# compare.
+#
+# It holds names only: symlinks aren't held here (the symlink manifest answers for them), so activating a project (or
+# anything else changing the symlink directory, usually $HOME) leaves it current. Serials are found by prefix
+# combination (serials()) - there's no serial-keyed section for looking a project up by serial alone, as nothing in the
+# CLI does.
+
+import os
+import mmap
+import struct
+from bisect import bisect_left
+from pathlib import Path
+from typing import Optional
+
+from .config import Config
+from .catalog import ProjectRecord, NO_SERIAL
+
+MAGIC = b"MPDMIDX\0"
+FORMAT_VERSION = 2
+NAME_WIDTH = 40  # Bytes - projects longer than this (or roots holding directories that are) aren't indexed
+
+HEADER = struct.Struct("<8sHHII")
+ROOT = struct.Struct("<qH")
+RECORD = struct.Struct(f"<{NAME_WIDTH}sIiHxx")
+
+
+def mtime_ns(path: Path) -> int:
+  "mtime of a root, or -1 while it's unavailable (eg: an unmounted disk)"
+  try:
+    return os.stat(path).st_mtime_ns
+  except OSError:
+    return -1
+
+
+def _padded(size: int) -> int:
+  return -size % 8
+
+
+class CatalogFile:
+  "A mapped, current catalog file - use load(), and close it (or use it as a context manager) when done"
+
+  def __init__(self, buffer: mmap.mmap, roots: list[Path], records: int, records_offset: int):
+    self.buffer = buffer
+    self.roots = roots
+    self.records = records
+    self.records_offset = records_offset
+
+  @staticmethod
+  def load() -> Optional["CatalogFile"]:
+    "The catalog file for the configured roots, rebuilt first if it's out of date - None if it can't be built"
+    return CatalogFile.open() or CatalogFile.build()
+
+  @staticmethod
+  def open(path: Optional[Path] = None) -> Optional["CatalogFile"]:
+    "The catalog file, if there is one and it's current for the configured roots"
+    read = CatalogFile._read(path or Config.catalog_file_path())
+    if read is None:
+      return None
+    catalog_file, stamps = read
+    roots = Config.project_roots()
+    if stamps != [(root, mtime_ns(root)) for root in roots]:
+      catalog_file.close()
+      return None  # Built for other settings, or projects were created / removed since
+    return catalog_file
+
+  @staticmethod
+  def _read(path: Path) -> Optional[tuple["CatalogFile", list[tuple[Path, int]]]]:
+    "The mapped catalog file with the root stamps it was built with, current or not - None if missing or unreadable"
+    try:
+      with open(path, "rb") as fd:
+        buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+      return None  # No file yet, or an empty one
+
+    try:
+      magic, version, record_size, root_count, records = HEADER.unpack_from(buffer)
+      if (magic, version, record_size) != (MAGIC, FORMAT_VERSION, RECORD.size):
+        raise ValueError("Different format")
+
+      offset, stamps = HEADER.size, []
+      for _ in range(root_count):
+        root_mtime, length = ROOT.unpack_from(buffer, offset)
+        offset += ROOT.size
+        stamps.append((Path(buffer[offset:offset + length].decode()), root_mtime))
+        offset += length
+      offset += _padded(offset)
+      if len(buffer) != offset + records * RECORD.size:
+        raise ValueError("Truncated")
+    except (struct.error, ValueError):
+      buffer.close()
+      return None
+    return CatalogFile(buffer, [root for root, _ in stamps], records, offset), stamps
+
+  @staticmethod
+  def build(path: Optional[Path] = None) -> Optional["CatalogFile"]:
+    "List the roots changed since the last build, and atomically rewrite the catalog file - None if it can't be indexed"
+    import tempfile  # Deferred - lookups from a current file don't need it
+    path = path or Config.catalog_file_path()
+    path.parent.mkdir(parents=True, exist_ok=True)  # Before the stamps, in case it's made within a root
+    roots = Config.project_roots()
+    stamps = [(root, mtime_ns(root)) for root in roots]  # Taken first, so changes made while we list invalidate it
+
+    projects = CatalogFile._list(path, stamps)
+    if projects is None or any(len(name) > NAME_WIDTH for name, _ in projects):
+      return None
+    projects.sort()
+
+    chunks = [HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, len(stamps), len(projects))]
+    for stamp_path, stamp_mtime in stamps:
+      encoded = str(stamp_path).encode()
+      chunks += [ROOT.pack(stamp_mtime, len(encoded)), encoded]
+    chunks.append(b"\0" * _padded(sum(map(len, chunks))))
+    for name, root_id in projects:
+      record = ProjectRecord(name.decode(), root_id)
+      chunks.append(RECORD.pack(name, record.prefixes, record.serial, root_id))
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)  # Unique per builder
+    try:
+      with open(fd, "wb") as file:
+        file.write(b"".join(chunks))
+      os.replace(tmp_path, path)
+    except BaseException:
+      os.unlink(tmp_path)
+      raise
+    return CatalogFile.open(path)
+
+  @staticmethod
+  def _list(path: Path, stamps: list[tuple[Path, int]]) -> Optional[list[tuple[bytes, int]]]:
+    "(name, root number) of each project - reusing the file at path for roots it was built with the same stamp for"
+    previous = CatalogFile._read(path)
+    listed = {} if previous is None else {stamp: root_id for root_id, stamp in enumerate(previous[1]) if stamp[1] != -1}
+    try:
+      projects: list[tuple[bytes, int]] = []
+      for root_id, stamp in enumerate(stamps):
+        if stamp in listed:  # Unchanged since the previous build listed it
+          projects += [(name, root_id) for name in previous[0]._root_names(listed[stamp])]
+          continue
+        try:
+          with os.scandir(stamp[0]) as it:
+            projects += [(entry.name.encode(), root_id) for entry in it if entry.is_dir()]
+        except OSError:
+          if root_id == 0:
+            return None
+          continue  # Unavailable - picked up once its mtime can be read again
+      return projects
+    finally:
+      if previous is not None:
+        previous[0].close()
+
+  def __enter__(self) -> "CatalogFile":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self.buffer.close()
+
+  # RECORDS
+  def _name(self, number: int) -> bytes:
+    offset = self.records_offset + number * RECORD.size
+    return self.buffer[offset:offset + NAME_WIDTH].rstrip(b"\0")
+
+  def _record(self, number: int) -> tuple[bytes, int, int, int]:
+    return RECORD.unpack_from(self.buffer, self.records_offset + number * RECORD.size)
+
+  def _name_range(self, low: bytes, high: bytes) -> range:
+    "Record numbers of names from low up to (not including) high"
+    numbers = range(self.records)
+    return range(bisect_left(numbers, low, key=self._name), bisect_left(numbers, high, key=self._name))
+
+  def _root_names(self, root_id: int) -> list[bytes]:
+    "Names held for one of this file's roots"
+    records = map(self._record, range(self.records))
+    return [name.rstrip(b"\0") for name, _, _, record_root in records if record_root == root_id]
+
+  def names(self) -> list[str]:
+    "Every project name, sorted - a name held by several roots appears once per root"
+    return [self._name(number).decode() for number in range(self.records)]
+
+  def contains(self, name: str, root: Optional[Path] = None) -> bool:
+    "Whether a project directory of this name is in root (or any root)"
+    encoded = name.encode()
+    matches = self._name_range(encoded, encoded + b"\0")
+    return any(root is None or self.roots[self._record(number)[3]] == root for number in matches)
+
+  def serials(self, prefixes: str) -> set[int]:
+    "Serials in use with exactly this prefix combination (eg: 'DO') - their names sort together, from 'DO-' to 'DO.'"
+    matches = self._name_range(f"{prefixes}-".encode(), f"{prefixes}.".encode())
+    return {serial for serial in (self._record(number)[2] for number in matches) if serial != NO_SERIAL}
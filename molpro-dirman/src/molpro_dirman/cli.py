@@ -0,0 +1,558 @@
+#!/bin/python3
+
+# molpro_dirman: CLI tool to manage project serials locally
+# Copyright (C) 2022 MolarFox Prototyping
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Typer CLI definition - heavy imports (rich tables, InquirerPy, sqlite) are deferred to the commands that use them
+
+import os
+import typer
+
+from pathlib import Path
+from textwrap import dedent
+from typing import Optional
+
+from . import print, print_json
+from .fastpath import active_plain, prompt as prompt_fast_path
+from .config import Config, Prefixes, settings
+from .index import ActivityIndex
+from .walk import approximate_activities
+from .catalog import Catalog, ACTIVITY_ORDER
+from .local_read import Project, format_timestamp, format_activity, LOWER_BOUND_MARK
+from .local_write import delete_symlink, symlink_project, unlink_main, unlink_all, unlink_specific, create_project, create_projects
+from .errors import DaemonError, InvalidConfig, ProjectSymLinkException, RegistryError, WatcherAlreadyRunning
+from .rpc import daemon_call
+from .journal import schedule_flush
+from .completion import complete_projects, complete_deactivate, complete_prefixes
+from .profiling import phase, profiled, cprofiled, CPROFILE_ENV, PROFILE_FORMATS
+from .output import OUTPUT_FORMATS, RecordWriter, active_projects, all_symlink_names, project_record as output_record
+
+app = typer.Typer(invoke_without_command=True)
+
+RESCAN_OPTION = typer.Option(False, "--rescan", help="Ignore the activity index and symlink manifest, rebuilding them with full scans")
+JOBS_OPTION = typer.Option(None, "--jobs", "-j", min=1, help="Projects to scan concurrently [default: CPU count x2]")
+DEPTH_OPTION = typer.Option(None, "--depth", min=1, help="Approximate: only look this many directory levels into each project")
+BUDGET_OPTION = typer.Option(None, "--budget-ms", min=1, help=f"Approximate: stop walking each project after this long, marking its timestamp '{LOWER_BOUND_MARK.strip()}'")
+FORMAT_OPTION = typer.Option("table", "--format", help=f"Output format: {' / '.join(OUTPUT_FORMATS)} - all but table stream one record per project")
+
+
+def check_format(output_format: str) -> None:
+    if output_format not in OUTPUT_FORMATS:
+        raise typer.BadParameter(f"expected one of {', '.join(OUTPUT_FORMATS)}", param_hint="--format")
+
+
+def activity_timestamps(
+    paths: list[Path], rescan: bool, jobs: Optional[int], depth: Optional[int], budget_ms: Optional[int]
+) -> list[tuple[float, bool]]:
+    "(timestamp, complete) per project - approximate walks bypass the activity index, so their results aren't cached"
+    if depth is None and budget_ms is None:
+        with ActivityIndex() as index:
+            return [(ts, True) for ts in index.project_timestamps(paths, rescan=rescan, jobs=jobs)]
+    return approximate_activities(paths, max_depth=depth, budget_ms=budget_ms, jobs=jobs)
+
+
+def lower_bound_caption(activities: list[tuple[float, bool]]) -> Optional[str]:
+    incomplete = sum(1 for _, complete in activities if not complete)
+    return f"{LOWER_BOUND_MARK}{incomplete} walk(s) ran out of time - at least this recent" if incomplete else None
+
+
+@app.command()
+def status(
+    rescan: bool = RESCAN_OPTION,
+    jobs: Optional[int] = JOBS_OPTION,
+    depth: Optional[int] = DEPTH_OPTION,
+    budget_ms: Optional[int] = BUDGET_OPTION,
+    output_format: str = FORMAT_OPTION,
+):
+    "Output mounted project(s), and most recently activated projects"
+    check_format(output_format)
+    if output_format != "table":
+        with RecordWriter(output_format, sections=True) as writer:
+            writer.section("active")
+            with phase("active"):
+                write_active(writer, rescan, jobs, depth, budget_ms)
+            writer.section("projects")
+            with phase("ls"):
+                write_projects(writer, rescan, jobs, None, depth, budget_ms)
+        return
+
+    with phase("active"):
+        active(rescan=rescan, jobs=jobs, plain=False, depth=depth, budget_ms=budget_ms, output_format="table")
+    print()
+    with phase("ls"):
+        ls(rescan=rescan, jobs=jobs, stream=False, top=None, depth=depth, budget_ms=budget_ms, output_format="table")
+
+
+@app.command()
+def active(
+    rescan: bool = RESCAN_OPTION,
+    jobs: Optional[int] = JOBS_OPTION,
+    plain: bool = typer.Option(False, "--plain", help="Tab-separated symlink / project names only, skipping activity scans"),
+    depth: Optional[int] = DEPTH_OPTION,
+    budget_ms: Optional[int] = BUDGET_OPTION,
+    output_format: str = FORMAT_OPTION,
+):
+    "Output currently active project(s) only"
+    if plain:
+        return active_plain()
+    check_format(output_format)
+    if output_format != "table":
+        with RecordWriter(output_format) as writer:
+            return write_active(writer, rescan, jobs, depth, budget_ms)
+
+    from rich.table import Table
+
+    links, targets, activities = active_links(rescan, jobs, depth, budget_ms)
+    catalog = Catalog.from_paths(targets)
+    catalog.set_activities(activities)
+    records = [
+        [format_activity(t.timestamp, t.complete), l.parts[-1], t.name]
+        for t, l in sorted(zip(catalog, links), key=lambda r: (r[0].timestamp, r[1].parts[-1], r[0].name))
+    ]
+
+    table = Table(title="Mounted projects (date_desc)", caption=lower_bound_caption(activities))
+    table.add_column("symlink", style="dodger_blue1")
+    table.add_column("project", style="magenta")
+    table.add_column("last_modified", style="bright_black")
+
+    [table.add_row(p[1], p[2], p[0]) for p in records]
+    with phase("render"):
+        print(table)
+
+
+def active_links(
+    rescan: bool, jobs: Optional[int], depth: Optional[int], budget_ms: Optional[int]
+) -> tuple[list[Path], list[Path], list[tuple[float, bool]]]:
+    "mpdman symlinks, their targets, and (timestamp, complete) per target - from the daemon if one is running"
+    remote = None if rescan or depth or budget_ms else daemon_call("active")
+    if remote is not None:  # Answered by the daemon, from warm state
+        links = [Path(link["symlink"]) for link in remote["links"]]
+        targets = [Path(link["path"]) for link in remote["links"]]
+        return links, targets, [(link["last_activity"], True) for link in remote["links"]]
+
+    with phase("symlinks"):
+        links = Project.all_symlinks(rescan=rescan)
+    with phase("readlink"):
+        targets = [Path(os.readlink(l)) for l in links]
+    with phase("activity"):
+        return links, targets, activity_timestamps(targets, rescan, jobs, depth, budget_ms)
+
+
+def write_active(writer: RecordWriter, rescan: bool, jobs: Optional[int], depth: Optional[int], budget_ms: Optional[int]):
+    "Records for the projects symlinked, most recently active first"
+    for record in active_projects(*active_links(rescan, jobs, depth, budget_ms)):
+        writer.write(record)
+
+
+def write_projects(
+    writer: RecordWriter, rescan: bool, jobs: Optional[int], top: Optional[int], depth: Optional[int], budget_ms: Optional[int]
+):
+    """Records for every project (or the top N), each written as soon as its activity is known
+
+    Scanned projects are written in the order their scans finish - from the daemon, --top or approximate walks,
+    most recently active first"""
+    remote = None if rescan or depth or budget_ms else daemon_call("status")
+    if remote is not None:
+        names = {}
+        for link in remote["links"]:
+            names.setdefault(link["path"], []).append(Path(link["symlink"]).parts[-1])
+        for p in remote["projects"][:top]:
+            writer.write(output_record(Path(p["path"]), p["last_activity"], symlinks=names.get(p["path"], ())))
+        return
+
+    with phase("symlinks"):
+        names = all_symlink_names(rescan=rescan)
+    with phase("list projects"):
+        paths = Project.list_paths(rescan=rescan)
+    with phase("activity"):
+        if depth is not None or budget_ms is not None:
+            activities = approximate_activities(paths, max_depth=depth, budget_ms=budget_ms, jobs=jobs)
+            for (ts, complete), path in sorted(zip(activities, paths), key=lambda r: (r[0][0], r[1].parts[-1]), reverse=True):
+                writer.write(output_record(path, ts, complete, names.get(path, ())))
+            return
+        with ActivityIndex() as index:
+            scans = index.top_projects(paths, top, rescan=rescan, jobs=jobs) if top else index.iter_project_timestamps(paths, rescan=rescan, jobs=jobs)
+            for path, ts in scans:
+                writer.write(output_record(path, ts, symlinks=names.get(path, ())))
+
+
+def project_record(last_modified: str, path: Path, show_root: bool) -> list[str]:
+    "[last_modified, project] record for a listing, plus the root it's in when projects are spread over several"
+    return [last_modified, path.parts[-1], str(path.parent)] if show_root else [last_modified, path.parts[-1]]
+
+
+def projects_table(records: list[list[str]], caption: Optional[str] = None):
+    "Table of [last_modified, project(, root)] records, in the order given"
+    from rich.table import Table
+
+    table = Table(title="Available Projects (date_desc)", caption=caption)
+    table.add_column("project", style="magenta")
+    table.add_column("last_modified", style="bright_black")
+    if any(len(p) > 2 for p in records):
+        table.add_column("root", style="dodger_blue1")
+
+    [table.add_row(p[1], p[0], *p[2:]) for p in records]
+    return table
+
+
+@app.command()
+def ls(
+    rescan: bool = RESCAN_OPTION,
+    jobs: Optional[int] = JOBS_OPTION,
+    stream: bool = typer.Option(False, "--stream", help="Show projects as their scans finish, sorting once all are done"),
+    top: Optional[int] = typer.Option(None, "--top", min=1, help="Only the N most recently active projects, skipping scans of cold ones"),
+    depth: Optional[int] = DEPTH_OPTION,
+    budget_ms: Optional[int] = BUDGET_OPTION,
+    output_format: str = FORMAT_OPTION,
+):
+    "List active projects, and local projects that are ready to be made active"
+    check_format(output_format)
+    approximate = depth is not None or budget_ms is not None
+    if sum((bool(stream), bool(top), approximate)) > 1:
+        return print("[bold red]--stream, --top and --depth / --budget-ms can't be combined! Aborting[/bold red]")
+    if output_format != "table":  # Always streamed - --stream only changes how the table is drawn
+        with RecordWriter(output_format) as writer:
+            return write_projects(writer, rescan, jobs, top, depth, budget_ms)
+    if stream:
+        return ls_stream(rescan=rescan, jobs=jobs)
+    show_root = len(Config.project_roots()) > 1
+    remote = None if rescan or approximate else daemon_call("ls", {"top": top})  # Answered from warm state, if running
+    if top:
+        if remote is not None:
+            ranked = [(Path(p["path"]), p["last_activity"]) for p in remote["projects"]]
+        else:
+            with phase("list projects"):
+                paths = Project.list_paths(rescan=rescan)
+            with phase("activity"), ActivityIndex() as index:
+                ranked = index.top_projects(paths, top, rescan=rescan, jobs=jobs)
+        with phase("render"):
+            return print(projects_table([project_record(format_timestamp(ts), p, show_root) for p, ts in ranked]))
+
+    if remote is not None:
+        catalog = Catalog.from_paths(Path(p["path"]) for p in remote["projects"])
+        activities = [(p["last_activity"], True) for p in remote["projects"]]
+    else:
+        with phase("list projects"):
+            catalog = Project.catalog(rescan=rescan)
+        with phase("activity"):
+            activities = activity_timestamps(catalog.paths(), rescan, jobs, depth, budget_ms)
+    catalog.set_activities(activities)
+    records = [
+        project_record(format_activity(r.timestamp, r.complete), catalog.path(r), show_root) for r in catalog.by_activity()
+    ]
+
+    with phase("render"):
+        print(projects_table(records, caption=lower_bound_caption(activities)))
+
+
+def ls_stream(rescan: bool = False, jobs: Optional[int] = None):
+    """ls, emitting rows as each project's scan finishes so the first appears without waiting on the rest
+
+    On a terminal, a live table shows the most recent projects so far and is replaced by the full sorted table at the
+    end. Otherwise rows are written as tab-separated lines in completion order (pipe through sort to order them)"""
+    import sys
+    import heapq
+    from rich import get_console
+
+    console = get_console()
+    show_root = len(Config.project_roots()) > 1
+    with phase("list projects"):
+        catalog = Project.catalog(rescan=rescan)
+        paths = catalog.paths()
+
+    def rows(records) -> list[list[str]]:
+        return [project_record(format_timestamp(r.timestamp), catalog.path(r), show_root) for r in records]
+
+    by_path = dict(zip(paths, catalog))
+    scanned = []
+    with phase("activity"), ActivityIndex() as index:
+        scans = index.iter_project_timestamps(paths, rescan=rescan, jobs=jobs)
+        if not console.is_terminal:
+            for path, ts in scans:
+                root = f"\t{path.parent}" if show_root else ""
+                sys.stdout.write(f"{path.parts[-1]}\t{format_timestamp(ts)}{root}\n")
+                sys.stdout.flush()
+            return
+
+        from rich.live import Live
+
+        def progress():
+            shown = heapq.nlargest(max(console.height - 8, 1), scanned, key=ACTIVITY_ORDER)  # Room for the title, borders and caption
+            return projects_table(rows(shown), caption=f"Scanned {len(scanned)} / {len(paths)}")
+
+        with Live(get_renderable=progress, console=console, transient=True, refresh_per_second=10):
+            for path, ts in scans:
+                record = by_path[path]
+                record.timestamp = ts
+                scanned.append(record)
+
+    with phase("render"):
+        print(projects_table(rows(catalog.by_activity())))
+
+
+@app.command()
+def search(
+    query: list[str] = typer.Argument(..., help="Terms to match in project names and READMEs, all required - end a term with '*' to match by prefix"),
+    files: bool = typer.Option(False, "--files", help="Also match top-level filenames in each project"),
+    limit: Optional[int] = typer.Option(None, "--limit", "-n", min=1, help="Only the N most recently active matches"),
+):
+    "Search projects by README title / description, most recently active first"
+    from rich.table import Table
+    from .search import SearchIndex
+
+    with phase("list projects"):
+        paths = Project.list_paths()
+    with SearchIndex() as index:
+        with phase("refresh"):
+            index.refresh(paths, files=files)
+        with phase("query"):
+            results = index.search(" ".join(query), files=files, limit=limit)
+
+    if not results:
+        return print("[bold yellow]No matching projects[/bold yellow]")
+
+    table = Table(title=f"Projects matching '{' '.join(query)}' (date_desc)")
+    table.add_column("project", style="magenta")
+    table.add_column("title")
+    table.add_column("last_modified", style="bright_black")
+
+    [table.add_row(r.path.parts[-1], r.title, format_timestamp(r.timestamp)) for r in results]
+    with phase("render"):
+        print(table)
+
+
+@app.command()
+def watch(
+    poll: Optional[float] = typer.Option(None, "--poll", min=0.1, help="Re-index every this many seconds instead of using inotify"),
+    max_watches: Optional[int] = typer.Option(None, "--max-watches", min=1, help="Most inotify watches to use [default: half the per-user limit]"),
+):
+    "Keep the activity index live from filesystem events, so ls / status / active read it without walking - runs until interrupted"
+    import threading
+    from .watch import start_watcher
+
+    try:
+        with start_watcher(max_watches=max_watches, poll_interval=poll) as watcher:
+            print(f"[bold green]{watcher.describe()}[/bold green]")
+            watcher.run(threading.Event())
+    except WatcherAlreadyRunning as e:
+        print(f"[bold red]{e}[/bold red]")
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def serve(
+    poll: Optional[float] = typer.Option(None, "--poll", min=0.1, help="Re-index every this many seconds instead of using inotify"),
+    max_watches: Optional[int] = typer.Option(None, "--max-watches", min=1, help="Most inotify watches to use [default: half the per-user limit]"),
+):
+    "Run a daemon answering status / ls / active / activate / deactivate / create from warm state - runs until interrupted"
+    from .serve import serve as serve_daemon
+
+    try:
+        serve_daemon(ready=lambda description: print(f"[bold green]{description}[/bold green]"), max_watches=max_watches, poll_interval=poll)
+    except (WatcherAlreadyRunning, DaemonError) as e:
+        print(f"[bold red]{e}[/bold red]")
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def prompt(aux: bool = typer.Option(False, "--aux", help="Append the number of aux projects linked, eg: 'DO-4256663 +2'")):
+    "Print the active project name for use in shell prompts - cached, see README for shell hooks"
+    prompt_fast_path(show_aux=aux)
+
+
+@app.command()
+def activate(project_name: str = typer.Argument(..., autocompletion=complete_projects)):
+  "Activate a project"
+  try:
+    remote = daemon_call("activate", {"project": project_name}, idempotent=False)
+    if remote is not None:
+      project_path = Path(remote["path"])
+    else:
+      project_path = Project.path_of(project_name)
+      symlink_project(project_path, is_main=True)
+    print(f"[bold green]Linked '{project_name}' at \"{project_path}\"[/bold green]")
+  except (ProjectSymLinkException, DaemonError) as e:
+    print(f"[bold red]{e}[/bold red]")
+
+
+
+@app.command()
+def deactivate(project_name: str=typer.Argument("main", autocompletion=complete_deactivate)):
+  "Deactivate an active project"
+
+  if not Project.active():
+    return print(f"No main project set! No changes made.")
+
+  removed: list[Path] = []
+  with phase("unlink"):
+    remote = daemon_call("deactivate", {"project": project_name}, idempotent=False)
+    if remote is not None:
+      removed = [Path(path) for path in remote["removed"]]
+    else:
+      match project_name:
+        case "main":
+          removed = unlink_main()
+        case "all":
+          removed = unlink_all()
+        case _:
+          removed = unlink_specific(Project.path_of(project_name))
+
+  print("[bold green]Removed paths:[/bold green]")
+  for path in removed:
+    print("  -", path)
+
+
+@app.command()
+def create(
+    prefixes: list[str]=typer.Option([], autocompletion=complete_prefixes),
+    title: str=typer.Option(None, prompt="Project title"),
+    description: str="",
+    serial: Optional[int]=None,
+    count: int=typer.Option(1, "--count", min=1, help="Create this many projects at once (serials are allocated randomly)")
+  ):
+    "Create a new project"
+    from InquirerPy import inquirer
+
+    if count > 1 and serial is not None:
+      print("[bold red]--serial can't be used with --count! Aborting[/bold red]")
+      return
+
+    # Prompt for prefixes
+    if not prefixes:
+      prefixes = inquirer.checkbox(
+        message="Select prefixes relevant to the new project:",
+        choices=[{"value":k, "name": f"{k} - {v.short}"} for k, v in Prefixes.definitions().items()],
+      ).execute()
+
+    # Optionally prompt with editor for description to be edited
+    if not description:
+      if typer.confirm("Edit project description?", default=True):
+        description = typer.edit() or ""
+
+    # Validate prefixes were defined
+    if not prefixes:
+      print("[bold red]No prefixes were specified! Aborting[/bold red]")
+      return
+    
+    # Bulk creation - don't re-point the main project at any one of them
+    if count > 1:
+      with phase("create projects"):
+        remote = daemon_call("create", {"prefixes": prefixes, "title": title, "description": description, "count": count}, idempotent=False)
+        project_paths = [Path(path) for path in remote["paths"]] if remote is not None else create_projects(prefixes, title, description, count)
+      for project_path in project_paths:
+        print(f"[green]Created new project [bold][{project_path.parts[-1]}][/bold][/green]")
+      schedule_flush()
+      return
+
+    # Create project
+    with phase("create project"):
+      remote = daemon_call("create", {"prefixes": prefixes, "title": title, "description": description, "serial": serial}, idempotent=False)
+      project_path = Path(remote["paths"][0]) if remote is not None else create_project(prefixes, title, description, serial)
+    project_name = project_path.parts[-1]
+
+    print(f"[green]Created new project [bold][{project_name}][/bold][/green]")
+    schedule_flush()  # Register the serial in the background - creation never waits on the network
+
+    # Make that the new main
+    with phase("activate"):
+      if Project.active():
+        unlink_main()
+      activate(project_name)
+
+
+@app.command()
+def doctor():
+    "Rescan the symlink directory, reconciling the symlink manifest with the symlinks actually there"
+    changes = Project.reconcile_symlinks()
+    if not any(changes.values()):
+        return print("[bold green]Symlink manifest is up to date[/bold green]")
+
+    print("[bold yellow]Symlink manifest reconciled:[/bold yellow]")
+    for change, names in changes.items():
+        for name in names:
+            print(f"  - {change}: {name}")
+
+
+@app.command()
+def sync(
+    registry: Optional[str] = typer.Option(None, help="Registry base URL [default: $MPDMAN_REGISTRY_URL]"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Pull from the registry, but don't register anything"),
+):
+    "Sync local project serials with the serial registry"
+    from .sync import sync as sync_serials
+    from .journal import flush
+
+    try:
+        flushed = 0 if dry_run else flush(registry)
+        report = sync_serials(registry, dry_run=dry_run)
+    except RegistryError as e:
+        return print(f"[bold red]{e}[/bold red]")
+
+    if flushed:
+        print(f"[green]Flushed {flushed} journalled event(s)[/green]")
+    verb = "Would register" if dry_run else "Registered"
+    print(f"[bold green]{verb} {len(report.pushed)} serial(s), pulled {len(report.pulled)} in {report.round_trips} request(s)[/bold green]")
+    for name in report.pushed:
+        print("  +", name)
+    for name in report.pulled:
+        print("  <", name)
+
+
+@app.command()
+def about():
+  "Output some information about molpro_dirman"
+  print(dedent(
+    f"""
+    MolarFox Prototyping: Project Directory Manager
+    [italic]Version {Config.version()} - 2025[/italic]
+    """
+    ))
+
+
+@app.command()
+def prefixes(
+        verbose: bool = typer.Option(False, help="Display long descriptions for serials")
+):
+    "List info about serial prefixes"
+    if verbose:
+        print_json(data=Prefixes.as_dict())
+    else:
+        print_json(data={s: info.short for s, info in Prefixes.definitions().items()})
+
+
+@app.callback(invoke_without_command=True)
+def callback(
+    ctx: typer.Context,
+    profile: bool = typer.Option(False, "--profile", help="On exit, print the time and filesystem calls spent in each phase"),
+    profile_format: str = typer.Option("table", "--profile-format", help=f"Profile output format: {' / '.join(PROFILE_FORMATS)}"),
+):
+    if profile_format not in PROFILE_FORMATS:
+        raise typer.BadParameter(f"expected one of {', '.join(PROFILE_FORMATS)}", param_hint="--profile-format")
+    try:
+        settings()  # Loaded once up front, so a broken config file is reported before any command runs
+    except InvalidConfig as e:
+        print(f"[bold red]Invalid config: {e}[/bold red]")
+        raise typer.Exit(1)
+    if os.environ.get(CPROFILE_ENV):
+        ctx.with_resource(cprofiled(os.environ[CPROFILE_ENV]))
+    if profile:
+        ctx.with_resource(profiled(profile_format))
+    ctx.with_resource(phase(ctx.invoked_subcommand or "status"))
+
+    if ctx.invoked_subcommand is None:  # Print status if no subcommand
+        status(rescan=False, jobs=None, depth=None, budget_ms=None, output_format="table")
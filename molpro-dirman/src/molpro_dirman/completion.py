@@ -0,0 +1,220 @@
+# Shell completion for project names and serial prefixes, served from a cache keyed on the project roots' mtimes
+#
+# Creating / removing a project changes its root's mtime, so a cache hit costs a stat per root (plus one of the config
+# file) and one small read. The cache-hit path only uses os - config / pathlib and the READMEs are only read when
+# rebuilding. Completion requests for these arguments are answered here before typer is imported (see
+# answer_completion), since typer would load the whole CLI and drop any match that doesn't start with what was typed.
+
+import os
+import sys
+
+CACHE_FILENAME = "completion"
+CACHE_VERSION = "3"  # Bumped when the record layout changes
+# As in config - the cache is for one set of settings
+CONFIG_FILENAME, CONFIG_PATH_ENV = "config.toml", "MPDMAN_CONFIG"
+SETTINGS_OVERRIDE_ENV = ("MPDMAN_PROJECT_ROOTS", "MPDMAN_SYMLINK_DIRECTORY")
+COMPLETE_VAR = "_MOLPRO_DIRMAN_COMPLETE"  # Set by typer's completion scripts - click's '_{PROG_NAME}_COMPLETE'
+PROJECT, PREFIX = "p", "x"  # Record kinds in the cache
+DEACTIVATE_KEYWORDS = (("main", "The main project"), ("all", "Every linked project"))
+
+
+def default_cache_file() -> str:
+  "Location of the completion cache - mirrors Config.cache_directory(), without importing pathlib"
+  cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+  return os.path.join(cache_home, "molpro_dirman", CACHE_FILENAME)
+
+
+def default_config_file() -> str:
+  "Location of the config file - mirrors config.default_config_file(), without importing pathlib"
+  if os.environ.get(CONFIG_PATH_ENV):
+    return os.path.expanduser(os.environ[CONFIG_PATH_ENV])
+  config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+  return os.path.join(config_home, "molpro_dirman", CONFIG_FILENAME)
+
+
+def mtime_ns(path: str) -> int:
+  "mtime of a project root / the config file, or -1 while it's unavailable (eg: an unmounted disk)"
+  try:
+    return os.stat(path).st_mtime_ns
+  except OSError:
+    return -1
+
+
+def settings_stamp() -> str:
+  "Identifies the settings a cache was built with, without loading them - their env overrides and the config file's mtime"
+  config_file = default_config_file()
+  return "\t".join([*(os.environ.get(name, "") for name in SETTINGS_OVERRIDE_ENV), config_file, str(mtime_ns(config_file))])
+
+
+def load_cache(cache_file: str | None = None) -> str:
+  "Cached completion records, one per line - rebuilt first if projects were added / removed since"
+  cache_file = cache_file or default_cache_file()
+  try:
+    with open(cache_file) as fd:
+      header, _, body = fd.read().partition("\n")
+    version, stamp, *roots = header.split("\0")
+    fresh = (
+      version == CACHE_VERSION and stamp == settings_stamp()
+      and all(mtime_ns(root) == int(root_mtime) for root, root_mtime in zip(roots[::2], roots[1::2]))
+    )
+    if fresh:
+      return body
+  except (OSError, ValueError):
+    pass  # No cache yet, or a corrupt cache
+
+  return refresh_cache(cache_file)
+
+
+def refresh_cache(cache_file: str) -> str:
+  """Re-list projects and their titles in every root, and atomically rewrite the completion cache
+
+  Records are 'kind<NUL>value<NUL>help<NUL>search key', prefixes first. A project's search key is its name (with and
+  without the dash) and title, lowercased - so candidates can be found by searching the whole cache at once"""
+  from pathlib import Path
+  from .config import Config, Prefixes
+  from .local_read import project_title
+
+  header = [CACHE_VERSION, settings_stamp()]
+  projects: dict[str, str] = {}  # Name -> path, in the first root holding it
+  for root in Config.project_roots():
+    header += [str(root), str(mtime_ns(root))]  # Taken first, so changes made while we list invalidate the cache
+    try:
+      with os.scandir(root) as it:
+        for entry in it:
+          if entry.is_dir():
+            projects.setdefault(entry.name, entry.path)
+    except OSError:
+      continue  # Unavailable - picked up once its mtime can be read again
+
+  records = [(PREFIX, prefix, info.short, prefix.lower()) for prefix, info in Prefixes.definitions().items()]
+  for name in sorted(projects):
+    title = " ".join(project_title(Path(projects[name])).replace("\0", "").split())  # Kept to one line
+    records.append((PROJECT, name, title, f"{name.lower().replace('-', '')} {name.lower()} {title.lower()}"))
+  body = "\n".join("\0".join(record) for record in records)
+
+  os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+  tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+  with open(tmp_file, "w") as fd:
+    fd.write("\0".join(header) + "\n" + body)
+  os.replace(tmp_file, cache_file)
+  return body
+
+
+def records_containing(body: str, text: str):
+  "Cache records whose line contains text - found with str.find over the whole cache, so most lines are never split"
+  pos = body.find(text)
+  while pos != -1:
+    start = body.rfind("\n", 0, pos) + 1
+    end = body.find("\n", pos)
+    end = len(body) if end == -1 else end
+    yield body[start:end].split("\0")
+    pos = body.find(text, end)
+
+
+# MATCHING
+def match_rank(incomplete: str, name: str, title: str) -> int | None:
+  """How well a project matches what's been typed so far (lower is better), or None if it doesn't
+
+  In order: the name starts with it (case-insensitively, with or without the dash - 'do42' finds 'DO-4256663'); it's
+  digits found in the serial; it starts a word of the title"""
+  if not incomplete:
+    return 0
+  typed = incomplete.lower()
+  lowered = name.lower()
+  if lowered.startswith(typed) or lowered.replace("-", "").startswith(typed):
+    return 0
+  if typed.isdigit() and typed in name.rpartition("-")[2]:
+    return 1
+  if any(word.startswith(typed) for word in title.lower().split()):
+    return 2
+  return None
+
+
+# COMPLETION CALLBACKS - typer passes only what's been typed so far
+def complete_projects(incomplete: str) -> list[tuple[str, str]]:
+  "Project names matching what's been typed so far, best first, with their titles as help text"
+  body = load_cache()
+  records = records_containing(body, incomplete.lower()) if incomplete else (line.split("\0") for line in body.split("\n"))
+  ranked = []
+  for kind, name, title, _ in records:
+    rank = match_rank(incomplete, name, title) if kind == PROJECT else None
+    if rank is not None:
+      ranked.append((rank, name, title))
+  ranked.sort()
+  return [(name, title) for _, name, title in ranked]
+
+
+def complete_deactivate(incomplete: str) -> list[tuple[str, str]]:
+  "'main', 'all', or a project name"
+  keywords = [(word, help_text) for word, help_text in DEACTIVATE_KEYWORDS if word.startswith(incomplete.lower())]
+  return keywords + complete_projects(incomplete)
+
+
+def complete_prefixes(incomplete: str) -> list[tuple[str, str]]:
+  "Serial prefixes starting with what's been typed so far, with their meanings as help text"
+  matches = []
+  body = load_cache()
+  start = 0
+  while body.startswith(f"{PREFIX}\0", start):  # Prefixes come first
+    end = body.find("\n", start)
+    end = len(body) if end == -1 else end
+    _, prefix, short, _ = body[start:end].split("\0")
+    if prefix.startswith(incomplete.upper()):
+      matches.append((prefix, short))
+    start = end + 1
+  return matches
+
+
+# SHELL PROTOCOL - mirrors the output of typer's completion classes, for the shells typer installs scripts for
+def completion_callback(args: list[str]):
+  "The completion callback for the argument being typed after args, if it's one answered here"
+  if args == ["activate"]:
+    return complete_projects
+  if args == ["deactivate"]:
+    return complete_deactivate
+  if args[:1] == ["create"] and args[-1:] == ["--prefixes"]:
+    return complete_prefixes
+  return None
+
+
+def completion_request(environ) -> tuple[str, list[str], str] | None:
+  "(shell, args before the word being completed, word being completed) from a typer completion request"
+  shell = environ.get(COMPLETE_VAR, "").removeprefix("complete_")
+  if shell == "bash":
+    words = environ.get("COMP_WORDS", "").split()
+    cword = int(environ.get("COMP_CWORD", "0") or 0)
+    return shell, words[1:cword], words[cword] if cword < len(words) else ""
+  if shell in ("zsh", "fish"):
+    line = environ.get("_TYPER_COMPLETE_ARGS", "")
+    args = line.split()[1:]
+    incomplete = args.pop() if args and not line.endswith(" ") else ""
+    return shell, args, incomplete
+  return None
+
+
+def _zsh_escape(text: str) -> str:
+  return text.replace('"', '""').replace("'", "''").replace("$", "\\$").replace("`", "\\`").replace(":", r"\\:")
+
+
+def answer_completion(environ=os.environ) -> bool:
+  "Write completions for a typer completion request for a project name or prefix - returns whether it was one"
+  request = completion_request(environ)
+  if request is None or any(c in environ.get("COMP_WORDS", "") + environ.get("_TYPER_COMPLETE_ARGS", "") for c in "'\"\\"):
+    return False  # Quoting needs click's argument splitting - leave it to typer
+  shell, args, incomplete = request
+  callback = completion_callback(args)
+  if callback is None:
+    return False
+
+  items = callback(incomplete)
+  if shell == "bash":
+    sys.stdout.write("\n".join(value for value, _ in items))
+  elif shell == "zsh":
+    lines = [f'"{_zsh_escape(value)}":"{_zsh_escape(help_text)}"' if help_text else f'"{_zsh_escape(value)}"' for value, help_text in items]
+    listing = "\n".join(lines)
+    sys.stdout.write(f"_arguments '*: :(({listing}))'" if lines else "_files")
+  elif environ.get("_TYPER_COMPLETE_FISH_ACTION") == "is-args":
+    sys.exit(0 if items else 1)
+  else:
+    sys.stdout.write("\n".join(f"{value}\t{help_text}" if help_text else value for value, help_text in items))
+  return True
@@ -1,16 +1,200 @@
 # Utils for interacting with local config files
+#
+# Settings come from an optional TOML file (see default_config_file), overridden by MPDMAN_* env vars. The file is parsed
+# once into an immutable Settings object with its regexes precompiled - Config's static methods only read from it.
 
+import os
 import re
 from pathlib import Path
+from functools import lru_cache
+from string import ascii_uppercase
 from collections import namedtuple
-from typing import Union
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple, Optional, Union
+
+from .errors import InvalidConfig
+
+
+CONFIG_FILENAME = "config.toml"
+CONFIG_PATH_ENV = "MPDMAN_CONFIG"  # Config file to read instead of the default, eg: for tests and benchmarks
+PROJECT_ROOTS_ENV = "MPDMAN_PROJECT_ROOTS"  # os.pathsep separated, eg: ~/Projects:/mnt/archive/Projects
+SYMLINK_DIRECTORY_ENV = "MPDMAN_SYMLINK_DIRECTORY"
+SETTINGS_ENV = ("HOME", "XDG_CONFIG_HOME", CONFIG_PATH_ENV, PROJECT_ROOTS_ENV, SYMLINK_DIRECTORY_ENV)  # Settings are reloaded if any change
+
+PROJECT_NAME_REGEX = r"[A-Z]+-\d{7}"
+PROJECT_NAME_PATTERN = re.compile(PROJECT_NAME_REGEX)
+
+PrefixDescription = namedtuple(
+    "PrefixDescription",
+    ["short", "long"],
+)
+
+DEFAULT_PREFIXES = {
+    "A": PrefixDescription(
+        short="Artistic",
+        long="Has major artistic or aesthetic aspect - renders, artwork, graphic design, image editing, etc"
+    ),
+    "C": PrefixDescription(
+        short="Collaborative",
+        long="Was created in cooperation with 1 or more other outside parties - not all rights to project materials may belong to MolarFox or MolarFox Prototyping SP"
+    ),
+    "D": PrefixDescription(
+        short="Digital / Software",
+        long="Involved development of software or code"
+    ),
+    "F": PrefixDescription(
+        short="Additive Manufacturing",
+        long="Involved some form of additive manufacturing (FDM / SLA / SLS / etc)"
+    ),
+    "H": PrefixDescription(
+        short="Hardware",
+        long="Involved production / modification of physical item (beyond simple additive manufacturing)"
+    ),
+    "O": PrefixDescription(
+        short="Open Source",
+        long="Created as open source - projects that were initially closed source may lack this prefix"
+    ),
+    "P": PrefixDescription(
+        short="Prototype",
+        long="Created with the intention of not being production ready"
+    ),
+    "R": PrefixDescription(
+        short="Restricted",
+        long="Project metadata and contents are subject to tighter security and access restrictions"
+    ),
+    "S": PrefixDescription(
+        short="Special",
+        long="Special purpose - eg: gifts, metaprojects, milestone projects"
+    ),
+}
+
+
+# SETTINGS
+class Settings(NamedTuple):
+    "Loaded configuration - immutable, so it can be shared freely once loaded"
+    config_file: Optional[Path]  # File the settings were read from, if one exists
+    project_roots: tuple[Path, ...]
+    symlink_directory: Path
+    main_symlink_name: str
+    aux_symlink_prefix: str
+    prefixes: Mapping[str, PrefixDescription]
+    ignore_patterns: tuple[str, ...]  # Walked directories to prune in every project, on top of walk.DEFAULT_IGNORE_PATTERNS
+    symlink_pattern: re.Pattern  # Fullmatches main and aux symlink names
+
+
+def default_config_file() -> Path:
+    "Location of the config file - $MPDMAN_CONFIG, else config.toml under $XDG_CONFIG_HOME (or ~/.config)"
+    if os.environ.get(CONFIG_PATH_ENV):
+        return Path(os.environ[CONFIG_PATH_ENV]).expanduser()
+    return Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config") / "molpro_dirman" / CONFIG_FILENAME
+
+
+def read_config_file(path: Path) -> dict[str, Any]:
+    "Parsed contents of a TOML config file - empty if there isn't one"
+    try:
+        with open(path, "rb") as fd:
+            text = fd.read().decode()
+    except FileNotFoundError:
+        return {}
+    except UnicodeDecodeError as e:
+        raise InvalidConfig(f"{path}: {e}") from e
+
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise InvalidConfig(f"Reading {path} needs Python 3.11+, or the tomli package installed") from None
+    try:
+        return tomllib.loads(text)
+    except tomllib.TOMLDecodeError as e:
+        raise InvalidConfig(f"{path}: {e}") from e
+
+
+def _check_keys(table: dict, known: set[str], where: str) -> None:
+    "Reject unknown keys in a config table (ie: typos)"
+    unknown = set(table) - known
+    if unknown:
+        raise InvalidConfig(f"Unknown setting(s) in {where}: {', '.join(sorted(unknown))}")
+
+
+def _table(data: dict, key: str, known: set[str], where: str = "") -> dict:
+    "A sub-table of the config, checked for unknown keys"
+    table = data.get(key, {})
+    if not isinstance(table, dict):
+        raise InvalidConfig(f"{where}{key} should be a table")
+    _check_keys(table, known, where + key)
+    return table
+
+
+def _value(table: dict, key: str, kind: type, default: Any, where: str) -> Any:
+    value = table.get(key, default)
+    if not isinstance(value, kind) or (kind is list and not all(isinstance(item, str) for item in value)):
+        raise InvalidConfig(f"{where}{key} should be a {'list of strings' if kind is list else kind.__name__}")
+    return value
+
+
+def parse_settings(data: dict[str, Any], config_file: Optional[Path] = None, environ: Mapping[str, str] = os.environ) -> Settings:
+    "Settings from parsed config file contents, with env var overrides applied and regexes compiled"
+    _check_keys(data, {"project_roots", "symlink_directory", "naming", "prefixes", "walk"}, "the config file")
+    naming = _table(data, "naming", {"main_symlink", "aux_symlink_prefix"})
+    walk = _table(data, "walk", {"ignore"})
+
+    roots = [root for root in environ.get(PROJECT_ROOTS_ENV, "").split(os.pathsep) if root]
+    roots = roots or _value(data, "project_roots", list, ["~/Projects"], "")
+    if not roots:
+        raise InvalidConfig("project_roots should hold at least one directory")
+    symlink_directory = environ.get(SYMLINK_DIRECTORY_ENV) or _value(data, "symlink_directory", str, "~", "")
+
+    prefixes = dict(DEFAULT_PREFIXES)
+    for prefix in _table(data, "prefixes", set(ascii_uppercase)):
+        info = _table(data["prefixes"], prefix, {"short", "long"}, "prefixes.")
+        short = _value(info, "short", str, None, f"prefixes.{prefix}.")
+        prefixes[prefix] = PrefixDescription(short=short, long=_value(info, "long", str, short, f"prefixes.{prefix}."))
+
+    main_symlink_name = _value(naming, "main_symlink", str, "current_project", "naming.")
+    aux_symlink_prefix = _value(naming, "aux_symlink_prefix", str, "project_", "naming.")
+    return Settings(
+        config_file=config_file,
+        project_roots=tuple(Path(root).expanduser() for root in roots),
+        symlink_directory=Path(symlink_directory).expanduser(),
+        main_symlink_name=main_symlink_name,
+        aux_symlink_prefix=aux_symlink_prefix,
+        prefixes=MappingProxyType(prefixes),
+        ignore_patterns=tuple(pattern.strip("/") for pattern in _value(walk, "ignore", list, [], "walk.")),
+        symlink_pattern=re.compile(f"{re.escape(main_symlink_name)}|{re.escape(aux_symlink_prefix)}{PROJECT_NAME_REGEX}"),
+    )
+
+
+@lru_cache(maxsize=1)
+def _load_settings(env: tuple[Optional[str], ...]) -> Settings:
+    path = default_config_file()
+    data = read_config_file(path)
+    return parse_settings(data, path if data else None)
+
+
+def settings() -> Settings:
+    "The loaded settings - the config file is read once, and again only if one of SETTINGS_ENV changes"
+    return _load_settings(tuple(os.environ.get(name) for name in SETTINGS_ENV))
+
+
+def reload_settings() -> Settings:
+    "Re-read the config file, eg: after it's been edited"
+    _load_settings.cache_clear()
+    return settings()
 
 
 def symlink_name(project_name: str, is_main: bool = True) -> str:
     "Name to be used for symlink(s) - naming differs if intended as main or aux project"
     if is_main:
-        return "current_project"
-    return f"project_{project_name}"
+        return settings().main_symlink_name
+    return f"{settings().aux_symlink_prefix}{project_name}"
+
+
+def format_project_name(prefixes: list[str], serial: int) -> str:
+    "Project directory name for a set of prefixes and a serial, eg: DO-4256663"
+    return f"{''.join(sorted(prefixes))}-{str(serial).zfill(7)}"
 
 
 class Config:
@@ -21,13 +205,78 @@ class Config:
 
     @staticmethod
     def base_project_directory() -> Path:
-        "Directory path object within which all project directories are being stored"
-        return Path.home() / "Projects"
+        "Directory path object within which all project directories are being stored - the first project root"
+        return settings().project_roots[0]
+
+    @staticmethod
+    def project_roots() -> list[Path]:
+        "Directories holding project directories, eg: on different disks - new projects are created in the first"
+        return [Config.base_project_directory(), *settings().project_roots[1:]]
 
     @staticmethod
     def base_symlink_directory() -> Path:
         "Directory path object where symlinks to active projects should be created"
-        return Path.home()
+        return settings().symlink_directory
+
+    @staticmethod
+    def cache_directory() -> Path:
+        "Directory path object where persistent caches and indexes are stored"
+        return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "molpro_dirman"
+
+    @staticmethod
+    def index_path() -> Path:
+        "Path of the on-disk project activity index"
+        return Config.cache_directory() / "activity.sqlite3"
+
+    @staticmethod
+    def search_index_path() -> Path:
+        "Path of the on-disk full-text index of project READMEs"
+        return Config.cache_directory() / "search.sqlite3"
+
+    @staticmethod
+    def socket_path() -> Path:
+        "Path of the Unix socket the daemon (molpro_dirman serve) listens on"
+        return Config.cache_directory() / "serve.sock"
+
+    @staticmethod
+    def catalog_file_path() -> Path:
+        "Path of the memory-mapped binary index of projects and symlinks"
+        return Config.cache_directory() / "catalog.bin"
+
+    @staticmethod
+    def manifest_path() -> Path:
+        "Path of the manifest recording symlinks created by mpdman"
+        return Config.cache_directory() / "symlinks.json"
+
+    @staticmethod
+    def sync_state_path() -> Path:
+        "Path of the record of serials known to be held by the serial registry"
+        return Config.cache_directory() / "registry.json"
+
+    @staticmethod
+    def journal_path() -> Path:
+        "Path of the write-ahead journal of serial events awaiting registration"
+        return Config.cache_directory() / "journal.ndjson"
+
+    @staticmethod
+    def registry_url() -> Optional[str]:
+        "Base URL of the serial DBMS (registry), if one is configured"
+        return os.environ.get("MPDMAN_REGISTRY_URL") or None
+
+    @staticmethod
+    def registry_token() -> Optional[str]:
+        "Bearer token for the serial registry, if it needs one"
+        return os.environ.get("MPDMAN_REGISTRY_TOKEN") or None
+
+    @staticmethod
+    def project_name_regex() -> str:
+        "Regex matching a project directory name, eg: DO-4256663"
+        return PROJECT_NAME_REGEX
+
+    @staticmethod
+    def project_name_pattern() -> re.Pattern:
+        "Compiled project_name_regex"
+        return PROJECT_NAME_PATTERN
 
     @staticmethod
     def main_project_symlink_name() -> str:
@@ -38,8 +287,8 @@ class Config:
         "Regex matching main and/or aux project symlink names - expects to be run in multiline mode"
         return r"|".join(
             s for s in [
-                include_main and r"^current_project$",
-                include_aux and r"^project_[A-Z]+-\d{7}$",
+                include_main and f"^{re.escape(settings().main_symlink_name)}$",
+                include_aux and f"^{re.escape(settings().aux_symlink_prefix)}{PROJECT_NAME_REGEX}$",
             ] if s
         )
 
@@ -47,57 +296,17 @@ class Config:
     def matches_symlink_regex(symlink: Union[Path, str], **kwargs) -> bool:
         if isinstance(symlink, Path):
             symlink = symlink.parts[-1]
-        return re.fullmatch(Config.symlink_name_regex(), symlink) is not None
+        return settings().symlink_pattern.fullmatch(symlink) is not None
 
 
 # PREFIX DESCRIPTIONS
 class Prefixes:
-    PrefixDescription = namedtuple(
-        "PrefixDescription",
-        ["short", "long"],
-    )
+    PrefixDescription = PrefixDescription
 
     @staticmethod
-    def definitions() -> dict[str, PrefixDescription]:
-        "Dictionary mapping serial prefix characters to their meanings"
-        return {
-            "A": Prefixes.PrefixDescription(
-                short="Artistic",
-                long="Has major artistic or aesthetic aspect - renders, artwork, graphic design, image editing, etc"
-            ),
-            "C": Prefixes.PrefixDescription(
-                short="Collaborative",
-                long="Was created in cooperation with 1 or more other outside parties - not all rights to project materials may belong to MolarFox or MolarFox Prototyping SP"
-            ),
-            "D": Prefixes.PrefixDescription(
-                short="Digital / Software",
-                long="Involved development of software or code"
-            ),
-            "F": Prefixes.PrefixDescription(
-                short="Additive Manufacturing",
-                long="Involved some form of additive manufacturing (FDM / SLA / SLS / etc)"
-            ),
-            "H": Prefixes.PrefixDescription(
-                short="Hardware",
-                long="Involved production / modification of physical item (beyond simple additive manufacturing)"
-            ),
-            "O": Prefixes.PrefixDescription(
-                short="Open Source",
-                long="Created as open source - projects that were initially closed source may lack this prefix"
-            ),
-            "P": Prefixes.PrefixDescription(
-                short="Prototype",
-                long="Created with the intention of not being production ready"
-            ),
-            "R": Prefixes.PrefixDescription(
-                short="Restricted",
-                long="Project metadata and contents are subject to tighter security and access restrictions"
-            ),
-            "S": Prefixes.PrefixDescription(
-                short="Special",
-                long="Special purpose - eg: gifts, metaprojects, milestone projects"
-            ),
-        }
+    def definitions() -> Mapping[str, PrefixDescription]:
+        "Read-only mapping of serial prefix characters to their meanings - the defaults, plus any from the config file"
+        return settings().prefixes
 
     @staticmethod
     def as_dict(verbose: bool = False) -> dict[dict[str, str]]:
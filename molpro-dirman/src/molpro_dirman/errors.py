@@ -17,4 +17,19 @@ class ProjectAlreadyExists(Exception):
   "Project could not be created as it already exists"
 
 class SerialGenerationError(Exception):
-  "An error occurred whilst attempting to generate a unique serial"
\ No newline at end of file
+  "An error occurred whilst attempting to generate a unique serial"
+
+class RegistryError(Exception):
+  "The serial registry could not be reached, or rejected a request"
+
+class InvalidConfig(Exception):
+  "The config file could not be read, or holds invalid settings"
+
+class WatcherAlreadyRunning(Exception):
+  "Another watcher is already keeping the activity index up to date"
+
+class DaemonError(Exception):
+  "The daemon failed to answer a request, or rejected it"
+
+class DaemonSettingsMismatch(DaemonError):
+  "The daemon runs with other settings (env overrides / config file) than the client, so the command runs in-process"
@@ -0,0 +1,39 @@
+# Dependency-free fast paths, for commands called from shell prompts and status lines where import time dominates
+
+import os
+
+
+def active_plain() -> None:
+  "Print 'symlink<TAB>project' for each mounted project - readlinks only, no activity scans"
+  from .local_read import Project
+
+  for link in sorted(Project.all_symlinks()):
+    print(f"{link.parts[-1]}\t{os.path.basename(os.readlink(link))}")
+
+
+def prompt(show_aux: bool = False) -> None:
+  "Print the shell prompt segment for the active project"
+  from .prompt import main
+
+  main(["--aux"] if show_aux else [])
+
+
+# Exact argv matches that can be answered without loading the typer app
+FAST_PATHS = {
+  ("active", "--plain"): active_plain,
+  ("prompt",): prompt,
+  ("prompt", "--aux"): lambda: prompt(show_aux=True),
+}
+
+
+def run_fast_path(argv: list[str]) -> bool:
+  "Run the fast path matching argv exactly, if any - returns whether one was run"
+  if "_MOLPRO_DIRMAN_COMPLETE" in os.environ:  # Shell completion request, see completion.COMPLETE_VAR
+    from .completion import answer_completion
+    return answer_completion()
+
+  command = FAST_PATHS.get(tuple(argv))
+  if command is None:
+    return False
+  command()
+  return True
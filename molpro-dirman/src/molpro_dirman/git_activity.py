@@ -0,0 +1,232 @@
+# Activity of git repositories from git's own metadata, instead of walking the working tree (and .git)
+#
+# A repository's activity is the latest mtime of: its index, HEAD, reflog and refs; the tracked files whose stat no
+# longer matches the index (ie: modified since last staged); and the directories holding tracked files (so added,
+# removed and renamed files count). Untracked build outputs and .git/objects are never touched. This reflects
+# modifications and git operations, not reads - the index is parsed directly, git is never run.
+
+import os
+import struct
+import hashlib
+from pathlib import Path
+from typing import Iterator, Optional
+
+GIT_DIRNAME = ".git"
+INDEX_SIGNATURE = b"DIRC"
+SUPPORTED_INDEX_VERSIONS = (2, 3, 4)
+UNSUPPORTED_EXTENSIONS = (b"link",)  # Split index - entries live in a shared index file
+METADATA_FILES = ("index", "HEAD", "ORIG_HEAD", "FETCH_HEAD", "packed-refs", "logs/HEAD")
+
+GITLINK_MODE = 0o160000  # Submodule commit - not a file in this repository
+DIRECTORY_MODE = 0o040000  # Sparse index directory entry
+EXTENDED_FLAG = 0x4000
+
+
+def git_directory(repo_path: Path) -> Optional[Path]:
+  "The repository's git directory - .git itself, or where a .git file (worktree / submodule) points"
+  dot_git = repo_path / GIT_DIRNAME
+  if dot_git.is_dir():
+    return dot_git
+  try:
+    content = dot_git.read_text().strip()
+  except (OSError, UnicodeDecodeError):
+    return None
+  if not content.startswith("gitdir:"):
+    return None
+  return (repo_path / content[len("gitdir:"):].strip()).resolve()
+
+
+def project_repositories(project_path: Path) -> list[str]:
+  "Repositories in a project, relative to it - [''] if the project is a repository, else its top-level subdirectories that are"
+  if os.path.lexists(project_path / GIT_DIRNAME):
+    return [""]
+  try:
+    with os.scandir(project_path) as it:
+      return sorted(
+        entry.name for entry in it
+        if entry.is_dir(follow_symlinks=False) and os.path.lexists(os.path.join(entry.path, GIT_DIRNAME))
+      )
+  except (FileNotFoundError, NotADirectoryError, PermissionError):
+    return []
+
+
+def _hash_size(git_dir: Path) -> int:
+  "Object id length - 32 bytes for SHA-256 repositories, else 20"
+  try:
+    config = (git_dir / "config").read_text()
+  except (OSError, UnicodeDecodeError):
+    return 20
+  for line in config.splitlines():
+    key, _, value = line.partition("=")
+    if key.strip().lower() == "objectformat" and value.strip().lower() == "sha256":
+      return 32
+  return 20
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+  "Decode git's offset varint (as used by index v4 path compression), returning the value and the next position"
+  byte = data[pos]
+  pos += 1
+  value = byte & 0x7F
+  while byte & 0x80:
+    byte = data[pos]
+    pos += 1
+    value = ((value + 1) << 7) + (byte & 0x7F)
+  return value, pos
+
+
+def read_index(git_dir: Path) -> Optional[list[tuple[bytes, int, int, int]]]:
+  """(path, mtime seconds, mtime nanoseconds, size) for each file in the git index
+
+  None if there's no index or it's in a format not understood here - callers should fall back to walking"""
+  try:
+    data = (git_dir / "index").read_bytes()
+  except OSError:
+    return None
+  if len(data) < 12 or data[:4] != INDEX_SIGNATURE:
+    return None
+  version, count = struct.unpack_from(">II", data, 4)
+  if version not in SUPPORTED_INDEX_VERSIONS:
+    return None
+
+  hash_size = _hash_size(git_dir)
+  header = struct.Struct(f">10I{hash_size}sH")  # ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, object id, flags
+  entries = []
+  previous_name = b""
+  offset = 12
+  try:
+    for _ in range(count):
+      fields = header.unpack_from(data, offset)
+      mtime_s, mtime_ns, mode, size, flags = fields[2], fields[3], fields[6], fields[9], fields[11]
+      pos = offset + header.size
+      if version >= 3 and flags & EXTENDED_FLAG:
+        pos += 2
+
+      if version == 4:  # Path prefix-compressed against the previous entry, no padding
+        strip, pos = _varint(data, pos)
+        end = data.index(b"\0", pos)
+        name = previous_name[:len(previous_name) - strip] + data[pos:end]
+        offset = end + 1
+      else:  # NUL terminated and padded to a multiple of 8 bytes
+        end = data.index(b"\0", pos)
+        name = data[pos:end]
+        offset += (end - offset + 8) & ~7
+      previous_name = name
+
+      if mode & 0o170000 not in (GITLINK_MODE, DIRECTORY_MODE):
+        entries.append((name, mtime_s, mtime_ns, size))
+
+    while offset + 8 <= len(data) - hash_size:  # Extensions, then the checksum
+      signature, length = struct.unpack_from(">4sI", data, offset)
+      if signature in UNSUPPORTED_EXTENSIONS:
+        return None
+      offset += 8 + length
+  except (struct.error, ValueError):
+    return None  # Truncated / corrupt - perhaps mid-write by git
+  return entries
+
+
+def metadata_stats(git_dir: Path) -> Iterator[tuple[str, os.stat_result]]:
+  "(path, stat) of the git metadata files and loose refs - what staging, commits, checkouts and fetches touch"
+  for name in METADATA_FILES:
+    try:
+      yield name, os.stat(git_dir / name)
+    except OSError:
+      continue
+  stack = [os.fspath(git_dir / "refs")]
+  while stack:  # Loose refs - a handful of small files
+    try:
+      with os.scandir(stack.pop()) as it:
+        for entry in it:
+          if entry.is_dir(follow_symlinks=False):
+            stack.append(entry.path)
+          yield entry.path, entry.stat(follow_symlinks=False)
+    except OSError:
+      continue
+
+
+def _stamp(metadata: list[tuple[str, os.stat_result]], directories: list[tuple[str, Optional[os.stat_result]]]) -> str:
+  stats = sorted((path, stat_result.st_mtime_ns, stat_result.st_size) for path, stat_result in metadata)
+  stats += [(directory, stat_result.st_mtime_ns if stat_result else -1) for directory, stat_result in directories]
+  return hashlib.blake2b(repr(stats).encode(), digest_size=16).hexdigest()
+
+
+def _directory_stats(repo_path: Path, directories: list[str]) -> list[tuple[str, Optional[os.stat_result]]]:
+  "(directory, stat) for directories relative to a repository - None for any that have gone"
+  stats = []
+  for directory in directories:
+    try:
+      stats.append((directory, os.stat(os.path.join(repo_path, directory) if directory else repo_path)))
+    except (FileNotFoundError, NotADirectoryError):
+      stats.append((directory, None))
+  return stats
+
+
+def repository_stamp(repo_path: Path, directories: list[str]) -> Optional[str]:
+  """Digest of a repository's git metadata (index, HEAD, refs...) and of the mtimes of its tracked directories - None if
+  it isn't one. Changes with any git operation, and any file added, removed or replaced (eg: an editor's atomic save)
+  among those directories, but not with a file edited in place"""
+  git_dir = git_directory(repo_path)
+  if git_dir is None:
+    return None
+  return _stamp(list(metadata_stats(git_dir)), _directory_stats(repo_path, directories))
+
+
+def repository_state(repo_path: Path) -> Optional[tuple[float, list[str], str]]:
+  """Most recent modification in a repository, from git metadata and the tracked files' stats, along with its tracked
+  directories (relative, '' for the repository itself) and its repository_stamp - None if it can't be read"""
+  git_dir = git_directory(repo_path)
+  metadata = list(metadata_stats(git_dir)) if git_dir is not None else []  # Before the index, which it covers
+  entries = read_index(git_dir) if git_dir is not None else None
+  if entries is None:
+    return None
+
+  latest = 0.0
+  for _, stat_result in metadata:
+    latest = max(latest, stat_result.st_mtime)
+
+  directories = {b""}
+  for name, _, _, _ in entries:
+    parent = name.rpartition(b"/")[0]
+    while parent not in directories:  # And its ancestors, which record subdirectories being added / removed
+      directories.add(parent)
+      parent = parent.rpartition(b"/")[0]
+  directory_names = sorted(os.fsdecode(directory) for directory in directories)
+  directory_stats = _directory_stats(repo_path, directory_names)  # Before the files, so later changes restamp it
+  for _, stat_result in directory_stats:
+    if stat_result is not None:
+      latest = max(latest, stat_result.st_mtime)
+
+  root = os.fsencode(repo_path)
+  for name, mtime_s, mtime_ns, size in entries:
+    try:
+      stat_result = os.lstat(root + b"/" + name)
+    except (FileNotFoundError, NotADirectoryError):
+      continue  # Deleted - its directory's mtime records that
+    changed = (
+      int(stat_result.st_mtime) != mtime_s
+      or (mtime_ns and stat_result.st_mtime_ns % 1_000_000_000 != mtime_ns)
+      or stat_result.st_size & 0xFFFFFFFF != size
+    )
+    if changed:
+      latest = max(latest, stat_result.st_mtime)
+  return latest, directory_names, _stamp(metadata, directory_stats)
+
+
+def repository_activity(repo_path: Path) -> Optional[float]:
+  "Most recent modification in a repository, from git metadata and the tracked files' stats - None if it can't be read"
+  state = repository_state(repo_path)
+  return state[0] if state is not None else None
+
+
+def repositories_activity(project_path: Path) -> tuple[Optional[float], set[str]]:
+  """Latest activity across a project's repositories, and which of them (relative names, '' for the project itself)
+  that covers - repositories whose index couldn't be read are left out, to be walked as normal"""
+  latest: Optional[float] = None
+  covered: set[str] = set()
+  for repo in project_repositories(project_path):
+    activity = repository_activity(project_path / repo if repo else project_path)
+    if activity is not None:
+      latest = activity if latest is None else max(latest, activity)
+      covered.add(repo)
+  return latest, covered
@@ -0,0 +1,417 @@
+# Persistent on-disk index of project activity, so listings don't rewalk every project each run
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .config import Config
+from .walk import map_per_root, entry_activity, ignore_patterns, is_ignored, max_activity
+from .git_activity import project_repositories, repository_state, repository_stamp
+
+SCHEMA_VERSION = 4
+SQLITE_BUSY_TIMEOUT = 30  # Seconds to wait on another writer (other workers / CLI invocations)
+WATCHER_TIMEOUT = 15  # Seconds without a heartbeat before a watcher's projects are walked again (see watch.py)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS directories (
+  path TEXT PRIMARY KEY,
+  mtime_ns INTEGER NOT NULL,
+  files_max REAL,
+  subdirs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (
+  path TEXT PRIMARY KEY,
+  last_activity REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS listings (
+  path TEXT PRIMARY KEY,
+  mtime_ns INTEGER NOT NULL,
+  entries TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watched (
+  path TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS repositories (
+  path TEXT PRIMARY KEY,
+  stamp TEXT NOT NULL,
+  directories TEXT NOT NULL,
+  last_activity REAL NOT NULL
+);
+"""
+
+
+def process_alive(pid: int) -> bool:
+  "Whether a process is still running"
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    pass  # Exists, but belongs to someone else
+  return True
+
+
+def _subtree(root) -> tuple[str, str, str]:
+  "Query parameters matching a path and everything within it: the path itself, then the bounds of its descendants"
+  prefix = str(root).rstrip(os.sep) + os.sep
+  return str(root), prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class ActivityIndex:
+  "SQLite-backed cache of the most recent atime / mtime per project, and per directory within each project"
+
+  def __init__(self, db_path: Optional[Path] = None):
+    self.db_path = Path(db_path or Config.index_path())
+    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+    self._local = threading.local()
+    self._connections: dict[threading.Thread, sqlite3.Connection] = {}
+    self._connections_lock = threading.Lock()
+    self._migrate()
+
+  def __enter__(self) -> "ActivityIndex":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  @property
+  def conn(self) -> sqlite3.Connection:
+    "Connection for the calling thread - sqlite connections aren't shared between scan workers"
+    conn = getattr(self._local, "conn", None)
+    if conn is None:
+      conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+      self._local.conn = conn
+      with self._connections_lock:
+        self._connections[threading.current_thread()] = conn
+    return conn
+
+  def close(self) -> None:
+    with self._connections_lock:
+      for conn in self._connections.values():
+        conn.close()
+      self._connections.clear()
+    self._local = threading.local()
+
+  def close_thread(self) -> None:
+    "Close the calling thread's connection, if it has one - eg: as a request handler's thread finishes"
+    conn = getattr(self._local, "conn", None)
+    if conn is not None:
+      with self._connections_lock:
+        self._connections.pop(threading.current_thread(), None)
+      conn.close()
+      del self._local.conn
+
+  def close_finished_threads(self) -> None:
+    "Close the connections of threads that have exited - for long-running watchers / daemons, whose workers come and go"
+    with self._connections_lock:
+      for thread in [thread for thread in self._connections if not thread.is_alive()]:
+        self._connections.pop(thread).close()
+
+  def _migrate(self) -> None:
+    "Create tables, dropping any index written by an incompatible version"
+    row = None
+    try:
+      row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    except sqlite3.OperationalError:
+      pass  # Fresh database, no meta table yet
+
+    if row is not None and int(row[0]) != SCHEMA_VERSION:
+      with self.conn:
+        for table in ("meta", "directories", "projects", "listings", "watched", "repositories"):
+          self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    self.conn.execute("PRAGMA journal_mode=WAL")  # Let workers read while another writes
+    with self.conn:
+      self.conn.executescript(SCHEMA)
+      self.conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+      )
+
+  # DIRECTORY LISTINGS
+  def list_subdirectories(self, path: Path, rescan: bool = False) -> list[Path]:
+    "Subdirectories of path, re-listed only if the directory's mtime changed since last cached"
+    return [path / name for name in self.list_subdirectory_names(path, rescan=rescan)]
+
+  def list_subdirectory_names(self, path: Path, rescan: bool = False) -> list[str]:
+    "Names of the subdirectories of path, sorted - as list_subdirectories, without making a Path for each"
+    key = str(path)
+    mtime_ns = os.stat(key).st_mtime_ns
+    row = self.conn.execute("SELECT mtime_ns, entries FROM listings WHERE path = ?", (key,)).fetchone()
+    if row is not None and row[0] == mtime_ns and not rescan:
+      return json.loads(row[1])
+
+    with os.scandir(key) as it:
+      names = sorted(entry.name for entry in it if entry.is_dir())
+    with self.conn:
+      self.conn.execute(
+        "INSERT OR REPLACE INTO listings (path, mtime_ns, entries) VALUES (?, ?, ?)",
+        (key, mtime_ns, json.dumps(names))
+      )
+    return names
+
+  # ACTIVITY TIMESTAMPS
+  def cached_timestamp(self, path: Path) -> Optional[float]:
+    "Last recorded activity timestamp for a project, without touching the filesystem"
+    row = self.conn.execute("SELECT last_activity FROM projects WHERE path = ?", (str(path),)).fetchone()
+    return row[0] if row else None
+
+  def project_timestamp(self, path: Path, rescan: bool = False) -> float:
+    """Most recent atime / mtime of anything within a project directory
+
+    Every directory is stat'd, but files are only re-stat'd in directories whose mtime changed
+    since the last run (ie: entries were added, removed or renamed). Use rescan to force a full walk.
+    Directories matching the project's ignore patterns are pruned, as in walk_activity, and git repositories are
+    read from git's metadata rather than walked, as in project_activity."""
+    root = str(path)
+    patterns = ignore_patterns(path)
+    cached = self._cached_directories(root)
+    visited: set[str] = set()
+    updates: list[tuple] = []
+    latest, repos = self.repositories_activity(path, rescan=rescan)
+
+    stack = [("", root)]
+    if "" in repos:  # Nothing to walk if the whole project is a repository - but keep its root's row for top_projects
+      stack = []
+      visited.add(root)
+      updates.append((root, os.stat(root).st_mtime_ns, None, "[]"))
+    while stack:
+      relative_dir, dir_path = stack.pop()
+      try:
+        dir_stat = os.stat(dir_path, follow_symlinks=False)
+      except FileNotFoundError:
+        continue  # Removed mid-walk
+      visited.add(dir_path)
+
+      if dir_path != root:  # Subdirectories count towards activity, as with a recursive glob
+        latest = max_activity(latest, entry_activity(dir_stat))
+
+      row = cached.get(dir_path)
+      if row is not None and row[0] == dir_stat.st_mtime_ns and not rescan:
+        files_max, subdirs = row[1], json.loads(row[2])
+      else:
+        files_max, subdirs = self._scan_directory(dir_path)
+        updates.append((dir_path, dir_stat.st_mtime_ns, files_max, json.dumps(subdirs)))
+
+      latest = max_activity(latest, files_max)
+      for name in subdirs:
+        relative_path = f"{relative_dir}/{name}" if relative_dir else name
+        if not is_ignored(relative_path, patterns) and relative_path not in repos:
+          stack.append((relative_path, os.path.join(dir_path, name)))
+
+    if latest is None:  # Empty project - fall back to the directory's own timestamps
+      latest = entry_activity(os.stat(root))
+
+    stale = [(key,) for key in cached.keys() - visited]
+    with self.conn:
+      self.conn.executemany(
+        "INSERT OR REPLACE INTO directories (path, mtime_ns, files_max, subdirs) VALUES (?, ?, ?, ?)", updates
+      )
+      self.conn.executemany("DELETE FROM directories WHERE path = ?", stale)
+      self.conn.execute(
+        "INSERT OR REPLACE INTO projects (path, last_activity) VALUES (?, ?)", (root, latest)
+      )
+    return latest
+
+  def repositories_activity(self, path: Path, rescan: bool = False) -> tuple[Optional[float], set[str]]:
+    """As git_activity.repositories_activity, reusing each repository's activity while its repository_stamp is unchanged
+
+    Tracked files are only re-stat'd once the git metadata (index, HEAD, refs) or a tracked directory's mtime changes,
+    ie: on git operations, and on files being added, removed or replaced (as editors' atomic saves do). As with walked
+    directories, files edited in place in between are picked up by a rescan, or by a watcher"""
+    rows = self.conn.execute(
+      "SELECT path, stamp, directories, last_activity FROM repositories WHERE path = ? OR (path >= ? AND path < ?)",
+      _subtree(path)
+    )
+    cached = {row[0]: row[1:] for row in rows}
+    latest: Optional[float] = None
+    covered: set[str] = set()
+    updates: list[tuple] = []
+    for repo in project_repositories(path):
+      repo_path = path / repo if repo else path
+      row = cached.get(str(repo_path))
+      if row is not None and not rescan and repository_stamp(repo_path, json.loads(row[1])) == row[0]:
+        activity = row[2]
+      else:
+        state = repository_state(repo_path)
+        if state is None:
+          continue  # Walked as normal
+        activity, directories, stamp = state
+        updates.append((str(repo_path), stamp, json.dumps(directories), activity))
+      latest = activity if latest is None else max(latest, activity)
+      covered.add(repo)
+
+    stale = [(key,) for key in cached.keys() - {str(path / repo if repo else path) for repo in covered}]
+    if updates or stale:
+      with self.conn:
+        self.conn.executemany(
+          "INSERT OR REPLACE INTO repositories (path, stamp, directories, last_activity) VALUES (?, ?, ?, ?)", updates
+        )
+        self.conn.executemany("DELETE FROM repositories WHERE path = ?", stale)
+    return latest, covered
+
+  def project_timestamps(self, paths: list[Path], rescan: bool = False, jobs: Optional[int] = None) -> list[float]:
+    "Activity timestamps for many projects, walked concurrently with a thread pool per root - in the order of paths"
+    results = dict(self.iter_project_timestamps(paths, rescan=rescan, jobs=jobs))
+    return [results[path] for path in paths]
+
+  def iter_project_timestamps(
+    self, paths: list[Path], rescan: bool = False, jobs: Optional[int] = None
+  ) -> Iterator[tuple[Path, float]]:
+    """(path, activity timestamp) for each project as soon as its scan finishes - in completion order, not that of paths
+
+    Projects a running watcher keeps up to date are served straight from the index, without being walked"""
+    live = {} if rescan else self.live_timestamps()
+    walked = []
+    for path in paths:
+      timestamp = live.get(str(path))
+      if timestamp is None:
+        walked.append(path)
+      else:
+        yield path, timestamp
+    yield from map_per_root(lambda path: self.project_timestamp(path, rescan=rescan), walked, jobs)
+
+  def top_projects(
+    self, paths: list[Path], count: int, rescan: bool = False, jobs: Optional[int] = None
+  ) -> list[tuple[Path, float]]:
+    """The count most recently active projects as (path, timestamp), most recent first - walking as few as possible
+
+    Projects whose root directory mtime is unchanged since they were indexed are queued on their cached timestamp, and
+    only walked (to confirm it) when they reach the front of the queue. Projects kept live by a watcher are never
+    walked. The rest are walked up front. With a fresh index this matches the top of a full scan - changes deep inside
+    cold projects are picked up by the next full scan"""
+    import heapq
+
+    if rescan:
+      timestamps = self.project_timestamps(paths, rescan=True, jobs=jobs)
+      return heapq.nlargest(count, zip(paths, timestamps), key=lambda pair: pair[1])
+
+    hints = {
+      path: (last_activity, mtime_ns) for path, last_activity, mtime_ns in self.conn.execute(
+        "SELECT projects.path, projects.last_activity, directories.mtime_ns FROM projects "
+        "JOIN directories ON directories.path = projects.path"
+      )
+    }
+    live = self.live_timestamps()
+    queue: list[tuple[float, bool, str]] = []  # (-timestamp, confirmed, path) - a max-heap on timestamp
+    unhinted: list[Path] = []
+    for path in paths:
+      if str(path) in live:  # Kept up to date by a watcher - nothing to confirm
+        queue.append((-live[str(path)], True, str(path)))
+        continue
+      hint = hints.get(str(path))
+      try:
+        unchanged = hint is not None and os.stat(path).st_mtime_ns == hint[1]
+      except FileNotFoundError:
+        continue
+      if unchanged:
+        queue.append((-hint[0], False, str(path)))
+      else:
+        unhinted.append(path)
+    queue.extend((-ts, True, str(path)) for path, ts in self.iter_project_timestamps(unhinted, jobs=jobs))
+    heapq.heapify(queue)
+
+    top: list[tuple[Path, float]] = []
+    while queue and len(top) < count:
+      negative_ts, confirmed, path = heapq.heappop(queue)
+      if confirmed:
+        top.append((Path(path), -negative_ts))
+      else:
+        heapq.heappush(queue, (-self.project_timestamp(Path(path)), True, path))
+    return top
+
+  # WATCHERS
+  def record_activity(self, touched: list[tuple[Path, str, float]]) -> None:
+    """Bump the timestamps of projects (and the directories / git repositories within them) from (project, directory,
+    timestamp) records
+
+    For watchers, which see files being read or edited in place - changes a walk only notices on a rescan. Re-indexing
+    the project afterwards then keeps them, as its walk reads the bumped directories and repositories from the cache"""
+    with self.conn:
+      self.conn.executemany(
+        "UPDATE directories SET files_max = MAX(COALESCE(files_max, ?), ?) WHERE path = ?",
+        [(timestamp, timestamp, directory) for _, directory, timestamp in touched]
+      )
+      self.conn.executemany(
+        "UPDATE repositories SET last_activity = MAX(last_activity, ?) "
+        "WHERE path = ? OR substr(?, 1, length(path) + 1) = path || ?",
+        [(timestamp, directory, directory, os.sep) for _, directory, timestamp in touched]
+      )
+      self.conn.executemany(
+        "UPDATE projects SET last_activity = MAX(last_activity, ?) WHERE path = ?",
+        [(timestamp, str(project)) for project, _, timestamp in touched]
+      )
+
+  def heartbeat(self, pid: Optional[int] = None) -> None:
+    "Record that a watcher (this process by default) is still keeping its projects up to date"
+    with self.conn:
+      self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+        ("watcher_pid", str(pid or os.getpid())), ("watcher_heartbeat", str(time.time())),
+      ])
+
+  def set_watched(self, paths: list[Path], watched: bool = True) -> None:
+    "Mark projects as being kept up to date by the watcher, or no longer"
+    with self.conn:
+      self.conn.executemany(
+        "INSERT OR IGNORE INTO watched (path) VALUES (?)" if watched else "DELETE FROM watched WHERE path = ?",
+        [(str(path),) for path in paths]
+      )
+
+  def stop_watching(self) -> None:
+    "Forget the watcher and the projects it was watching"
+    with self.conn:
+      self.conn.execute("DELETE FROM watched")
+      self.conn.execute("DELETE FROM meta WHERE key IN ('watcher_pid', 'watcher_heartbeat')")
+
+  def forget_project(self, path: Path) -> None:
+    "Drop a removed project from the index"
+    root = str(path)
+    with self.conn:
+      self.conn.execute("DELETE FROM projects WHERE path = ?", (root,))
+      self.conn.execute("DELETE FROM watched WHERE path = ?", (root,))
+      self.conn.execute("DELETE FROM directories WHERE path = ? OR (path >= ? AND path < ?)", _subtree(root))
+      self.conn.execute("DELETE FROM repositories WHERE path = ? OR (path >= ? AND path < ?)", _subtree(root))
+
+  def live_timestamps(self) -> dict[str, float]:
+    "Timestamps of the projects a running watcher is keeping up to date - empty if there's no live watcher"
+    meta = dict(self.conn.execute("SELECT key, value FROM meta WHERE key IN ('watcher_pid', 'watcher_heartbeat')"))
+    if len(meta) < 2 or time.time() - float(meta["watcher_heartbeat"]) > WATCHER_TIMEOUT:
+      return {}
+    if not process_alive(int(meta["watcher_pid"])):
+      return {}
+    return dict(self.conn.execute("SELECT path, last_activity FROM watched JOIN projects USING (path)"))
+
+  def _cached_directories(self, root: str) -> dict[str, tuple]:
+    "All cached directory rows within a project, fetched in a single range query"
+    rows = self.conn.execute(
+      "SELECT path, mtime_ns, files_max, subdirs FROM directories WHERE path = ? OR (path >= ? AND path < ?)",
+      _subtree(root)
+    )
+    return {row[0]: row[1:] for row in rows}
+
+  @staticmethod
+  def _scan_directory(dir_path: str) -> tuple[Optional[float], list[str]]:
+    "Max timestamp of the non-directory entries in a directory, and the names of its subdirectories"
+    files_max = None
+    subdirs = []
+    try:
+      with os.scandir(dir_path) as it:
+        for entry in it:
+          if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.name)
+          else:
+            try:
+              files_max = max_activity(files_max, entry_activity(entry.stat(follow_symlinks=False)))
+            except FileNotFoundError:
+              continue
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+      pass  # Removed mid-walk, or unreadable
+    return files_max, sorted(subdirs)
+
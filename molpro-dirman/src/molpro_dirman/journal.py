@@ -0,0 +1,202 @@
+# Offline-first write-ahead journal of serial events (create / rename / delete), drained to the registry in batches
+#
+# Events are appended as fsync'd JSON lines, so allocating a serial never waits on the network. A background
+# flusher sends pending events in batches; the registry applies them idempotently by event id, so replaying a
+# batch whose acknowledgement was lost is harmless. Flushed events are then compacted out of the journal.
+#
+#   python -m molpro_dirman.journal flush
+
+import os
+import sys
+import json
+import time
+import uuid
+import fcntl
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .config import Config
+from .errors import RegistryError
+
+FLUSH_BATCH_SIZE = 1_000  # Events sent per request
+EVENT_TYPES = ("create", "rename", "delete")
+
+
+def make_event(event_type: str, name: str, title: str = "", old_name: Optional[str] = None) -> dict:
+  "A journal event - the id makes replays idempotent"
+  if event_type not in EVENT_TYPES:
+    raise ValueError(f"Unknown journal event type {event_type!r}")
+  event = {"id": uuid.uuid4().hex, "type": event_type, "name": name, "title": title, "ts": time.time()}
+  if old_name is not None:
+    event["old_name"] = old_name
+  return event
+
+
+class Journal:
+  "Append-only journal file of events not yet acknowledged by the registry"
+
+  def __init__(self, path: Optional[Path] = None):
+    self.path = Path(path or Config.journal_path())
+
+  @contextmanager
+  def _locked(self) -> Iterator[None]:
+    "Exclusive lock against concurrent appends / compaction"
+    self.path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(self.path.with_name(f"{self.path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      yield
+    finally:
+      fcntl.flock(fd, fcntl.LOCK_UN)
+      os.close(fd)
+
+  def append(self, *events: dict) -> None:
+    "Durably append events - returns once they're fsync'd to disk"
+    if not events:
+      return
+    data = "".join(json.dumps(event) + "\n" for event in events).encode()
+    with self._locked():
+      fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+      try:
+        os.write(fd, data)
+        os.fsync(fd)
+      finally:
+        os.close(fd)
+
+  def pending(self) -> list[dict]:
+    "Events not yet flushed, oldest first - a torn final line (crash mid-append) is ignored"
+    try:
+      lines = self.path.read_text().splitlines()
+    except FileNotFoundError:
+      return []
+
+    events = []
+    for line in lines:
+      try:
+        events.append(json.loads(line))
+      except ValueError:
+        continue
+    return events
+
+  def compact(self, flushed_ids: set[str] = frozenset()) -> int:
+    """Rewrite the journal without flushed events, and without creates that a later pending delete cancels out
+
+    Returns the number of events remaining"""
+    with self._locked():
+      compacted: list[Optional[dict]] = []
+      unflushed_creates: dict[str, int] = {}  # Name -> position of its pending create
+      for event in self.pending():
+        if event["id"] in flushed_ids:
+          continue
+        if event["type"] == "delete" and event["name"] in unflushed_creates:
+          # Created and deleted without ever reaching the registry, so it never needs to hear about either
+          compacted[unflushed_creates.pop(event["name"])] = None
+          continue
+        if event["type"] == "create":
+          unflushed_creates[event["name"]] = len(compacted)
+        elif event["type"] == "rename":
+          unflushed_creates.pop(event.get("old_name"), None)
+        compacted.append(event)
+      remaining = [event for event in compacted if event is not None]
+
+      tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+      with open(tmp_path, "w") as fd:
+        fd.writelines(json.dumps(event) + "\n" for event in remaining)
+        fd.flush()
+        os.fsync(fd.fileno())
+      os.replace(tmp_path, self.path)
+    return len(remaining)
+
+
+def record(*events: dict) -> None:
+  "Append events to the default journal - skipped with no registry configured, as nothing would ever flush them"
+  if Config.registry_url():  # Without one, sync pushes the serials in full once a registry is set up
+    Journal().append(*events)
+
+
+def flush(registry: Optional[str] = None, batch_size: Optional[int] = None) -> int:
+  "Send pending journal events to the registry in batches, compacting out acknowledged ones - returns events flushed"
+  from .sync import RegistryClient, SyncState
+
+  registry = registry or Config.registry_url()
+  if not registry:
+    raise RegistryError("No registry configured - set MPDMAN_REGISTRY_URL or pass --registry")
+
+  journal = Journal()
+  pending = journal.pending()
+  if not pending:
+    return 0
+
+  batch_size = batch_size or FLUSH_BATCH_SIZE
+  flushed: set[str] = set()
+  state = SyncState.load(registry)
+  try:
+    with RegistryClient(registry, token=Config.registry_token()) as client:
+      for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        client.apply_events(batch)
+        flushed.update(event["id"] for event in batch)
+
+        for event in batch:  # Keep sync's view of the registry current, so it doesn't re-push these
+          if event["type"] == "delete":
+            state.serials.pop(event["name"], None)
+            continue
+          if event["type"] == "rename":
+            state.serials.pop(event.get("old_name"), None)
+          state.serials[event["name"]] = event.get("title", "")
+  finally:
+    if flushed:  # Compact whatever made it, even if a later batch failed
+      journal.compact(flushed)
+      state.save()
+  return len(flushed)
+
+
+@contextmanager
+def flusher_lock() -> Iterator[bool]:
+  "Non-blocking lock so only one background flusher runs at a time - yields whether it was acquired"
+  path = Config.journal_path().with_name("journal.flush.lock")
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+  try:
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      yield False
+      return
+    try:
+      yield True
+    finally:
+      fcntl.flock(fd, fcntl.LOCK_UN)
+  finally:
+    os.close(fd)
+
+
+def schedule_flush() -> None:
+  "Drain the journal in a detached background process, if a registry is configured - never blocks the caller"
+  if not Config.registry_url():
+    return
+  subprocess.Popen(
+    [sys.executable, "-m", "molpro_dirman.journal", "flush"],
+    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    start_new_session=True,
+  )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+  argv = sys.argv[1:] if argv is None else argv
+  if argv != ["flush"]:
+    sys.exit("usage: python -m molpro_dirman.journal flush")
+
+  with flusher_lock() as acquired:
+    if not acquired:
+      return  # Another flusher is already draining the journal
+    try:
+      flush()
+    except RegistryError:
+      pass  # Offline - events stay journalled for next time
+
+
+if __name__ == "__main__":
+  main()
@@ -1,14 +1,23 @@
 # Methods and helpers for interacting passively with the local filesystem
+#
+# active --plain and the prompt import this on every call, so only the symlink helpers' dependencies are imported up
+# front - the catalogs and walks are imported by the functions using them.
 
 import os
 from pathlib import Path
 from datetime import datetime
 import re
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from .config import Config
+from .manifest import SymlinkManifest
+
+if TYPE_CHECKING:
+  from .catalog import Catalog
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOWER_BOUND_MARK = "≥ "  # Prefixed to timestamps from walks that ran out of time budget
+README_FILENAME = "README.md"
 
 
 # GENERAL UTILS
@@ -22,32 +31,109 @@ def extract_filenames(objects: list[Path]) -> list[str]:
   return [obj.parts[-1] for obj in objects]
 
 
-def last_modified(path: Path, recursively_check=True) -> str:
-  "Last modified time of a directory, optionally based on all recursive children"
+def readme_title(text: str) -> str:
+  "Title from the first line of a project README, if it's a heading"
+  first_line = text.partition("\n")[0]
+  return first_line[2:].strip() if first_line.startswith("# ") else ""
+
+
+def project_title(project_path: Path) -> str:
+  "Title from the first heading of a project README, if it has one - read without bumping its atime where allowed"
+  path = project_path / README_FILENAME
+  try:
+    try:
+      fd = os.open(path, os.O_RDONLY | os.O_NOATIME)  # Reading titles mustn't count as activity
+    except (AttributeError, PermissionError):
+      fd = os.open(path, os.O_RDONLY)  # O_NOATIME is Linux-only, and only for files we own
+    with open(fd) as file:
+      return readme_title(file.readline())
+  except (OSError, UnicodeDecodeError):
+    return ""
+
+
+def format_timestamp(timestamp: float) -> str:
+  "Format a unix timestamp for display"
+  return datetime.fromtimestamp(timestamp).strftime(DATETIME_FORMAT)
+
+
+def format_activity(timestamp: float, complete: bool = True) -> str:
+  "Format an activity timestamp for display, marking it as a lower bound if its walk didn't complete"
+  return format_timestamp(timestamp) if complete else LOWER_BOUND_MARK + format_timestamp(timestamp)
+
+
+def last_modified(path: Path, recursively_check=True, depth: Optional[int] = None, budget_ms: Optional[float] = None) -> str:
+  """Last modified time of a directory, optionally based on all recursive children
+
+  For a faster approximation, only look depth levels down, and / or stop walking after budget_ms
+  (marking the result as a lower bound if the walk was cut short)"""
+  from .walk import entry_activity, project_activity, approximate_activity
+
   if not recursively_check:  # Just check directory's access / mod time
-    return datetime.fromtimestamp(
-      max(path.stat().st_atime, path.stat().st_mtime)
-    ).strftime(DATETIME_FORMAT)
+    return format_timestamp(entry_activity(path.stat()))
 
-  # Check directory, subdirectories, and all children for the most recent atime / mtime
-  return datetime.fromtimestamp(
-    max(
-      max(obj.stat().st_atime, obj.stat().st_mtime) for obj in path.rglob('*')
-    )
-  ).strftime(DATETIME_FORMAT)
+  if depth is not None or budget_ms is not None:
+    return format_activity(*approximate_activity(path, max_depth=depth, budget_ms=budget_ms))
+
+  # Check subdirectories and all children for the most recent atime / mtime, skipping ignored dirs (and reading
+  # git repositories' metadata instead of walking them)
+  latest = project_activity(path)
+  return format_timestamp(latest if latest is not None else entry_activity(path.stat()))
 
 
 class Project:
 
   @staticmethod
-  def list_paths() -> list[Path]:
-    "List of path objects for every project directory"
-    return ls_d(Config.base_project_directory())
+  def catalog(rescan: bool = False) -> "Catalog":
+    """Catalog of every project directory in every root, served from the activity index where still fresh
+
+    Roots are listed concurrently. Roots other than the first are skipped while unavailable (eg: an unmounted disk)"""
+    from .index import ActivityIndex  # Deferred - sqlite isn't needed by the fast CLI paths
+    from .catalog import Catalog
+
+    roots = Config.project_roots()
+    with ActivityIndex() as index:
+      if len(roots) == 1:
+        return Catalog.from_listings([(roots[0], index.list_subdirectory_names(roots[0], rescan=rescan))])
+
+      from concurrent.futures import ThreadPoolExecutor
+
+      def listing(root: Path) -> list[str]:
+        try:
+          return index.list_subdirectory_names(root, rescan=rescan)
+        except OSError:
+          if root == roots[0]:
+            raise
+          return []
+
+      with ThreadPoolExecutor(max_workers=len(roots)) as pool:
+        return Catalog.from_listings(zip(roots, pool.map(listing, roots)))
+
+  @staticmethod
+  def list_paths(rescan: bool = False) -> list[Path]:
+    "List of path objects for every project directory in every root"
+    return Project.catalog(rescan=rescan).paths()
 
   @staticmethod
   def list_names() -> list[str]:
-    "List of project directory names only"
-    return extract_filenames(Project.list_paths())
+    "List of project directory names only, from the catalog file where it can be built"
+    from .catalog_file import CatalogFile
+
+    catalog_file = CatalogFile.load()
+    if catalog_file is None:
+      return Project.catalog().names()
+    with catalog_file:
+      return catalog_file.names()
+
+  @staticmethod
+  def taken_serials(prefix: str) -> set[int]:
+    "Serials already in use for a prefix combination (eg: 'DO'), from the catalog file where it can be built"
+    from .catalog_file import CatalogFile
+
+    catalog_file = CatalogFile.load()
+    if catalog_file is None:
+      return Project.catalog().serials(prefix)
+    with catalog_file:
+      return catalog_file.serials(prefix)
 
   @staticmethod
   def active(suppress_errors=True) -> Optional[str]:
@@ -64,8 +150,31 @@ class Project:
       raise e
 
   @staticmethod
-  def all_symlinks(mpdman_only: bool = True) -> list[Path]:
-    "Find all symlinks that exist in symlink dir, optionally including even ones not made in mpdman"
+  def all_symlinks(mpdman_only: bool = True, rescan: bool = False) -> list[Path]:
+    """Find all symlinks that exist in symlink dir, optionally including even ones not made in mpdman
+
+    mpdman symlinks are read from the symlink manifest - the symlink dir is only scanned if
+    non-mpdman links are wanted, or to (re)build the manifest when there isn't one or rescan is set"""
+    if not mpdman_only:
+      return Project.scan_symlinks(mpdman_only=False)
+
+    manifest = None if rescan else SymlinkManifest.load()
+    if manifest is None:
+      Project.reconcile_symlinks()
+      manifest = SymlinkManifest.load()
+    return manifest.verified_links()
+
+  @staticmethod
+  def reconcile_symlinks() -> dict[str, list[str]]:
+    "Rebuild the symlink manifest from a full scan of the symlink dir - returns names added / removed / retargeted"
+    manifest = SymlinkManifest.load() or SymlinkManifest()
+    return manifest.reconcile({
+      key.parts[-1]: os.readlink(key) for key in Project.scan_symlinks(mpdman_only=True)
+    })
+
+  @staticmethod
+  def scan_symlinks(mpdman_only: bool = True) -> list[Path]:
+    "Scan the whole symlink dir for symlinks, optionally including even ones not made in mpdman"
     return [
       key for key in
       Config.base_symlink_directory().iterdir() if (
@@ -91,10 +200,32 @@ class Project:
 
   @staticmethod
   def is_valid_path(path: Path) -> bool:
-    "Verify a path is validly within a project (or is project directory, if param set)"
-    try:
-      return bool(
-        path.exists() and path.relative_to(Config.base_project_directory())
-      )
-    except ValueError:
-      return False  # ValueError is raised if the path is not under the project directory
+    "Verify a path is validly within a project (or is project directory, if param set), in any project root"
+    root = Project.root_of(path)
+    if root is None or path == root:
+      return False  # Outside every root, or a root itself - which isn't within a project
+    if path.parent == root:  # A project directory - looked up in the catalog file, without touching the root
+      from .catalog_file import CatalogFile
+
+      catalog_file = CatalogFile.load()
+      if catalog_file is not None:
+        with catalog_file:
+          return catalog_file.contains(path.parts[-1], root)
+    return path.exists()
+
+  @staticmethod
+  def root_of(path: Path) -> Optional[Path]:
+    "The project root a path is within, if any"
+    for root in Config.project_roots():
+      if path.is_relative_to(root):
+        return root
+    return None
+
+  @staticmethod
+  def path_of(project_name: str) -> Path:
+    "Path of a project by name - in the first root holding it, else where it would be created"
+    roots = Config.project_roots()
+    for root in roots:
+      if (root / project_name).exists():
+        return root / project_name
+    return roots[0] / project_name
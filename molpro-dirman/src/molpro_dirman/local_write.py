@@ -2,12 +2,18 @@
 
 import os
 import re
+import fcntl
 import random
+import shutil
 from pathlib import Path
-from typing import Literal, Optional
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
-from .config import Config, symlink_name, Prefixes
+from .config import Config, symlink_name, format_project_name
 from .local_read import Project
+from .manifest import record_symlink, forget_symlink
+from .sync import SyncState
+from .journal import record, make_event
 from .errors import (
   ProjectSymLinkExists, 
   ProjectSymLinkFailure, 
@@ -18,6 +24,9 @@ from .errors import (
 )
 
 MAX_SERIAL_GENERATION_ATTEMPTS = 100  # Prevents possible long-running loops for serial gen
+SERIAL_SPACE = 10_000_000  # 7 digit serials - 0 is never allocated, as create_project treats it as unset
+MAX_RANDOM_SERIAL_DENSITY = 0.5  # Past this fraction of serials taken, allocate from gaps rather than at random
+LOCK_FILENAME = ".mpdman.lock"  # Advisory lock file in the project directory, held while reserving a serial
 
 def delete_symlink(path: Path, mpdman_only=True) -> Path:
   "Safe method to delete only symlinks, also can perform check to ensure it is an mpdman-created symlink"
@@ -27,6 +36,7 @@ def delete_symlink(path: Path, mpdman_only=True) -> Path:
     raise ValueError("Symlink does not match project symlink regex")
 
   os.remove(path)
+  forget_symlink(path)
   return path
 
 
@@ -48,6 +58,8 @@ def move_main_to_aux(overwrite_existing: bool = False) -> Path:
       raise ProjectSymLinkExists("Aux symlink already exists, and does not point to expected destination")
 
   os.rename(main_symlink_path, aux_symlink_path)
+  forget_symlink(main_symlink_path)
+  record_symlink(aux_symlink_path)
   return aux_symlink_path
 
 
@@ -99,38 +111,138 @@ def symlink_project(
       delete_symlink(symlink_path)
 
   os.symlink(project_path, symlink_path, target_is_directory=True)
+  record_symlink(symlink_path)
   return symlink_path
 
 
-def generate_random_serial(prefixes: list[Literal[Prefixes.definitions().keys()]]) -> int:
-  prefix = "".join(sorted(prefixes))
-  for _ in range(MAX_SERIAL_GENERATION_ATTEMPTS):
-    serial = random.randint(0,9_999_999)
-    if not Project.is_valid_path(Config.base_project_directory() / f"{prefix}-{str(serial).zfill(7)}"):
-      return serial
-  
-  raise SerialGenerationError(f"Serial generation failed after {MAX_SERIAL_GENERATION_ATTEMPTS} attempts were exhausted")
+class SerialAllocator:
+  "Allocates unused serials for one prefix combination, from an in-memory set of the serials already taken"
+
+  def __init__(self, prefixes: list[str], taken: Optional[set[int]] = None):
+    self.prefix = "".join(sorted(prefixes))
+    if taken is None:  # Serials on disk, plus any the registry holds for projects on other machines
+      taken = Project.taken_serials(self.prefix) | SyncState.load().taken_serials(self.prefix)
+    self.taken = set(taken)
+
+  def allocate(self) -> int:
+    "Pick an unused serial at random (or from the next gap, if densely allocated), and mark it as taken"
+    if len(self.taken) - (0 in self.taken) >= SERIAL_SPACE - 1:
+      raise SerialGenerationError(f"Every serial for prefix {self.prefix} is already taken")
+
+    serial = None
+    if len(self.taken) < SERIAL_SPACE * MAX_RANDOM_SERIAL_DENSITY:
+      for _ in range(MAX_SERIAL_GENERATION_ATTEMPTS):
+        candidate = random.randrange(1, SERIAL_SPACE)
+        if candidate not in self.taken:
+          serial = candidate
+          break
+
+    if serial is None:  # Dense (or very unlucky) - walk forward from a random point to the next gap
+      serial = self._next_gap(random.randrange(1, SERIAL_SPACE))
+
+    self.taken.add(serial)
+    return serial
+
+  def _next_gap(self, start: int) -> int:
+    for offset in range(SERIAL_SPACE):
+      candidate = (start + offset) % SERIAL_SPACE
+      if candidate and candidate not in self.taken:
+        return candidate
+    raise SerialGenerationError(f"Every serial for prefix {self.prefix} is already taken")
+
+
+def generate_random_serial(prefixes: list[str]) -> int:
+  return SerialAllocator(prefixes).allocate()
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+  "Write a file via a temp file and rename, so readers never see it partially written"
+  tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+  try:
+    with open(tmp_path, "w") as fd:
+      fd.write(text)
+      fd.flush()
+      os.fsync(fd.fileno())
+    os.replace(tmp_path, path)
+  finally:
+    if tmp_path.exists():
+      os.remove(tmp_path)
+
+
+@contextmanager
+def project_directory_lock() -> Iterator[None]:
+  "Exclusive advisory lock on the (first) project root, shared with other mpdman processes"
+  fd = os.open(Config.project_roots()[0] / LOCK_FILENAME, os.O_RDWR | os.O_CREAT, 0o644)
+  try:
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    yield
+  finally:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def reserve_project_directory(project_name: str) -> Path:
+  "Atomically claim a project directory in the first root - mkdir fails if another process got there first"
+  primary_root, *other_roots = Config.project_roots()
+  project_path = primary_root / project_name
+  with project_directory_lock():
+    if any(os.path.lexists(root / project_name) for root in other_roots):
+      raise ProjectAlreadyExists(f"Project {project_name} already exists in another project root")
+    try:
+      os.mkdir(project_path)
+    except FileExistsError:
+      raise ProjectAlreadyExists(f"Project {project_name} already exists")
+  return project_path
 
 
 def create_project(
-  prefixes: list[Literal[Prefixes.definitions().keys()]],
+  prefixes: list[str],
   title: str,
   description: str,
-  serial: Optional[int]
+  serial: Optional[int],
+  allocator: Optional[SerialAllocator] = None,
+  journal: bool = True
 ) -> Path:
-  if not serial:
-    serial = generate_random_serial(prefixes)
-
-  project_name = f"{"".join(sorted(prefixes))}-{str(serial).zfill(7)}"
-  project_path = Config.base_project_directory() / project_name
-
-  if Project.is_valid_path(project_path):
-    raise ProjectAlreadyExists(f"Project {project_name} already exists")
-  
-  os.mkdir(project_path)
-  (project_path / "README.md").write_text(
-    f"# {title}\n"
-    f"## {project_name}\n\n\n"
-    f"{description.rstrip()}"
-  )
+  """Create a project directory and README - random serials are retried if another process claims them first
+
+  The new serial is journalled for registration unless journal is False (the caller then journals it itself)"""
+  if serial:
+    project_path = reserve_project_directory(format_project_name(prefixes, serial))
+  else:
+    allocator = allocator or SerialAllocator(prefixes)
+    for _ in range(MAX_SERIAL_GENERATION_ATTEMPTS):
+      try:
+        project_path = reserve_project_directory(format_project_name(prefixes, allocator.allocate()))
+        break
+      except ProjectAlreadyExists:
+        continue  # Claimed since we listed the project directory - the allocator now has it marked as taken
+    else:
+      raise SerialGenerationError(f"Serial reservation failed after {MAX_SERIAL_GENERATION_ATTEMPTS} attempts were exhausted")
+
+  project_name = project_path.parts[-1]
+  try:
+    write_text_atomic(project_path / "README.md", (
+      f"# {title}\n"
+      f"## {project_name}\n\n\n"
+      f"{description.rstrip()}"
+    ))
+  except BaseException:
+    shutil.rmtree(project_path, ignore_errors=True)  # Don't leave a half-made project holding the serial
+    raise
+
+  if journal:
+    record(make_event("create", project_name, title))
   return project_path
+
+
+def create_projects(
+  prefixes: list[str],
+  title: str,
+  description: str,
+  count: int
+) -> list[Path]:
+  "Create many projects sharing prefixes / title / description, allocating serials from one directory listing"
+  allocator = SerialAllocator(prefixes)
+  project_paths = [create_project(prefixes, title, description, None, allocator=allocator, journal=False) for _ in range(count)]
+  record(*(make_event("create", project_path.parts[-1], title) for project_path in project_paths))  # One fsync for the lot
+  return project_paths
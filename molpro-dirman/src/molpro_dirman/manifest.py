@@ -0,0 +1,100 @@
+# Manifest of symlinks created by mpdman, so finding active projects never needs to list the whole symlink directory
+
+import os
+import json
+import fcntl
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .config import Config
+
+
+class SymlinkManifest:
+  "Symlinks made by mpdman in the symlink directory - maps symlink name to the project path it points at"
+
+  def __init__(self, links: Optional[dict[str, str]] = None):
+    self.links: dict[str, str] = dict(links or {})
+
+  @staticmethod
+  def load() -> Optional["SymlinkManifest"]:
+    "Manifest for the configured symlink directory, or None if one hasn't been built yet"
+    try:
+      data = json.loads(Config.manifest_path().read_text())
+    except (FileNotFoundError, ValueError):
+      return None
+
+    if data.get("symlink_directory") != str(Config.base_symlink_directory()):
+      return None  # Written for a different symlink directory
+    return SymlinkManifest(data.get("links", {}))
+
+  def save(self) -> None:
+    "Atomically write the manifest"
+    path = Config.manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({
+      "symlink_directory": str(Config.base_symlink_directory()),
+      "links": dict(sorted(self.links.items())),
+    }, indent=2))
+    os.replace(tmp_path, path)
+
+  def verified_links(self) -> list[Path]:
+    "Paths of recorded symlinks, checked with a readlink each - entries removed / retargeted outside mpdman are fixed up"
+    symlink_dir = Config.base_symlink_directory()
+    verified: dict[str, str] = {}
+    for name, target in self.links.items():
+      try:
+        verified[name] = os.readlink(symlink_dir / name)
+      except OSError:
+        continue  # Gone, or no longer a symlink
+
+    if verified != self.links:
+      self.links = verified
+      self.save()
+    return [symlink_dir / name for name in sorted(verified)]
+
+  def reconcile(self, scanned: dict[str, str]) -> dict[str, list[str]]:
+    "Replace recorded links with those found by a full scan, returning what changed"
+    changes = {
+      "added": sorted(scanned.keys() - self.links.keys()),
+      "removed": sorted(self.links.keys() - scanned.keys()),
+      "retargeted": sorted(
+        name for name in scanned.keys() & self.links.keys()
+        if scanned[name] != self.links[name]
+      ),
+    }
+    self.links = dict(scanned)
+    self.save()
+    return changes
+
+
+@contextmanager
+def manifest_lock() -> Iterator[None]:
+  "Exclusive advisory lock on the manifest, so concurrent updates (other shells, daemon handlers) don't drop entries"
+  path = Config.manifest_path()
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd = os.open(path.with_name(f"{path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+  try:
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    yield
+  finally:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def record_symlink(symlink_path: Path) -> None:
+  "Add a newly created symlink to the manifest, if one has been built"
+  with manifest_lock():
+    manifest = SymlinkManifest.load()
+    if manifest is not None:  # Otherwise the next lookup will build it with a full scan
+      manifest.links[symlink_path.parts[-1]] = os.readlink(symlink_path)
+      manifest.save()
+
+
+def forget_symlink(symlink_path: Path) -> None:
+  "Remove a deleted symlink from the manifest, if one has been built"
+  with manifest_lock():
+    manifest = SymlinkManifest.load()
+    if manifest is not None and manifest.links.pop(symlink_path.parts[-1], None) is not None:
+      manifest.save()
@@ -0,0 +1,125 @@
+# Machine-readable output for ls / active / status, for scripts - written record by record, without loading rich
+#
+# json is a single document (an array, or an object of arrays for status), ndjson one object per line, and tsv a header
+# line then one row per record. Every format writes each record as soon as it's produced, so a consumer can start on
+# the first project while the rest are still being scanned.
+
+import os
+import sys
+import json
+from pathlib import Path
+from datetime import datetime
+from typing import Iterable, Optional, TextIO
+
+from .local_read import Project, project_title
+
+OUTPUT_FORMATS = ("table", "json", "ndjson", "tsv")
+RECORD_FIELDS = ("name", "prefixes", "serial", "title", "last_activity", "complete", "symlinks", "root")
+
+
+def iso_timestamp(timestamp: float) -> str:
+  "A unix timestamp as local ISO 8601, with its UTC offset"
+  return datetime.fromtimestamp(timestamp).astimezone().isoformat(timespec="seconds")
+
+
+def project_record(path: Path, timestamp: float, complete: bool = True, symlinks: Iterable[str] = ()) -> dict:
+  "Record for a project - complete is false if its activity walk ran out of time, making last_activity a lower bound"
+  name = path.parts[-1]
+  prefixes, _, serial = name.partition("-")
+  return {
+    "name": name,
+    "prefixes": list(prefixes),
+    "serial": int(serial) if serial.isdigit() else None,
+    "title": project_title(path),
+    "last_activity": iso_timestamp(timestamp),
+    "complete": complete,
+    "symlinks": sorted(symlinks),
+    "root": str(path.parent),
+  }
+
+
+def symlink_names(links: Iterable[Path], targets: Optional[Iterable[Path]] = None) -> dict[Path, list[str]]:
+  "Names of the symlinks pointing at each project - targets are read from the links if not given"
+  targets = [Path(os.readlink(link)) for link in links] if targets is None else targets
+  names: dict[Path, list[str]] = {}
+  for link, target in zip(links, targets):
+    names.setdefault(target, []).append(link.parts[-1])
+  return names
+
+
+def tsv_field(value) -> str:
+  "A record value as a tsv field - lists are comma-separated, and tabs / newlines in text become spaces"
+  if isinstance(value, list):
+    value = ",".join(value)
+  elif isinstance(value, bool):
+    value = "true" if value else "false"
+  elif value is None:
+    value = ""
+  return str(value).replace("\t", " ").replace("\n", " ")
+
+
+class RecordWriter:
+  """Writes records in one of the machine-readable formats as they're produced, flushing after each
+
+  With sections (as for status), json is an object of one array per section, and ndjson / tsv records lead with the
+  name of their section. Use as a context manager, so a json document is closed even if there are no records"""
+
+  def __init__(self, output_format: str, stream: Optional[TextIO] = None, sections: bool = False):
+    if output_format not in OUTPUT_FORMATS[1:]:
+      raise ValueError(f"No record writer for format {output_format!r}")
+    self.format = output_format
+    self.stream = stream or sys.stdout
+    self.sections = sections
+    self.current_section: Optional[str] = None
+    self.records = 0  # Written in the current section
+
+  def __enter__(self) -> "RecordWriter":
+    if self.format == "json":
+      self.stream.write("{" if self.sections else "[")
+    elif self.format == "tsv":
+      self.stream.write("\t".join(("section", *RECORD_FIELDS) if self.sections else RECORD_FIELDS) + "\n")
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    if self.format == "json":
+      self.end_array()
+      self.stream.write("}\n" if self.sections else "\n")
+    self.stream.flush()
+
+  def end_array(self) -> None:
+    if not self.sections or self.current_section is not None:
+      self.stream.write("\n]" if self.records else "]")
+
+  def section(self, name: str) -> None:
+    "Start a section - records written after this belong to it"
+    if self.format == "json":
+      self.end_array()
+      self.stream.write(f"{', ' if self.current_section is not None else ''}{json.dumps(name)}: [")
+    self.current_section = name
+    self.records = 0
+
+  def write(self, record: dict) -> None:
+    if self.format == "json":
+      self.stream.write(f"{',' if self.records else ''}\n  {json.dumps(record)}")
+    elif self.format == "ndjson":
+      self.stream.write(json.dumps({"section": self.current_section, **record} if self.sections else record) + "\n")
+    else:
+      fields = [record[field] for field in RECORD_FIELDS]
+      self.stream.write("\t".join(tsv_field(value) for value in ([self.current_section, *fields] if self.sections else fields)) + "\n")
+    self.stream.flush()
+    self.records += 1
+
+
+def active_projects(links: list[Path], targets: list[Path], activities: list[tuple[float, bool]]) -> list[dict]:
+  "Records for the projects symlinked, most recently active first"
+  names = symlink_names(links, targets)
+  activity = dict(zip(targets, activities))
+  return [
+    project_record(target, *activity[target], symlinks=names[target])
+    for target in sorted(names, key=lambda target: (activity[target][0], target.parts[-1]), reverse=True)
+  ]
+
+
+def all_symlink_names(rescan: bool = False) -> dict[Path, list[str]]:
+  "Names of the mpdman symlinks pointing at each project"
+  return symlink_names(Project.all_symlinks(rescan=rescan))
@@ -0,0 +1,198 @@
+# Opt-in instrumentation: time and filesystem syscalls per phase of a command (--profile), and cProfile dumps
+#
+# phase() hands back a shared null context unless a Profiler is running, so instrumented code costs a global
+# lookup and an empty with-block when profiling is off. Syscalls are counted by wrapping the os functions that
+# issue them, only while profiling.
+
+import os
+import sys
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, Optional
+
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "readlink")  # Path.iterdir() is a listdir
+PROFILE_FORMATS = ("table", "json")
+CPROFILE_ENV = "MPDMAN_CPROFILE"  # Path to dump cProfile stats to, eg: for snakeviz / python -m pstats
+UNPHASED = "(outside phases)"
+
+_NULL_PHASE = nullcontext()
+_active: Optional["Profiler"] = None
+
+
+# SYSCALL COUNTING
+
+class _CountingDirEntry:
+  "Proxy for os.DirEntry that counts calls to stat() which actually reach the filesystem"
+
+  def __init__(self, entry: os.DirEntry, count: Callable[[str], None]):
+    self._entry = entry
+    self._count = count
+    self._stat_cache: dict[bool, os.stat_result] = {}
+
+  def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+    if follow_symlinks not in self._stat_cache:  # DirEntry caches its stat result, so only count the first call
+      self._count("stat")
+      self._stat_cache[follow_symlinks] = self._entry.stat(follow_symlinks=follow_symlinks)
+    return self._stat_cache[follow_symlinks]
+
+  def __fspath__(self) -> str:
+    return self._entry.path
+
+  def __getattr__(self, name):
+    return getattr(self._entry, name)
+
+
+class _CountingScandir:
+  def __init__(self, it, count: Callable[[str], None]):
+    self._it = it
+    self._count = count
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return _CountingDirEntry(next(self._it), self._count)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self._it.close()
+
+  def close(self):
+    self._it.close()
+
+
+@contextmanager
+def patched_syscalls(count: Callable[[str], None]) -> Iterator[None]:
+  """Call count(name) for each stat / lstat / scandir / listdir / readlink made within the block
+
+  Each counted call corresponds to one syscall (or open+getdents for directory listings).
+  DirEntry.is_dir() is not counted, as the file type comes free with the directory listing on Linux"""
+  originals = {name: getattr(os, name) for name in COUNTED_CALLS}
+
+  def counted(name):
+    def wrapper(*args, **kwargs):
+      count(name)
+      return originals[name](*args, **kwargs)
+    return wrapper
+
+  def scandir(*args, **kwargs):
+    count("scandir")
+    return _CountingScandir(originals["scandir"](*args, **kwargs), count)
+
+  for name in ("stat", "lstat", "listdir", "readlink"):
+    setattr(os, name, counted(name))
+  os.scandir = scandir
+  try:
+    yield
+  finally:
+    for name, func in originals.items():
+      setattr(os, name, func)
+
+
+# PHASES
+
+class Profiler:
+  """Wall time and syscall counts per phase - phases nest, and are keyed by their path (eg: 'status > ls > render')
+
+  Times are inclusive of nested phases, syscalls are counted against the innermost phase only. The phase stack is
+  shared between threads, so calls made by worker pools count towards the phase that started them"""
+
+  def __init__(self):
+    self.phases: dict[str, Counter] = {}  # In the order first entered
+    self.stack: list[str] = []
+    self.started = time.perf_counter()
+
+  def _record(self, key: str) -> Counter:
+    if key not in self.phases:
+      self.phases[key] = Counter()
+    return self.phases[key]
+
+  def count(self, name: str) -> None:
+    self._record(self.stack[-1] if self.stack else UNPHASED)[name] += 1
+
+  @contextmanager
+  def phase(self, name: str) -> Iterator[None]:
+    key = f"{self.stack[-1]} > {name}" if self.stack else name
+    record = self._record(key)
+    self.stack.append(key)
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      record["seconds"] += time.perf_counter() - start
+      record["calls"] += 1
+      self.stack.pop()
+
+  def report(self) -> dict:
+    return {
+      "total_ms": (time.perf_counter() - self.started) * 1000,
+      "phases": [
+        {
+          "phase": key,
+          "calls": record["calls"],
+          "ms": record["seconds"] * 1000,
+          **{name: record[name] for name in COUNTED_CALLS},
+        }
+        for key, record in self.phases.items()
+      ],
+    }
+
+
+def phase(name: str):
+  "Context manager timing a phase of work when profiling, otherwise a no-op"
+  return _active.phase(name) if _active is not None else _NULL_PHASE
+
+
+def print_report(report: dict, output_format: str = "table") -> None:
+  "Print a profile report to stderr, so it never mixes with a command's output"
+  if output_format == "json":
+    sys.stderr.write(json.dumps(report) + "\n")
+    return
+
+  from rich.console import Console
+  from rich.table import Table
+
+  table = Table(title=f"Profile ({report['total_ms']:.1f} ms total)")
+  table.add_column("phase", style="magenta", no_wrap=True)
+  table.add_column("calls", justify="right")
+  table.add_column("ms", justify="right")
+  for name in COUNTED_CALLS:
+    table.add_column(name, justify="right", style="bright_black")
+  for row in report["phases"]:
+    table.add_row(row["phase"], str(row["calls"] or ""), f"{row['ms']:.1f}", *(str(row[name]) for name in COUNTED_CALLS))
+  Console(stderr=True).print(table)
+
+
+@contextmanager
+def profiled(output_format: str = "table") -> Iterator[Profiler]:
+  "Profile phases and syscalls within the block, printing the breakdown at the end"
+  global _active
+  if output_format not in PROFILE_FORMATS:
+    raise ValueError(f"Unknown profile format {output_format!r}, expected one of {', '.join(PROFILE_FORMATS)}")
+
+  profiler = Profiler()
+  _active = profiler
+  try:
+    with patched_syscalls(profiler.count):
+      yield profiler
+  finally:
+    _active = None
+    print_report(profiler.report(), output_format)
+
+
+@contextmanager
+def cprofiled(path: str) -> Iterator[None]:
+  "Run the block under cProfile, dumping stats to path"
+  import cProfile
+
+  profile = cProfile.Profile()
+  profile.enable()
+  try:
+    yield
+  finally:
+    profile.disable()
+    profile.dump_stats(path)
@@ -0,0 +1,72 @@
+# Shell prompt segment for the active project, cached so repeated calls cost a stat of the symlink directory
+#
+# The cache-hit path only uses os (not even typing) - config / pathlib are imported when the cache needs rebuilding
+
+import os
+import sys
+
+from .completion import settings_stamp  # Also os only
+
+CACHE_FILENAME = "prompt"
+
+
+def default_cache_file() -> str:
+  "Location of the prompt cache - mirrors Config.cache_directory(), without importing pathlib"
+  cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+  return os.path.join(cache_home, "molpro_dirman", CACHE_FILENAME)
+
+
+def format_segment(main: str, aux_count: int, show_aux: bool = False) -> str:
+  "Main project name, optionally followed by the number of aux projects linked (eg: 'DO-4256663 +2')"
+  if show_aux and aux_count:
+    return f"{main} +{aux_count}" if main else f"+{aux_count}"
+  return main
+
+
+def prompt_segment(show_aux: bool = False, cache_file: str | None = None) -> str:
+  "Prompt text for the active project(s), rebuilt only when the symlink directory's mtime (or the settings) change"
+  cache_file = cache_file or default_cache_file()
+  try:
+    with open(cache_file) as fd:
+      symlink_dir, mtime_ns, main, aux_count, stamp = fd.read().split("\0")
+    if stamp == settings_stamp() and os.stat(symlink_dir).st_mtime_ns == int(mtime_ns):
+      return format_segment(main, int(aux_count), show_aux)
+  except (OSError, ValueError):
+    pass  # No cache yet, corrupt cache, or the symlink directory has gone
+
+  main, aux_count = refresh_cache(cache_file)
+  return format_segment(main, aux_count, show_aux)
+
+
+def refresh_cache(cache_file: str) -> tuple[str, int]:
+  "Recompute the active project / aux count and atomically rewrite the prompt cache"
+  from .config import Config
+  from .local_read import Project
+
+  stamp = settings_stamp()
+  symlink_dir = Config.base_symlink_directory()
+  mtime_ns = os.stat(symlink_dir).st_mtime_ns  # Taken first, so changes made while we read invalidate the cache
+  main = Project.active() or ""
+  aux_count = sum(
+    1 for link in Project.all_symlinks()
+    if link.parts[-1] != Config.main_project_symlink_name()
+  )
+
+  os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+  tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+  with open(tmp_file, "w") as fd:
+    fd.write("\0".join([str(symlink_dir), str(mtime_ns), main, str(aux_count), stamp]))
+  os.replace(tmp_file, cache_file)
+  return main, aux_count
+
+
+def main(argv: list[str] | None = None) -> None:
+  "Standalone entry point: mpdman-prompt [--aux]"
+  argv = sys.argv[1:] if argv is None else argv
+  segment = prompt_segment(show_aux="--aux" in argv)
+  if segment:
+    sys.stdout.write(segment + "\n")
+
+
+if __name__ == "__main__":
+  main()
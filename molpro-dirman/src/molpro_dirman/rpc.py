@@ -0,0 +1,109 @@
+# Client for the daemon's JSON-RPC 2.0 API (see serve.py), used transparently by the CLI when a daemon is running
+#
+# Requests and responses are single-line JSON objects, newline terminated, over the Unix socket at Config.socket_path().
+# A connection can be kept open for any number of requests, answered in order - eg: by an editor plugin polling 'active':
+#
+#   {"jsonrpc": "2.0", "id": 1, "method": "active", "params": {}}
+#   {"jsonrpc": "2.0", "id": 1, "result": {"main": "DO-4256663", "links": [...]}}
+#
+# The CLI also sends "settings", its completion.settings_stamp() - requests made with other env overrides or config file
+# than the daemon's are refused with SETTINGS_MISMATCH, and run in-process instead. Clients that leave it out get the
+# daemon's settings.
+
+import os
+import json
+import socket
+from pathlib import Path
+from typing import Any, Optional
+
+from . import errors
+from .config import Config
+from .errors import DaemonError, DaemonSettingsMismatch
+from .completion import settings_stamp
+
+NO_DAEMON_ENV = "MPDMAN_NO_DAEMON"  # Set to run every command in-process, even with a daemon running
+CLIENT_TIMEOUT_S = 30  # Creating projects can wait on the project directory lock
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+COMMAND_FAILED = -32000  # An mpdman error - its type is in the error's data, see remote_error
+SETTINGS_MISMATCH = -32001  # Not run - the daemon has other settings than the client
+
+
+def remote_error(error: dict) -> Exception:
+  "The exception for an error response - the mpdman error the daemon raised, where it's one from errors.py"
+  data = error.get("data") or {}
+  error_type = getattr(errors, str(data.get("type")), None)
+  if isinstance(error_type, type) and issubclass(error_type, Exception):
+    return error_type(error.get("message", ""))
+  return DaemonError(f"{error.get('message', 'Daemon error')} ({error.get('code')})")
+
+
+class DaemonClient:
+  "Connection to a running daemon - raises OSError on connecting if there isn't one"
+
+  def __init__(self, path: Optional[Path] = None, timeout: float = CLIENT_TIMEOUT_S):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      self.sock.settimeout(timeout)
+      self.sock.connect(str(path or Config.socket_path()))
+    except OSError:
+      self.sock.close()
+      raise
+    self.file = self.sock.makefile("rwb")
+    self.last_id = 0
+    self.settings = settings_stamp()
+
+  def __enter__(self) -> "DaemonClient":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def call(self, method: str, **params) -> Any:
+    "Result of a method call - raises the daemon's error, or OSError / DaemonError if the connection fails"
+    self.last_id += 1
+    request = {"jsonrpc": "2.0", "id": self.last_id, "method": method, "params": params, "settings": self.settings}
+    self.file.write(json.dumps(request).encode() + b"\n")
+    self.file.flush()
+    line = self.file.readline()
+    if not line:
+      raise DaemonError("The daemon closed the connection")
+    try:
+      response = json.loads(line)
+    except ValueError as e:
+      raise DaemonError(f"Unreadable response from the daemon: {e}") from e
+    if "error" in response:
+      raise remote_error(response["error"])
+    return response["result"]
+
+  def close(self) -> None:
+    self.file.close()
+    self.sock.close()
+
+
+def daemon_call(method: str, params: Optional[dict] = None, idempotent: bool = True) -> Optional[Any]:
+  """Result of a call to the running daemon - or None if there isn't one, so the caller runs the command in-process
+
+  Errors the daemon raises are re-raised here. Idempotent calls (queries) also fall back to running in-process if the
+  connection fails part way - commands that change things don't, as the daemon may already have run them. Any call the
+  daemon refuses for having other settings (eg: MPDMAN_PROJECT_ROOTS set for this one command) runs in-process"""
+  if os.environ.get(NO_DAEMON_ENV):
+    return None
+  try:
+    client = DaemonClient()
+  except OSError:
+    return None  # Not running, or a stale socket left behind
+
+  with client:
+    try:
+      return client.call(method, **(params or {}))
+    except DaemonSettingsMismatch:
+      return None  # Never run by the daemon
+    except (OSError, DaemonError):
+      if idempotent:
+        return None
+      raise
@@ -0,0 +1,223 @@
+# Persistent inverted index of project README contents (and optionally top-level filenames), for search
+#
+# Each query re-stats every README (and project directory, for filenames) but only re-reads those whose mtime changed,
+# so answering never means reading every README. Results are ranked by cached project activity.
+
+import os
+import re
+import sqlite3
+from pathlib import Path
+from collections import namedtuple
+from typing import Iterable, Optional
+
+from .config import Config
+from .local_read import README_FILENAME
+
+SCHEMA_VERSION = 2
+SQLITE_BUSY_TIMEOUT = 30  # Seconds to wait on another writer
+TOKEN_PATTERN = re.compile(r"[^\W_]+")  # Runs of letters / digits - so 'DO-4256663' is 'do' and '4256663'
+PREFIX_WILDCARD = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+  path TEXT PRIMARY KEY,
+  title TEXT NOT NULL,
+  readme_mtime_ns INTEGER,
+  files_mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+  term TEXT NOT NULL,
+  path TEXT NOT NULL,
+  field TEXT NOT NULL,
+  PRIMARY KEY (term, field, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_path ON postings (path);
+"""
+
+SearchResult = namedtuple("SearchResult", ["path", "title", "timestamp"])
+
+
+def tokenize(text: str) -> set[str]:
+  "Lowercased words and numbers in text"
+  return {token.lower() for token in TOKEN_PATTERN.findall(text)}
+
+
+def readme_title(text: str) -> str:
+  "Title from the first heading of a README - anywhere in it, unlike local_read.readme_title, as search reads it all"
+  for line in text.splitlines():
+    if line.startswith("# "):
+      return line[2:].strip()
+  return ""
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+  "Smallest string greater than every string starting with prefix"
+  return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SearchIndex:
+  "SQLite-backed inverted index - term -> projects, for the 'readme' (name, title, description) and 'files' fields"
+
+  def __init__(self, db_path: Optional[Path] = None):
+    self.db_path = Path(db_path or Config.search_index_path())
+    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+    self.conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT)
+    self._migrate()
+
+  def __enter__(self) -> "SearchIndex":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self.conn.close()
+
+  def _migrate(self) -> None:
+    "Create tables, dropping any index written by an incompatible version"
+    row = None
+    try:
+      row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    except sqlite3.OperationalError:
+      pass  # Fresh database, no meta table yet
+
+    if row is not None and int(row[0]) != SCHEMA_VERSION:
+      with self.conn:
+        for table in ("meta", "documents", "postings"):
+          self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    self.conn.execute("PRAGMA journal_mode=WAL")
+    with self.conn:
+      self.conn.executescript(SCHEMA)
+      self.conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+      )
+
+  # INDEXING
+  def refresh(self, paths: Iterable[Path], files: bool = False) -> int:
+    """Bring the index up to date with these projects, forgetting any others - returns the number re-indexed
+
+    READMEs are only re-read if their mtime changed. With files, top-level filenames are indexed too, re-listed
+    only when the project directory's mtime changed"""
+    known = {
+      path: (readme_mtime_ns, files_mtime_ns) for path, readme_mtime_ns, files_mtime_ns in
+      self.conn.execute("SELECT path, readme_mtime_ns, files_mtime_ns FROM documents")
+    }
+    reindexed = 0
+    with self.conn:
+      seen = set()
+      for path in paths:
+        key = str(path)
+        seen.add(key)
+        readme_mtime_ns, files_mtime_ns = known.get(key, (None, None))
+
+        changed = False
+        try:
+          current = os.stat(os.path.join(key, README_FILENAME)).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+          current = -1  # No README - still searchable by name
+        if key not in known or current != readme_mtime_ns:
+          self._index_readme(key, current)
+          changed = True
+
+        if files:
+          try:
+            current = os.stat(key).st_mtime_ns
+          except (FileNotFoundError, NotADirectoryError):
+            current = -1
+          if current != files_mtime_ns:
+            self._index_files(key, current)
+            changed = True
+        reindexed += changed
+
+      gone = [(key,) for key in known.keys() - seen]
+      self.conn.executemany("DELETE FROM documents WHERE path = ?", gone)
+      self.conn.executemany("DELETE FROM postings WHERE path = ?", gone)
+    return reindexed
+
+  def _index_readme(self, key: str, mtime_ns: int) -> None:
+    try:
+      text = Path(key, README_FILENAME).read_text(errors="replace")
+    except OSError:
+      text = ""
+    terms = tokenize(os.path.basename(key)) | tokenize(text)
+
+    self.conn.execute(
+      "INSERT INTO documents (path, title, readme_mtime_ns) VALUES (?, ?, ?) "
+      "ON CONFLICT (path) DO UPDATE SET title = excluded.title, readme_mtime_ns = excluded.readme_mtime_ns",
+      (key, readme_title(text), mtime_ns)
+    )
+    self._replace_postings(key, "readme", terms)
+
+  def _index_files(self, key: str, mtime_ns: int) -> None:
+    try:
+      names = os.listdir(key)
+    except OSError:
+      names = []
+    terms = set().union(*(tokenize(name) for name in names if name != README_FILENAME))
+
+    self.conn.execute("UPDATE documents SET files_mtime_ns = ? WHERE path = ?", (mtime_ns, key))
+    self._replace_postings(key, "files", terms)
+
+  def _replace_postings(self, key: str, field: str, terms: set[str]) -> None:
+    self.conn.execute("DELETE FROM postings WHERE path = ? AND field = ?", (key, field))
+    self.conn.executemany(
+      "INSERT INTO postings (term, field, path) VALUES (?, ?, ?)", ((term, field, key) for term in terms)
+    )
+
+  # QUERYING
+  @staticmethod
+  def _term_clause(term: str, fields: tuple[str, ...]) -> tuple[str, tuple]:
+    "Query for paths with a term in any of the fields - a trailing '*' matches any term with that prefix (a range scan)"
+    placeholders = ", ".join("?" * len(fields))
+    if term.endswith(PREFIX_WILDCARD):
+      prefix = term.rstrip(PREFIX_WILDCARD)
+      return (
+        f"SELECT path FROM postings WHERE term >= ? AND term < ? AND field IN ({placeholders})",
+        (prefix, _prefix_upper_bound(prefix), *fields),
+      )
+    return f"SELECT path FROM postings WHERE term = ? AND field IN ({placeholders})", (term, *fields)
+
+  def search(self, query: str, files: bool = False, limit: Optional[int] = None) -> list[SearchResult]:
+    """Projects matching every term of the query (eg: 'motor contr*'), most recently active first
+
+    Recency is the project's cached activity timestamp where the activity index has one, else its README's mtime"""
+    terms = []
+    for word in query.split():
+      wildcard = word.endswith(PREFIX_WILDCARD)
+      for token in sorted(tokenize(word)):
+        terms.append(token + PREFIX_WILDCARD if wildcard else token)
+    if not terms:
+      return []
+
+    fields = ("readme", "files") if files else ("readme",)
+    clauses = [self._term_clause(term, fields) for term in dict.fromkeys(terms)]
+    rows = self.conn.execute(
+      "SELECT path, title, readme_mtime_ns FROM documents WHERE path IN ("
+      + " INTERSECT ".join(sql for sql, _ in clauses) + ")",
+      tuple(param for _, params in clauses for param in params)
+    ).fetchall()
+    activity = self._cached_activity({path for path, _, _ in rows})
+
+    ranked = sorted(
+      (
+        (activity.get(path) or (readme_mtime_ns / 1e9 if readme_mtime_ns and readme_mtime_ns > 0 else 0.0), path, title)
+        for path, title, readme_mtime_ns in rows
+      ),
+      reverse=True,
+    )
+    return [SearchResult(Path(path), title, ts) for ts, path, title in ranked[:limit]]  # Paths only for what's kept
+
+  @staticmethod
+  def _cached_activity(paths: set[str]) -> dict[str, float]:
+    "Cached activity timestamps from the activity index, without walking anything"
+    from .index import ActivityIndex
+
+    if not Config.index_path().exists():
+      return {}
+    with ActivityIndex() as index:
+      return {path: ts for path in paths if (ts := index.cached_timestamp(Path(path))) is not None}
@@ -0,0 +1,255 @@
+# Persistent daemon answering CLI commands over a Unix socket, from project / symlink state kept warm in memory
+#
+# The daemon runs the watcher (see watch.py) to keep the activity index live, and rebuilds its in-memory snapshot only
+# after the watcher reports a change (or a command changes something). Query results are encoded once per snapshot,
+# so clients polling many times a second cost a dict lookup per request. The config file is re-read once it's edited;
+# requests from clients with other settings are refused, for them to run in-process. Protocol: see rpc.py.
+#
+#   molpro_dirman serve [--poll SECONDS] [--max-watches N]
+
+import os
+import json
+import time
+import signal
+import threading
+import socketserver
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .config import Config, reload_settings
+from .completion import settings_stamp
+from .index import ActivityIndex
+from .local_read import Project
+from .local_write import symlink_project, unlink_main, unlink_all, unlink_specific, create_project, create_projects
+from .watch import start_watcher
+from .errors import DaemonError
+from .rpc import (
+  DaemonClient, PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, COMMAND_FAILED, SETTINGS_MISMATCH
+)
+
+UNWATCHED_TTL_S = 5  # Snapshots including projects the watcher couldn't cover are rebuilt after this long
+
+
+class DaemonState:
+  "Projects, their activity and the active symlinks, rebuilt lazily once the watcher or a command changes anything"
+
+  def __init__(self, index: ActivityIndex):
+    self.index = index
+    self.lock = threading.RLock()
+    self.stale = True
+    self.expires = 0.0
+    self.projects: list[dict] = []  # Most recently active first
+    self.links: list[dict] = []
+    self.main: Optional[str] = None
+    self.results: dict[str, str] = {}  # Encoded query results for this snapshot, by method and params
+    self.refreshes = 0
+    self.requests = 0
+    self.settings = settings_stamp()  # Those loaded
+
+  def check_settings(self, client_settings: Optional[str]) -> bool:
+    "Whether a client's settings (None if it didn't say) are the daemon's - re-reading the config file if it's changed"
+    current = settings_stamp()
+    if current != self.settings:
+      with self.lock:
+        reload_settings()
+        self.settings = current
+        self.stale = True
+    return client_settings is None or client_settings == current
+
+  def invalidate(self) -> None:
+    with self.lock:
+      self.stale = True
+
+  def snapshot(self) -> None:
+    "Rebuild the snapshot if anything changed since - projects the watcher keeps live are read from the index"
+    with self.lock:
+      if not self.stale and time.monotonic() < self.expires:
+        return
+      self.stale = False
+      paths = Project.list_paths()
+      live = self.index.live_timestamps()
+      timestamps = dict(zip(paths, self.index.project_timestamps(paths)))
+      self.projects = [
+        {"name": path.parts[-1], "path": str(path), "root": str(path.parent), "last_activity": timestamps[path]}
+        for path in sorted(paths, key=lambda path: (timestamps[path], path.parts[-1]), reverse=True)
+      ]
+
+      links = Project.all_symlinks()
+      targets = [Path(os.readlink(link)) for link in links]
+      activity = dict(zip(targets, self.index.project_timestamps(targets)))
+      self.links = [
+        {"symlink": str(link), "project": target.parts[-1], "path": str(target), "last_activity": activity[target]}
+        for link, target in sorted(zip(links, targets))
+      ]
+      self.main = Project.active()
+
+      self.expires = float("inf") if all(str(path) in live for path in paths) else time.monotonic() + UNWATCHED_TTL_S
+      self.results.clear()
+      self.refreshes += 1
+    self.index.close_finished_threads()  # The scan workers' connections
+
+  def query(self, method: str, params: dict) -> str:
+    "Encoded result of a query, from the current snapshot"
+    key = f"{method}\0{json.dumps(params, sort_keys=True)}"
+    with self.lock:
+      self.snapshot()
+      result = self.results.get(key)
+      if result is None:
+        result = self.results[key] = json.dumps(QUERIES[method](self, **params))
+      return result
+
+  def command(self, method: str, params: dict) -> str:
+    "Encoded result of a command - the snapshot is rebuilt on the next query"
+    try:
+      return json.dumps(COMMANDS[method](**params))
+    finally:
+      self.invalidate()
+
+
+# QUERIES - answered from the snapshot
+def ls(state: DaemonState, top: Optional[int] = None) -> dict:
+  return {"projects": state.projects[:top] if top else state.projects}
+
+
+def active(state: DaemonState) -> dict:
+  return {"main": state.main, "links": state.links}
+
+
+def status(state: DaemonState) -> dict:
+  return {**active(state), **ls(state)}
+
+
+# COMMANDS - run as they would be in-process
+def activate(project: str) -> dict:
+  project_path = Project.path_of(project)
+  return {"project": project, "path": str(project_path), "symlink": str(symlink_project(project_path, is_main=True))}
+
+
+def deactivate(project: str = "main") -> dict:
+  match project:
+    case "main":
+      removed = unlink_main()
+    case "all":
+      removed = unlink_all()
+    case _:
+      removed = unlink_specific(Project.path_of(project))
+  return {"removed": [str(path) for path in removed]}
+
+
+def create(prefixes: list[str], title: str, description: str = "", serial: Optional[int] = None, count: int = 1) -> dict:
+  if count > 1:
+    return {"paths": [str(path) for path in create_projects(prefixes, title, description, count)]}
+  return {"paths": [str(create_project(prefixes, title, description, serial))]}
+
+
+QUERIES: dict[str, Callable[..., Any]] = {"ls": ls, "active": active, "status": status}
+COMMANDS: dict[str, Callable[..., Any]] = {"activate": activate, "deactivate": deactivate, "create": create}
+
+
+def respond(state: DaemonState, line: bytes) -> bytes:
+  "The response line for a request line"
+  state.requests += 1
+  request_id = None
+  try:
+    request = json.loads(line)
+    request_id = request.get("id")
+    method, params, settings = request["method"], request.get("params") or {}, request.get("settings")
+    if not isinstance(params, dict):
+      raise TypeError("params must be an object")
+  except ValueError as e:
+    return error_response(request_id, PARSE_ERROR, f"Parse error: {e}")
+  except (AttributeError, KeyError, TypeError) as e:
+    return error_response(request_id, INVALID_REQUEST, f"Invalid request: {e}")
+
+  if method not in QUERIES and method not in COMMANDS:
+    return error_response(request_id, METHOD_NOT_FOUND, f"Unknown method {method!r}")
+  if not state.check_settings(settings):
+    return error_response(
+      request_id, SETTINGS_MISMATCH, "The daemon runs with other settings", {"type": "DaemonSettingsMismatch"}
+    )
+  try:
+    result = state.query(method, params) if method in QUERIES else state.command(method, params)
+  except TypeError as e:
+    return error_response(request_id, INVALID_PARAMS, f"Invalid params: {e}")
+  except Exception as e:
+    return error_response(request_id, COMMAND_FAILED, str(e), {"type": type(e).__name__})
+  return f'{{"jsonrpc": "2.0", "id": {json.dumps(request_id)}, "result": {result}}}\n'.encode()
+
+
+def error_response(request_id: Any, code: int, message: str, data: Optional[dict] = None) -> bytes:
+  error = {"code": code, "message": message, **({"data": data} if data else {})}
+  return json.dumps({"jsonrpc": "2.0", "id": request_id, "error": error}).encode() + b"\n"
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+  "One client connection - requests are answered in order until the client disconnects"
+
+  def handle(self):
+    for line in self.rfile:
+      if line.strip():
+        self.wfile.write(respond(self.server.state, line))
+
+  def finish(self):
+    try:
+      super().finish()
+    finally:
+      self.server.state.index.close_thread()  # Each client gets a thread of its own, so it goes with it
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+  daemon_threads = True
+
+  def __init__(self, path: Path, state: DaemonState):
+    if path.exists():
+      try:
+        DaemonClient(path, timeout=1).close()
+      except OSError:
+        path.unlink()  # Left behind by a daemon that didn't exit cleanly
+      else:
+        raise DaemonError(f"A daemon is already listening on {path}")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    umask = os.umask(0o177)  # Only this user can connect
+    try:
+      super().__init__(str(path), DaemonRequestHandler)
+    finally:
+      os.umask(umask)
+    self.path = path
+    self.state = state
+
+  def server_close(self) -> None:
+    super().server_close()
+    self.path.unlink(missing_ok=True)
+
+
+def serve(
+  stop: Optional[threading.Event] = None,
+  ready: Optional[Callable[[str], None]] = None,
+  max_watches: Optional[int] = None,
+  poll_interval: Optional[float] = None,
+) -> None:
+  "Answer requests until stop is set (or SIGINT / SIGTERM) - ready is called with a description once listening"
+  stop = stop or threading.Event()
+  if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+  with start_watcher(max_watches=max_watches, poll_interval=poll_interval) as watcher, ActivityIndex() as index:
+    state = DaemonState(index)
+    server = DaemonServer(Config.socket_path(), state)
+    threads = [
+      threading.Thread(target=watcher.run, args=(stop, state.invalidate), daemon=True),
+      threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True),
+    ]
+    try:
+      for thread in threads:
+        thread.start()
+      if ready:
+        ready(f"Listening on {server.path} - {watcher.describe()}")
+      while not stop.wait(1):
+        pass
+    finally:
+      stop.set()
+      server.shutdown()
+      server.server_close()
+      for thread in threads:
+        thread.join()
@@ -0,0 +1,192 @@
+# Syncing local project serials with the serial DBMS (registry), exchanging only what changed since the last sync
+#
+# Registry API (JSON over HTTP/1.1, see sync_server.py for the local stand-in):
+#   GET  /v1/serials?since=<seq>&limit=<n>  -> {"serials": [{"name", "title", "seq"}, ...], "next": <seq>, "more": bool}
+#   POST /v1/serials  {"serials": [{"name", "title"}, ...]}  -> {"registered": [names], "existing": [names]}
+#   POST /v1/events  {"events": [journal events, see journal.py]}  -> {"applied": [ids], "duplicate": [ids]}
+
+import os
+import json
+from collections import namedtuple
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlencode
+
+from .config import Config
+from .local_read import Project, project_title
+from .errors import RegistryError
+
+PULL_PAGE_SIZE = 10_000  # Serials fetched per GET
+PUSH_BATCH_SIZE = 2_000  # Serials registered per POST
+REQUEST_TIMEOUT = 30  # Seconds
+
+SyncReport = namedtuple("SyncReport", ["pushed", "pulled", "round_trips"])
+
+
+class SyncState:
+  "Local record of serials known to be in the registry, and the registry change cursor they're current to"
+
+  def __init__(self, registry: str, cursor: int = 0, serials: Optional[dict[str, str]] = None):
+    self.registry = registry
+    self.cursor = cursor
+    self.serials: dict[str, str] = dict(serials or {})
+
+  @staticmethod
+  def load(registry: Optional[str] = None) -> "SyncState":
+    "State for a registry - starts afresh if none has been saved, or it was for another registry"
+    registry = registry or Config.registry_url() or ""
+    try:
+      data = json.loads(Config.sync_state_path().read_text())
+    except (FileNotFoundError, ValueError):
+      return SyncState(registry)
+
+    if data.get("registry") != registry:
+      return SyncState(registry)
+    return SyncState(registry, data.get("cursor", 0), data.get("serials", {}))
+
+  def save(self) -> None:
+    "Atomically write the sync state"
+    path = Config.sync_state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"registry": self.registry, "cursor": self.cursor, "serials": self.serials}))
+    os.replace(tmp_path, path)
+
+  def taken_serials(self, prefix: str) -> set[int]:
+    "Serials the registry holds for a prefix combination - including projects that aren't on this machine"
+    taken = set()
+    for name in self.serials:
+      name_prefix, _, serial = name.partition("-")
+      if name_prefix == prefix and serial.isdigit():
+        taken.add(int(serial))
+    return taken
+
+
+class RegistryClient:
+  "Minimal JSON client for the registry, reusing one keep-alive connection for every request"
+
+  def __init__(self, url: str, token: Optional[str] = None, timeout: float = REQUEST_TIMEOUT):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+      raise RegistryError(f"Invalid registry URL: {url!r}")
+    self.scheme = parts.scheme
+    self.host = parts.hostname
+    self.port = parts.port
+    self.base_path = parts.path.rstrip("/")
+    self.token = token
+    self.timeout = timeout
+    self.round_trips = 0
+    self._conn = None
+
+  def __enter__(self) -> "RegistryClient":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    if self._conn is not None:
+      self._conn.close()
+      self._conn = None
+
+  def _connection(self):
+    if self._conn is None:
+      import http.client  # Deferred - only sync needs it
+
+      connection_type = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+      self._conn = connection_type(self.host, self.port, timeout=self.timeout)
+    return self._conn
+
+  def request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+    "Make a JSON request, reconnecting once if the pooled connection was dropped by the server"
+    import http.client
+
+    headers = {"Accept": "application/json"}
+    payload = None
+    if body is not None:
+      payload = json.dumps(body).encode()
+      headers["Content-Type"] = "application/json"
+    if self.token:
+      headers["Authorization"] = f"Bearer {self.token}"
+
+    for attempt in range(2):
+      conn = self._connection()
+      try:
+        conn.request(method, self.base_path + path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        break
+      except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+        self.close()
+        if attempt:
+          raise RegistryError(f"Registry connection failed: {e}") from e
+      except OSError as e:
+        self.close()
+        raise RegistryError(f"Registry unreachable: {e}") from e
+
+    self.round_trips += 1
+    if response.status >= 400:
+      raise RegistryError(f"Registry returned {response.status} for {method} {path}: {data[:200]!r}")
+    try:
+      return json.loads(data)
+    except ValueError as e:
+      raise RegistryError(f"Registry returned invalid JSON for {method} {path}") from e
+
+  def changes_since(self, cursor: int, limit: Optional[int] = None) -> Iterator[list[dict]]:
+    "Pages of serials registered after the cursor"
+    limit = limit or PULL_PAGE_SIZE
+    while True:
+      page = self.request("GET", f"/v1/serials?{urlencode({'since': cursor, 'limit': limit})}")
+      yield page["serials"]
+      cursor = page["next"]
+      if not page.get("more"):
+        return
+
+  def register(self, serials: list[dict]) -> dict:
+    "Register a batch of serials - already registered ones are reported, not treated as errors"
+    return self.request("POST", "/v1/serials", {"serials": serials})
+
+  def apply_events(self, events: list[dict]) -> dict:
+    "Apply a batch of journal events - the registry ignores event ids it has already applied"
+    return self.request("POST", "/v1/events", {"events": events})
+
+
+def local_serials() -> list[str]:
+  "Names of local project directories that are valid serials"
+  pattern = Config.project_name_pattern()
+  return [name for name in Project.list_names() if pattern.fullmatch(name)]
+
+
+def sync(registry: Optional[str] = None, dry_run: bool = False) -> SyncReport:
+  """Pull serials registered since the last sync, then push local serials the registry doesn't have
+
+  Round trips scale with the number of changes / page size, not with the number of projects"""
+  registry = registry or Config.registry_url()
+  if not registry:
+    raise RegistryError("No registry configured - set MPDMAN_REGISTRY_URL or pass --registry")
+
+  state = SyncState.load(registry)
+  pulled: list[str] = []
+  pushed: list[str] = []
+
+  with RegistryClient(registry, token=Config.registry_token()) as client:
+    # Pull - everything registered since our cursor
+    for page in client.changes_since(state.cursor):
+      for record in page:
+        if record["name"] not in state.serials:
+          pulled.append(record["name"])
+        state.serials[record["name"]] = record.get("title", "")
+        state.cursor = max(state.cursor, record["seq"])
+
+    # Push - local serials that the registry doesn't know about yet
+    to_push = sorted(set(local_serials()) - state.serials.keys())
+    if not dry_run:
+      for start in range(0, len(to_push), PUSH_BATCH_SIZE):
+        batch = [{"name": name, "title": project_title(Project.path_of(name))} for name in to_push[start:start + PUSH_BATCH_SIZE]]
+        client.register(batch)
+        state.serials.update((record["name"], record["title"]) for record in batch)
+    pushed = to_push
+    round_trips = client.round_trips
+
+  if not dry_run:
+    state.save()
+  return SyncReport(pushed=pushed, pulled=sorted(pulled), round_trips=round_trips)
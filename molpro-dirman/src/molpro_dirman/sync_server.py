@@ -0,0 +1,145 @@
+# Local stand-in for the serial registry, implementing the API used by sync.py - for tests and offline development
+#
+#   python -m molpro_dirman.sync_server [--host 127.0.0.1] [--port 8765]
+
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+MAX_PAGE_SIZE = 10_000
+
+
+class RegistryStore:
+  "In-memory registry - serials in registration order, each with a monotonically increasing change sequence"
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.serials: dict[str, dict] = {}
+    self.applied_events: set[str] = set()
+    self.seq = 0
+
+  def changes_since(self, since: int, limit: int) -> dict:
+    with self.lock:
+      # Insertion order is sequence order, so this is a simple scan - fine for a stand-in
+      records = [record for record in self.serials.values() if record["seq"] > since]
+    page = records[:limit]
+    return {
+      "serials": page,
+      "next": page[-1]["seq"] if page else since,
+      "more": len(records) > limit,
+    }
+
+  def register(self, serials: list[dict]) -> dict:
+    registered, existing = [], []
+    with self.lock:
+      for record in serials:
+        if record["name"] in self.serials:
+          existing.append(record["name"])
+          continue
+        self.seq += 1
+        self.serials[record["name"]] = {"name": record["name"], "title": record.get("title", ""), "seq": self.seq}
+        registered.append(record["name"])
+    return {"registered": registered, "existing": existing}
+
+  def apply_events(self, events: list[dict]) -> dict:
+    applied, duplicate = [], []
+    for event in events:
+      with self.lock:
+        if event["id"] in self.applied_events:
+          duplicate.append(event["id"])
+          continue
+        self.applied_events.add(event["id"])
+        if event["type"] in ("delete", "rename"):
+          self.serials.pop(event.get("old_name", event["name"]), None)
+      if event["type"] in ("create", "rename"):
+        self.register([event])
+      applied.append(event["id"])
+    return {"applied": applied, "duplicate": duplicate}
+
+
+class RegistryRequestHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse one connection
+
+  def log_message(self, format, *args):
+    pass  # Quiet by default
+
+  def _send_json(self, status: int, body: dict) -> None:
+    payload = json.dumps(body).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def do_GET(self):
+    self.server.request_count += 1
+    url = urlsplit(self.path)
+    if url.path != "/v1/serials":
+      return self._send_json(404, {"error": "not found"})
+
+    query = parse_qs(url.query)
+    try:
+      since = int(query.get("since", ["0"])[0])
+      limit = min(int(query.get("limit", [str(MAX_PAGE_SIZE)])[0]), MAX_PAGE_SIZE)
+    except ValueError:
+      return self._send_json(400, {"error": "since / limit must be integers"})
+    self._send_json(200, self.server.store.changes_since(since, limit))
+
+  def do_POST(self):
+    self.server.request_count += 1
+    routes = {
+      "/v1/serials": ("serials", self.server.store.register),
+      "/v1/events": ("events", self.server.store.apply_events),
+    }
+    route = routes.get(urlsplit(self.path).path)
+    if route is None:
+      return self._send_json(404, {"error": "not found"})
+
+    key, handler = route
+    try:
+      body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+      records = body[key]
+    except (ValueError, KeyError, TypeError):
+      return self._send_json(400, {"error": f"expected {{\"{key}\": [...]}}"})
+    self._send_json(200, handler(records))
+
+
+class RegistryServer(ThreadingHTTPServer):
+  "Stand-in registry server - port 0 picks a free port, see url"
+  daemon_threads = True
+
+  def __init__(self, host: str = "127.0.0.1", port: int = 0, store: RegistryStore = None):
+    super().__init__((host, port), RegistryRequestHandler)
+    self.store = store or RegistryStore()
+    self.request_count = 0
+
+  @property
+  def url(self) -> str:
+    host, port = self.server_address[:2]
+    return f"http://{host}:{port}"
+
+  def start(self) -> threading.Thread:
+    "Serve on a background thread"
+    thread = threading.Thread(target=self.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Local stand-in for the MolPro serial registry")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8765)
+  args = parser.parse_args()
+
+  server = RegistryServer(args.host, args.port)
+  print(f"Serving stand-in registry at {server.url} - export MPDMAN_REGISTRY_URL={server.url}")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
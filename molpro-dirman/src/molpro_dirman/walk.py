@@ -0,0 +1,185 @@
+# Low-level directory walking, for working out when a project was last active
+
+import os
+import time
+from fnmatch import fnmatch
+from collections import deque
+from pathlib import Path
+from typing import Callable, Container, Iterable, Iterator, Optional, TypeVar
+
+from .config import settings
+from .git_activity import repositories_activity
+
+IGNORE_FILENAME = ".mpdmanignore"
+
+# Directories that are never worth descending into - churned by tools, not by people
+DEFAULT_IGNORE_PATTERNS = (
+  ".git/objects",
+  "node_modules",
+  "__pycache__",
+  ".venv",
+  "*-backups",  # KiCad autosave backups
+  ".FreeCAD-cache",
+  "Fusion 360 cache",
+)
+
+
+def default_jobs() -> int:
+  "Default worker count for concurrent project scans - walks are I/O bound, so oversubscribe the CPUs"
+  return (os.cpu_count() or 1) * 2
+
+
+T = TypeVar("T")
+
+
+def map_per_root(func: Callable[[Path], T], paths: list[Path], jobs: Optional[int] = None) -> Iterator[tuple[Path, T]]:
+  """(path, func(path)) for each project, in completion order - with a pool of jobs workers per project root
+
+  Projects are grouped by their parent directory (ie: the root they live in), so a slow device such as an archive disk
+  or NFS share only ties up its own workers, never those scanning projects on fast ones. Pending work is cancelled if
+  the iterator is abandoned part way through"""
+  jobs = jobs or default_jobs()
+  if jobs <= 1 or len(paths) <= 1:
+    yield from ((path, func(path)) for path in paths)
+    return
+
+  from concurrent.futures import ThreadPoolExecutor, as_completed
+
+  groups: dict[Path, list[Path]] = {}
+  for path in paths:
+    groups.setdefault(path.parent, []).append(path)
+  pools = [ThreadPoolExecutor(max_workers=min(jobs, len(group))) for group in groups.values()]
+  futures = {}
+  try:
+    for pool, group in zip(pools, groups.values()):
+      futures.update((pool.submit(func, path), path) for path in group)
+    for future in as_completed(futures):
+      yield futures[future], future.result()
+  finally:
+    for future in futures:
+      future.cancel()
+    for pool in pools:
+      pool.shutdown()
+
+
+def entry_activity(stat_result: os.stat_result) -> float:
+  "Most recent of access / modification time for a single stat result"
+  return max(stat_result.st_atime, stat_result.st_mtime)
+
+
+def ignore_patterns(project_path: Path) -> tuple[str, ...]:
+  "Directory patterns to prune when walking a project - defaults and the config file's, plus any lines in the project's ignore file"
+  defaults = DEFAULT_IGNORE_PATTERNS + settings().ignore_patterns
+  try:
+    lines = (project_path / IGNORE_FILENAME).read_text().splitlines()
+  except (OSError, UnicodeDecodeError):
+    return defaults  # Missing, unreadable or not text - a bad ignore file shouldn't stop the scan
+
+  return defaults + tuple(
+    line.strip().strip("/") for line in lines
+    if line.strip() and not line.lstrip().startswith("#")
+  )
+
+
+def is_ignored(relative_path: str, patterns: Iterable[str]) -> bool:
+  """Whether a directory (path relative to project root, '/' separated) matches any ignore pattern
+
+  Patterns without a '/' match a directory name at any depth, patterns with one match the tail of the path"""
+  name = relative_path.rsplit("/", 1)[-1]
+  for pattern in patterns:
+    if "/" not in pattern:
+      if fnmatch(name, pattern):
+        return True
+    elif fnmatch(relative_path, pattern) or fnmatch(relative_path, f"*/{pattern}"):
+      return True
+  return False
+
+
+def walk_activity(path: Path, patterns: Optional[Iterable[str]] = None) -> Optional[float]:
+  """Most recent atime / mtime of any entry below path, or None if there are no entries
+
+  Iterative scandir walk: one lstat per entry, symlinks are never followed, and ignored
+  directories are pruned without being stat'd at all"""
+  return bounded_walk_activity(path, patterns)[0]
+
+
+def project_activity(path: Path, patterns: Optional[Iterable[str]] = None) -> Optional[float]:
+  "walk_activity, except git repositories (the project, or its top-level subdirectories) are read from git metadata"
+  repos_latest, repos = repositories_activity(path)
+  if "" in repos:
+    return repos_latest
+  return max_activity(repos_latest, bounded_walk_activity(path, patterns, skip=repos)[0])
+
+
+def bounded_walk_activity(
+  path: Path,
+  patterns: Optional[Iterable[str]] = None,
+  max_depth: Optional[int] = None,
+  deadline: Optional[float] = None,
+  skip: Container[str] = (),
+) -> tuple[Optional[float], bool]:
+  """walk_activity, optionally skipping entries deeper than max_depth (1 = direct children only) and stopping at a
+  time.monotonic() deadline - also returns whether the walk finished, as if it didn't the timestamp is a lower bound.
+  Top-level entries named in skip are left out entirely
+
+  Breadth first, so a walk cut short by the deadline has covered the shallowest (usually most telling) entries"""
+  patterns = ignore_patterns(path) if patterns is None else tuple(patterns)
+  latest: Optional[float] = None
+
+  queue = deque([("", os.fspath(path), 1)])  # Relative path, path, depth of the directory's entries
+  while queue:
+    if deadline is not None and time.monotonic() > deadline:
+      return latest, False
+
+    relative_dir, dir_path, depth = queue.popleft()
+    try:
+      it = os.scandir(dir_path)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+      continue  # Removed mid-walk, or unreadable
+
+    descend = max_depth is None or depth < max_depth
+    with it:
+      for entry in it:
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if is_dir:
+          relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+          if is_ignored(relative_path, patterns) or relative_path in skip:
+            continue
+
+        try:
+          activity = entry_activity(entry.stat(follow_symlinks=False))
+        except FileNotFoundError:
+          continue
+        if latest is None or activity > latest:
+          latest = activity
+
+        if is_dir and descend:
+          queue.append((relative_path, entry.path, depth + 1))
+
+  return latest, True
+
+
+def approximate_activity(path: Path, max_depth: Optional[int] = None, budget_ms: Optional[float] = None) -> tuple[float, bool]:
+  "Activity timestamp of a project from a depth / time limited walk, and whether the walk finished within its budget"
+  deadline = None if budget_ms is None else time.monotonic() + budget_ms / 1000
+  latest, complete = bounded_walk_activity(path, max_depth=max_depth, deadline=deadline)
+  if latest is None:  # Empty project, or out of time before finding anything - use the directory's own timestamps
+    latest = entry_activity(os.stat(path))
+  return latest, complete
+
+
+def approximate_activities(
+  paths: list[Path], max_depth: Optional[int] = None, budget_ms: Optional[float] = None, jobs: Optional[int] = None
+) -> list[tuple[float, bool]]:
+  "approximate_activity for many projects, walked concurrently per root - the budget applies to each project separately"
+  results = dict(map_per_root(lambda path: approximate_activity(path, max_depth, budget_ms), paths, jobs))
+  return [results[path] for path in paths]
+
+
+def max_activity(current: Optional[float], candidate: Optional[float]) -> Optional[float]:
+  "The later of two timestamps, either of which may be None"
+  if candidate is None:
+    return current
+  if current is None:
+    return candidate
+  return max(current, candidate)
@@ -0,0 +1,382 @@
+# Keeps the activity index live from filesystem events, so ls / status / active are index reads instead of walks
+#
+# On Linux, inotify (through ctypes - no extra dependencies) watches each project root, the symlink directory and every
+# directory a walk of each project would visit. Events are coalesced into batches: files written bump their project's
+# timestamp directly, and projects whose structure changed (or that hold git repositories) are re-indexed
+# incrementally. Projects are watched most recently active first, within a budget below the kernel's per-user watch
+# limit - ones that don't fit are left for the CLI to walk as usual. Without inotify, projects are re-indexed by polling.
+#
+#   molpro_dirman watch [--poll SECONDS] [--max-watches N]
+
+import os
+import time
+import errno
+import fcntl
+import select
+import struct
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Union
+
+from .config import Config
+from .errors import WatcherAlreadyRunning
+from .index import ActivityIndex
+from .local_read import Project
+from .walk import map_per_root, entry_activity, ignore_patterns, is_ignored
+from .git_activity import project_repositories
+
+# inotify(7) event flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+STRUCTURE_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+# Reads (IN_ACCESS) aren't watched - as with the index's incremental walks, and re-indexing would trigger them itself
+CONTENT_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+DIRECTORY_MASK = STRUCTURE_EVENTS | IN_ONLYDIR | IN_DONT_FOLLOW  # Roots and the symlink directory
+PROJECT_MASK = STRUCTURE_EVENTS | CONTENT_EVENTS | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+
+MAX_USER_WATCHES_PATH = "/proc/sys/fs/inotify/max_user_watches"
+WATCH_LIMIT_SHARE = 0.5  # Of the per-user watch limit - the rest is left for editors, IDEs and sync clients
+FALLBACK_MAX_WATCHES = 4096  # If the limit can't be read
+COALESCE_QUIET_S = 0.2  # A batch of events ends once none arrive for this long...
+COALESCE_MAX_S = 2  # ...or after this long, during a constant stream of them
+HEARTBEAT_INTERVAL_S = 5  # Well within index.WATCHER_TIMEOUT
+DEFAULT_POLL_INTERVAL_S = 30
+LOCK_FILENAME = "watch.lock"
+
+
+def default_max_watches() -> int:
+  "Watch budget - a share of the kernel's per-user limit on inotify watches"
+  try:
+    with open(MAX_USER_WATCHES_PATH) as fd:
+      return max(int(int(fd.read()) * WATCH_LIMIT_SHARE), 1)
+  except (OSError, ValueError):
+    return FALLBACK_MAX_WATCHES
+
+
+class Inotify:
+  "Minimal ctypes binding to Linux inotify(7) - raises OSError where it isn't available"
+
+  EVENT = struct.Struct("iIII")  # wd, mask, cookie, len - then len bytes of NUL padded name
+  READ_SIZE = 64 * 1024
+
+  def __init__(self):
+    import ctypes
+    import ctypes.util
+
+    try:
+      libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+      init, self._add_watch, self._rm_watch = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError) as e:
+      raise OSError(errno.ENOSYS, "inotify is not available") from e
+    self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    self._errno = ctypes.get_errno
+
+    self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(self._errno(), os.strerror(self._errno()))
+
+  def add_watch(self, path: str, mask: int) -> int:
+    wd = self._add_watch(self.fd, os.fsencode(path), mask)
+    if wd < 0:
+      raise OSError(self._errno(), os.strerror(self._errno()), path)
+    return wd
+
+  def rm_watch(self, wd: int) -> None:
+    self._rm_watch(self.fd, wd)  # Fails harmlessly if the directory has already gone
+
+  def read(self, timeout: float) -> list[tuple[int, int, str]]:
+    "(wd, mask, name) for each event queued, waiting up to timeout seconds for the first"
+    if not select.select([self.fd], [], [], timeout)[0]:
+      return []
+    events = []
+    while True:
+      try:
+        data = os.read(self.fd, self.READ_SIZE)
+      except BlockingIOError:
+        return events
+      pos = 0
+      while pos < len(data):
+        wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+        pos += self.EVENT.size
+        events.append((wd, mask, os.fsdecode(data[pos:pos + length].rstrip(b"\0"))))
+        pos += length
+
+  def close(self) -> None:
+    os.close(self.fd)
+
+
+def reindex(index: ActivityIndex, paths: list[Path]) -> None:
+  "Incrementally re-index projects, concurrently as the CLI would - closing the connections of the batch's workers"
+  for _ in map_per_root(index.project_timestamp, paths):
+    pass
+  index.close_finished_threads()
+
+
+class InotifyWatcher:
+  "Keeps the activity index live from inotify events, for as many projects as fit in the watch budget"
+
+  def __init__(self, index: ActivityIndex, max_watches: Optional[int] = None):
+    self.index = index
+    self.inotify = Inotify()
+    self.max_watches = max_watches or default_max_watches()
+    self.roots = {str(root) for root in Config.project_roots()}
+    self.symlink_dir = str(Config.base_symlink_directory())
+    self.watches: dict[int, tuple[Optional[Path], str]] = {}  # wd -> (project - None for roots / symlink dir, directory)
+    self.project_watches: dict[Path, set[int]] = {}
+    self.git_projects: set[Path] = set()  # Their activity is read from git metadata, so any change means a re-index
+    self.unwatched: set[Path] = set()  # Over the watch budget - walked by the CLI as usual
+
+  def start(self) -> None:
+    "Watch the roots and symlink directory, then as many projects as fit (most recently active first), and index them"
+    for directory in [*self.roots, self.symlink_dir]:
+      try:
+        self._add_watch(None, directory, DIRECTORY_MASK)
+      except OSError:
+        continue  # Unavailable root - its projects aren't listed either
+    paths = Project.list_paths()
+    self.watch_projects(sorted(paths, key=lambda path: self.index.cached_timestamp(path) or 0, reverse=True))
+
+  def watch_projects(self, paths: list[Path]) -> None:
+    watched = [path for path in paths if self.watch_project(path)]
+    reindex(self.index, watched)  # After the watches are added, so nothing is missed in between
+    self.index.set_watched(watched)
+
+  def watch_project(self, project: Path) -> bool:
+    "Watch every directory a walk of the project would visit - returns False, watching none of it, if they don't all fit"
+    self.project_watches[project] = set()
+    if self._watch_tree(project, str(project)):
+      self.unwatched.discard(project)
+      if project_repositories(project):
+        self.git_projects.add(project)
+      return True
+    self.unwatch_project(project)
+    self.unwatched.add(project)
+    return False
+
+  def unwatch_project(self, project: Path) -> None:
+    for wd in self.project_watches.pop(project, ()):
+      self.inotify.rm_watch(wd)
+      self.watches.pop(wd, None)
+    self.git_projects.discard(project)
+
+  def _watch_tree(self, project: Path, top: str) -> bool:
+    "Watch a directory within a project and everything below it that isn't ignored - False if the budget ran out"
+    root = str(project)
+    patterns = ignore_patterns(project)
+    stack = [top]
+    while stack:
+      directory = stack.pop()
+      if len(self.watches) >= self.max_watches:
+        return False
+      try:
+        self._add_watch(project, directory, PROJECT_MASK)
+        with os.scandir(directory) as it:
+          for entry in it:
+            if entry.is_dir(follow_symlinks=False) and not is_ignored(os.path.relpath(entry.path, root).replace(os.sep, "/"), patterns):
+              stack.append(entry.path)
+      except OSError as e:
+        if e.errno == errno.ENOSPC:  # The kernel's per-user limit, shared with every other watcher
+          return False
+        if directory == root:
+          return False
+        continue  # Removed since it was listed, or unreadable - walks skip these too
+    return True
+
+  def _unwatch_tree(self, project: Path, top: str) -> None:
+    "Stop watching a directory within a project and everything below it - eg: when it's moved away"
+    prefix = top + os.sep
+    for wd in [wd for wd in self.project_watches.get(project, ()) if self.watches[wd][1] == top or self.watches[wd][1].startswith(prefix)]:
+      self.inotify.rm_watch(wd)
+      self.watches.pop(wd)
+      self.project_watches[project].discard(wd)
+
+  def _add_watch(self, project: Optional[Path], directory: str, mask: int) -> None:
+    wd = self.inotify.add_watch(directory, mask)
+    self.watches[wd] = (project, directory)
+    if project is not None:
+      self.project_watches[project].add(wd)
+
+  def apply(self, events: list[tuple[int, int, str]]) -> None:
+    "Bring the index up to date with a batch of events"
+    touched: set[tuple[Path, str, str]] = set()  # (project, directory, file)
+    changed: set[Path] = set()  # Projects to re-index
+    new_dirs: list[tuple[Path, str]] = []
+    added: set[Path] = set()
+    removed: set[Path] = set()
+    symlinks_changed = False
+
+    for wd, mask, name in events:
+      if mask & IN_Q_OVERFLOW:  # Events were dropped - re-index everything
+        changed.update(self.project_watches)
+        symlinks_changed = True
+        continue
+      watch = self.watches.get(wd)
+      if watch is None:
+        continue
+      if mask & IN_IGNORED:  # Watched directory removed
+        project, _ = self.watches.pop(wd)
+        self.project_watches.get(project, set()).discard(wd)
+        continue
+
+      project, directory = watch
+      path = os.path.join(directory, name) if name else directory
+      if project is None:  # A root or the symlink directory
+        if directory == self.symlink_dir and Config.matches_symlink_regex(name):
+          symlinks_changed = True
+        if directory in self.roots and mask & IN_ISDIR and name:
+          (added if mask & (IN_CREATE | IN_MOVED_TO) else removed).add(Path(path))
+        continue
+
+      if mask & IN_ISDIR:
+        if name and mask & (IN_CREATE | IN_MOVED_TO):
+          new_dirs.append((project, path))
+        elif name and mask & IN_MOVED_FROM:
+          self._unwatch_tree(project, path)
+        changed.add(project)
+        continue
+      if not mask & IN_DELETE:
+        touched.add((project, directory, path))
+      if mask & STRUCTURE_EVENTS or project in self.git_projects:
+        changed.add(project)
+
+    for project, path in new_dirs:
+      if project in self.project_watches and not self._watch_tree(project, path):
+        self.unwatch_project(project)
+        self.unwatched.add(project)
+        self.index.set_watched([project], watched=False)
+    for project in removed:
+      self.unwatch_project(project)
+      self.unwatched.discard(project)
+      self.index.forget_project(project)
+
+    activity = []
+    for project, directory, path in touched:
+      try:
+        activity.append((project, directory, entry_activity(os.stat(path, follow_symlinks=False))))
+      except OSError:
+        continue  # Gone again already
+    self.index.record_activity(activity)
+    reindex(self.index, [project for project in changed if project in self.project_watches])
+    self.watch_projects([path for path in added - removed if path.is_dir()])
+    if symlinks_changed:
+      Project.reconcile_symlinks()
+
+  def run(self, stop: threading.Event, on_change: Optional[Callable[[], None]] = None) -> None:
+    "Apply batches of events until stop is set, calling on_change after each"
+    next_heartbeat = 0.0
+    while not stop.is_set():
+      if time.monotonic() >= next_heartbeat:
+        self.index.heartbeat()
+        next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL_S
+      events = self.inotify.read(timeout=1)
+      if not events:
+        continue
+      deadline = time.monotonic() + COALESCE_MAX_S
+      while time.monotonic() < deadline:
+        more = self.inotify.read(timeout=COALESCE_QUIET_S)
+        if not more:
+          break
+        events += more
+      self.apply(events)
+      if on_change:
+        on_change()
+
+  def describe(self) -> str:
+    summary = f"Watching {len(self.project_watches)} project(s) with {len(self.watches)} inotify watches"
+    if self.unwatched:
+      summary += f" - {len(self.unwatched)} more didn't fit within {self.max_watches} watches, and are walked as usual"
+    return summary
+
+  def close(self) -> None:
+    self.inotify.close()
+
+
+class PollingWatcher:
+  "Fallback without inotify - re-indexes every project each interval, so the index is at most that stale"
+
+  def __init__(self, index: ActivityIndex, interval: float = DEFAULT_POLL_INTERVAL_S):
+    self.index = index
+    self.interval = interval
+    self.paths: list[Path] = []
+    self.symlink_mtime_ns: Optional[int] = None
+
+  def start(self) -> None:
+    self.poll()
+
+  def poll(self) -> None:
+    paths = Project.list_paths()
+    for path in set(self.paths) - set(paths):
+      self.index.forget_project(path)
+    reindex(self.index, paths)
+    self.index.set_watched(paths)
+    self.paths = paths
+
+    mtime_ns = os.stat(Config.base_symlink_directory()).st_mtime_ns
+    if mtime_ns != self.symlink_mtime_ns:
+      Project.reconcile_symlinks()
+      self.symlink_mtime_ns = mtime_ns
+
+  def run(self, stop: threading.Event, on_change: Optional[Callable[[], None]] = None) -> None:
+    "Poll every interval until stop is set, calling on_change after each poll"
+    next_poll = time.monotonic() + self.interval
+    while not stop.is_set():
+      self.index.heartbeat()
+      stop.wait(min(HEARTBEAT_INTERVAL_S, max(next_poll - time.monotonic(), 0)))
+      if time.monotonic() >= next_poll and not stop.is_set():
+        self.poll()
+        next_poll = time.monotonic() + self.interval
+        if on_change:
+          on_change()
+
+  def describe(self) -> str:
+    return f"Polling {len(self.paths)} project(s) every {self.interval:g}s"
+
+  def close(self) -> None:
+    pass
+
+
+@contextmanager
+def start_watcher(
+  max_watches: Optional[int] = None, poll_interval: Optional[float] = None
+) -> Iterator[Union[InotifyWatcher, PollingWatcher]]:
+  "Start the (only) watcher - with inotify, unless a poll interval is given or it's unavailable. Stopped on exit"
+  path = Config.cache_directory() / LOCK_FILENAME
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+  try:
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      raise WatcherAlreadyRunning("Another watcher is already keeping the activity index up to date") from None
+
+    with ActivityIndex() as index:
+      index.stop_watching()  # Left behind by a watcher that didn't exit cleanly
+      watcher = None
+      if poll_interval is None:
+        try:
+          watcher = InotifyWatcher(index, max_watches)
+        except OSError:
+          pass  # Not Linux, or out of inotify instances
+      watcher = watcher or PollingWatcher(index, poll_interval or DEFAULT_POLL_INTERVAL_S)
+      try:
+        watcher.start()
+        yield watcher
+      finally:
+        watcher.close()
+        index.stop_watching()
+  finally:
+    os.close(fd)  # Releases the lock
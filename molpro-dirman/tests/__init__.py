@@ -1,6 +1,24 @@
 import importlib
 
-main = importlib.import_module("molpro_dirman.__main__")
+cli = importlib.import_module("molpro_dirman.cli")
 config = importlib.import_module("molpro_dirman.config")
 local_read = importlib.import_module("molpro_dirman.local_read")
-local_write = importlib.import_module("molpro_dirman.local_write")
\ No newline at end of file
+local_write = importlib.import_module("molpro_dirman.local_write")
+walk = importlib.import_module("molpro_dirman.walk")
+index = importlib.import_module("molpro_dirman.index")
+fastpath = importlib.import_module("molpro_dirman.fastpath")
+prompt = importlib.import_module("molpro_dirman.prompt")
+manifest = importlib.import_module("molpro_dirman.manifest")
+sync = importlib.import_module("molpro_dirman.sync")
+sync_server = importlib.import_module("molpro_dirman.sync_server")
+journal = importlib.import_module("molpro_dirman.journal")
+profiling = importlib.import_module("molpro_dirman.profiling")
+git_activity = importlib.import_module("molpro_dirman.git_activity")
+search = importlib.import_module("molpro_dirman.search")
+completion = importlib.import_module("molpro_dirman.completion")
+watch = importlib.import_module("molpro_dirman.watch")
+rpc = importlib.import_module("molpro_dirman.rpc")
+serve = importlib.import_module("molpro_dirman.serve")
+output = importlib.import_module("molpro_dirman.output")
+catalog = importlib.import_module("molpro_dirman.catalog")
+catalog_file = importlib.import_module("molpro_dirman.catalog_file")
\ No newline at end of file
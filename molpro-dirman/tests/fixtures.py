@@ -23,6 +23,23 @@ def generate_data() -> Callable[[int, int], bytes]:
   return lambda min_size, max_size: random.randbytes(random.randint(min_size, max_size))
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_directory(tmp_path_factory) -> Path:
+  cache_dir = tmp_path_factory.mktemp("cache")
+  config.Config.cache_directory = MagicMock(return_value=cache_dir)
+  yield cache_dir
+
+
+@pytest.fixture(autouse=True)
+def isolated_config_file(tmp_path_factory, monkeypatch) -> Path:
+  "Keep tests from reading the config file of whoever runs them - they get the default settings unless they write one"
+  config_file = tmp_path_factory.mktemp("config") / "config.toml"
+  monkeypatch.setenv(config.CONFIG_PATH_ENV, str(config_file))
+  for name in (config.PROJECT_ROOTS_ENV, config.SYMLINK_DIRECTORY_ENV):
+    monkeypatch.delenv(name, raising=False)
+  yield config_file
+
+
 @pytest.fixture
 def mock_base_directories() -> Callable[[Path], None]:
   def _mock_base_directories(base_path: Path) -> None:
@@ -138,4 +155,18 @@ def datetimed_dir(structured_dir, generate_data) -> Path:
     (datetime.now() - timedelta(days=5)).timestamp()   # mtime
   ))
 
-  yield structured_dir
\ No newline at end of file
+  yield structured_dir
+
+@pytest.fixture
+def archive_root(structured_dir, mock_base_directories, monkeypatch) -> Path:
+  "A second project root (eg: an archive disk) alongside structured_dir's, set up as the second of two project roots"
+  mock_base_directories(structured_dir)
+  archive = structured_dir / "archive"
+  os.mkdir(archive)
+  os.mkdir(archive / "HO-7654321")
+  os.mkdir(archive / "T-7777777")
+  monkeypatch.setenv(
+    config.PROJECT_ROOTS_ENV,
+    os.pathsep.join([str(structured_dir / "home" / "Projects"), str(archive)])
+  )
+  yield archive
@@ -0,0 +1,50 @@
+# Test the compact project catalog
+
+from pathlib import Path
+
+from . import catalog, local_read
+from tests.fixtures import *
+
+
+def test_project_record_parsing():
+  record = catalog.ProjectRecord("DO-4256663", 0)
+  assert catalog.mask_prefixes(record.prefixes) == "DO"
+  assert record.prefixes == catalog.prefix_mask("OD")
+  assert record.serial == 4256663
+
+  for name in ("Documents", "DO-12a4567", "DO-"):
+    assert catalog.ProjectRecord(name, 0).serial == catalog.NO_SERIAL
+  assert catalog.ProjectRecord("do-1234567", 0).prefixes == 0
+  assert not hasattr(record, "__dict__")
+
+
+def test_catalog_roots_interned():
+  roots = [Path("/projects"), Path("/archive")]
+  paths = [roots[0] / "DO-4256663", roots[1] / "T-1234567", roots[0] / "T-7654321"]
+  projects = catalog.Catalog.from_paths(paths)
+  assert projects.roots == roots
+  assert [record.root for record in projects] == [0, 1, 0]
+  assert projects.paths() == paths
+  assert projects.names() == ["DO-4256663", "T-1234567", "T-7654321"]
+
+
+def test_catalog_serials():
+  projects = catalog.Catalog.from_listings([(Path("/p"), ["DO-0000001", "OD-0000002", "D-0000003", "DO-0000004", "DO-x"])])
+  assert projects.serials("DO") == {1, 4}
+  assert projects.serials("D") == {3}
+  assert projects.serials("T") == set()
+
+
+def test_catalog_by_activity():
+  projects = catalog.Catalog.from_listings([(Path("/p"), ["A-0000001", "B-0000002", "C-0000003", "D-0000004"])])
+  projects.set_activities([(10.0, True), (30.5, True), (30.0, False), (30.5, True)])
+  assert [r.name for r in projects.by_activity()] == ["D-0000004", "B-0000002", "C-0000003", "A-0000001"]
+  assert [r.name for r in projects.by_activity(top=2)] == ["D-0000004", "B-0000002"]
+  assert not projects.by_activity()[2].complete
+
+
+def test_project_catalog(archive_root, structured_dir):
+  projects = local_read.Project.catalog()
+  assert projects.roots == [structured_dir / "home" / "Projects", archive_root]
+  assert sorted(projects.names()) == sorted(local_read.Project.list_names())
+  assert local_read.Project.taken_serials("T") == {1234567, 7777777}
@@ -0,0 +1,106 @@
+# Test the memory-mapped binary catalog file
+
+import os
+from pathlib import Path
+
+from . import catalog_file, local_read, config
+from tests.fixtures import *
+
+
+def test_catalog_file_lookups(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  projects = populated_dir / "home" / "Projects"
+  with catalog_file.CatalogFile.load() as index:
+    assert index.names() == sorted(path.parts[-1] for path in projects.iterdir())
+    assert index.contains("DO-4256663") and index.contains("DO-4256663", projects)
+    assert not index.contains("DO-4256663", populated_dir) and not index.contains("DO-425666")
+    assert index.serials("DT") == {1234567}
+    assert index.serials("D") == set()
+
+
+def test_catalog_file_multiple_roots(archive_root, structured_dir):
+  with catalog_file.CatalogFile.load() as index:
+    assert index.contains("HO-7654321", archive_root)
+    assert index.serials("T") == {1234567, 7777777}
+  assert local_read.Project.taken_serials("T") == {1234567, 7777777}
+
+
+def test_catalog_file_rebuilt_when_stale(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  catalog_file.CatalogFile.load().close()
+  catalog_file.CatalogFile.open().close()  # Current
+
+  os.mkdir(structured_dir / "home" / "Projects" / "S-7654321")
+  assert catalog_file.CatalogFile.open() is None
+  assert "S-7654321" in local_read.Project.list_names()
+
+  catalog_file.CatalogFile.load().close()
+  os.symlink(structured_dir / "home" / "Projects" / "S-7654321", structured_dir / "home" / "current_project")
+  (structured_dir / "home" / ".bash_history").write_text("")
+  catalog_file.CatalogFile.open().close()  # Still current - only the roots' mtimes count
+  assert [p.name for p in config.Config.cache_directory().iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_catalog_file_first_build_makes_cache_directory(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  path = structured_dir / "home" / ".cache" / "molpro_dirman" / "catalog.bin"
+  with catalog_file.CatalogFile.build(path) as index:
+    assert "DO-4256663" in index.names()
+
+
+def test_catalog_file_concurrent_builds(structured_dir, mock_base_directories):
+  from concurrent.futures import ThreadPoolExecutor
+
+  mock_base_directories(structured_dir)
+  with ThreadPoolExecutor(max_workers=8) as pool:
+    built = list(pool.map(lambda _: catalog_file.CatalogFile.build(), range(32)))
+  assert all(index is not None for index in built)
+  for index in built:
+    index.close()
+  assert [p.name for p in config.Config.cache_directory().iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_catalog_file_corrupt(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  catalog_file.CatalogFile.load().close()
+  path = config.Config.catalog_file_path()
+  data = path.read_bytes()
+
+  for corrupt in (b"", b"garbage", data[:-1], data.replace(catalog_file.MAGIC, b"NOTMAGIC")):
+    path.write_bytes(corrupt)
+    assert catalog_file.CatalogFile.open() is None
+  with catalog_file.CatalogFile.load() as index:
+    assert "DO-4256663" in index.names()
+
+
+def test_catalog_file_rebuilds_changed_roots_only(archive_root, structured_dir, monkeypatch):
+  primary = structured_dir / "home" / "Projects"
+  catalog_file.CatalogFile.load().close()
+  os.mkdir(archive_root / "S-7654321")
+
+  scanned = []
+  scandir = os.scandir
+  monkeypatch.setattr(catalog_file.os, "scandir", lambda path: scanned.append(path) or scandir(path))
+  with catalog_file.CatalogFile.load() as index:
+    assert index.contains("S-7654321", archive_root)
+    assert index.contains("DO-4256663", primary) and index.contains("HO-7654321", archive_root)
+    assert index.serials("T") == {1234567, 7777777}
+  assert scanned == [archive_root]  # The unchanged primary root's records were copied
+
+
+def test_catalog_file_long_names(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  os.mkdir(structured_dir / "home" / "Projects" / ("X" * (catalog_file.NAME_WIDTH + 1)))
+  assert catalog_file.CatalogFile.load() is None
+  assert "X" * (catalog_file.NAME_WIDTH + 1) in local_read.Project.list_names()  # Listed without it
+  assert local_read.Project.is_valid_path(structured_dir / "home" / "Projects" / "DO-4256663")
+
+
+def test_is_valid_path_from_catalog_file(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  projects = structured_dir / "home" / "Projects"
+  catalog_file.CatalogFile.load().close()
+  monkeypatch.setattr(Path, "exists", MagicMock(side_effect=AssertionError("Stat'd a project directory")))
+  assert local_read.Project.is_valid_path(projects / "DO-4256663")
+  assert not local_read.Project.is_valid_path(projects / "DO-0000000")
+  assert not local_read.Project.is_valid_path(structured_dir / "home" / "Documents")
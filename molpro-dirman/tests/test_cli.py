@@ -0,0 +1,127 @@
+# Test CLI commands end to end, through typer's test runner
+
+import sys
+import json
+import subprocess
+from typer.testing import CliRunner
+
+from . import cli
+from tests.fixtures import *
+
+runner = CliRunner()
+
+
+def invoke(*args: str):
+  result = runner.invoke(cli.app, list(args), env={"COLUMNS": "200"})
+  assert result.exit_code == 0, result.output
+  return result.output
+
+
+def test_status_lists_projects(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  output = invoke("status")
+  assert "Mounted projects" in output
+  assert "Available Projects" in output
+  assert "DO-4256663" in output
+
+
+def test_ls_top(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  def rows(output: str) -> list[list[str]]:
+    return [[cell.strip() for cell in line.split("│")[1:-1]] for line in output.splitlines() if line.startswith("│")]
+
+  full = rows(invoke("ls"))
+  top = rows(invoke("ls", "--top", "2"))
+  assert [timestamp for _, timestamp in top] == [timestamp for _, timestamp in full[:2]]  # Ties may pick either project
+
+
+def test_ls_top_and_stream_exclusive(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  assert "can't be combined" in invoke("ls", "--top", "2", "--stream")
+  assert "can't be combined" in invoke("ls", "--top", "2", "--depth", "1")
+
+
+def test_ls_stream_lines(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  names = sorted(line.split("\t")[0] for line in invoke("ls", "--stream").splitlines())
+  assert names == sorted(path.parts[-1] for path in (datetimed_dir / "home" / "Projects").iterdir())
+
+
+def test_bare_invocation_shows_status(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  output = invoke()
+  assert "Mounted projects" in output
+  assert "DO-4256663" in output
+
+
+def test_status_approximate(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  assert "DO-4256663" in invoke("status", "--depth", "1")
+  assert "ran out of time" not in invoke("ls", "--budget-ms", "60000")
+
+
+def test_ls_multiple_roots(datetimed_dir, archive_root):
+  output = invoke("ls")
+  assert "root" in output and "HO-7654321" in output
+  streamed = dict(line.split("\t")[0::2] for line in invoke("ls", "--stream").splitlines())
+  assert streamed["HO-7654321"] == str(archive_root)
+
+
+def test_invalid_config_reported(isolated_config_file):
+  isolated_config_file.write_text("[naming]\nmain_symlnk = 'typo'")
+  result = runner.invoke(cli.app, ["prefixes"], env={"COLUMNS": "200"})
+  assert result.exit_code == 1
+  assert "main_symlnk" in result.output
+
+
+def test_ls_formats(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  records = json.loads(invoke("ls", "--format", "json"))
+  assert sorted(r["name"] for r in records) == ["ABCDEF-4567890", "APJ-1234567", "DO-4256663", "DT-1234567", "T-1234567"]
+  by_name = lambda records: sorted(records, key=lambda r: r["name"])  # Streamed in the order scans finish
+  assert by_name(json.loads(line) for line in invoke("ls", "--format", "ndjson").splitlines()) == by_name(records)
+
+  header, *rows = invoke("ls", "--format", "tsv").splitlines()
+  assert header.split("\t")[:2] == ["name", "prefixes"]
+  assert sorted(row.split("\t")[0] for row in rows) == [r["name"] for r in by_name(records)]
+
+  top = json.loads(invoke("ls", "--top", "1", "--format", "json"))
+  assert [r["name"] for r in top] == ["DO-4256663"]
+  approximate = json.loads(invoke("ls", "--depth", "1", "--format", "json"))
+  assert len(approximate) == 5 and all(r["complete"] for r in approximate)
+  assert [r["last_activity"] for r in approximate] == sorted((r["last_activity"] for r in approximate), reverse=True)
+
+
+def test_active_and_status_formats(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  active = json.loads(invoke("active", "--format", "json"))
+  assert {r["name"]: r["symlinks"] for r in active} == {
+    "DO-4256663": ["current_project"], "DT-1234567": ["project_DT-1234567"], "T-1234567": ["project_T-1234567"],
+  }
+
+  status = json.loads(invoke("status", "--format", "json"))
+  assert {r["name"]: r["symlinks"] for r in status["active"]} == {r["name"]: r["symlinks"] for r in active}
+  assert len(status["projects"]) == 5
+  sections = [json.loads(line)["section"] for line in invoke("status", "--format", "ndjson").splitlines()]
+  assert sections == ["active"] * 3 + ["projects"] * 5
+
+
+def test_unknown_format(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  result = runner.invoke(cli.app, ["ls", "--format", "xml"])
+  assert result.exit_code != 0
+  assert "expected one of" in result.output
+
+
+def test_record_formats_skip_rich(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  code = "import sys; from molpro_dirman.cli import app; app(['ls', '--format', 'ndjson'], standalone_mode=False); print(sorted(sys.modules), file=sys.stderr)"
+  result = subprocess.run(
+    [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+    env={
+      **os.environ, "PYTHONPATH": os.pathsep.join(sys.path), "XDG_CACHE_HOME": str(structured_dir / "cache"),
+      "MPDMAN_PROJECT_ROOTS": str(structured_dir / "home" / "Projects"), "MPDMAN_SYMLINK_DIRECTORY": str(structured_dir / "home"),
+    },
+  )
+  assert len(result.stdout.splitlines()) == 5
+  assert "'rich.console'" not in result.stderr and "'rich.table'" not in result.stderr
@@ -0,0 +1,94 @@
+# Test shell completion of project names and prefixes
+
+from typing import Optional
+
+from . import completion
+from tests.fixtures import *
+
+
+@pytest.fixture
+def completion_home(structured_dir, mock_base_directories, monkeypatch) -> Path:
+  mock_base_directories(structured_dir)
+  monkeypatch.setenv("XDG_CACHE_HOME", str(structured_dir / "cache"))
+  projects = structured_dir / "home" / "Projects"
+  (projects / "DO-4256663" / "README.md").write_text("# Motor controller\n## DO-4256663\n")
+  (projects / "T-1234567" / "README.md").write_text("# Fursuit head\n## T-1234567\n")
+  yield projects
+
+
+def names(items: list[tuple[str, str]]) -> list[str]:
+  return [name for name, _ in items]
+
+
+def test_complete_name_prefix(completion_home):
+  assert names(completion.complete_projects("")) == ["ABCDEF-4567890", "APJ-1234567", "DO-4256663", "DT-1234567", "T-1234567"]
+  assert names(completion.complete_projects("d")) == ["DO-4256663", "DT-1234567"]
+  assert names(completion.complete_projects("do42")) == ["DO-4256663"]  # Dash optional
+  assert completion.complete_projects("DO-") == [("DO-4256663", "Motor controller")]
+
+
+def test_complete_fuzzy_serial_and_title(completion_home):
+  assert names(completion.complete_projects("4256")) == ["DO-4256663"]
+  assert names(completion.complete_projects("1234")) == ["APJ-1234567", "DT-1234567", "T-1234567"]
+  assert names(completion.complete_projects("mot")) == ["DO-4256663"]
+  assert names(completion.complete_projects("HEAD")) == ["T-1234567"]
+  assert completion.complete_projects("zzz") == []
+
+
+def test_name_matches_rank_first(completion_home):
+  (completion_home / "DT-1234567" / "README.md").write_text("# Tiny tool\n")
+  os.mkdir(completion_home / "D-0000001")  # New project, invalidating the cache
+  assert names(completion.complete_projects("t")) == ["T-1234567", "DT-1234567"]
+
+
+def test_cache_invalidated_by_project_directory_mtime(completion_home):
+  cache_file = completion.default_cache_file()
+  completion.complete_projects("")
+  assert os.path.exists(cache_file)
+
+  os.mkdir(completion_home / "H-7654321")
+  assert "H-7654321" in names(completion.complete_projects(""))
+
+  # Unchanged directory - served from the cache, even if it's been tampered with
+  with open(cache_file) as fd:
+    content = fd.read()
+  with open(cache_file, "w") as fd:
+    fd.write(content.replace("Motor controller", "Cached title"))
+  assert completion.complete_projects("DO") == [("DO-4256663", "Cached title")]
+
+
+def test_corrupt_cache_rebuilt(completion_home):
+  cache_file = completion.default_cache_file()
+  os.makedirs(os.path.dirname(cache_file))
+  with open(cache_file, "w") as fd:
+    fd.write("garbage")
+  assert names(completion.complete_projects("mot")) == ["DO-4256663"]
+
+
+def test_complete_deactivate_and_prefixes(completion_home):
+  assert names(completion.complete_deactivate(""))[:2] == ["main", "all"]
+  assert names(completion.complete_deactivate("a")) == ["all", "ABCDEF-4567890", "APJ-1234567"]
+  assert completion.complete_prefixes("d") == [("D", "Digital / Software")]
+  assert len(completion.complete_prefixes("")) == len(config.Prefixes.definitions())
+
+
+def run_request(capsys, **environ: str) -> Optional[str]:
+  answered = completion.answer_completion({completion.COMPLETE_VAR: "complete_bash", **environ})
+  return capsys.readouterr().out if answered else None
+
+
+def test_answer_completion_shells(completion_home, capsys):
+  assert run_request(capsys, COMP_WORDS="molpro_dirman activate 4256", COMP_CWORD="2") == "DO-4256663"
+  assert run_request(capsys, COMP_WORDS="molpro_dirman ac", COMP_CWORD="1") is None  # Left to typer
+  assert run_request(capsys, COMP_WORDS="molpro_dirman activate 'DO", COMP_CWORD="2") is None
+
+  zsh = run_request(capsys, _MOLPRO_DIRMAN_COMPLETE="complete_zsh", _TYPER_COMPLETE_ARGS="molpro_dirman activate mot")
+  assert zsh == """_arguments '*: :(("DO-4256663":"Motor controller"))'"""
+  zsh = run_request(capsys, _MOLPRO_DIRMAN_COMPLETE="complete_zsh", _TYPER_COMPLETE_ARGS="molpro_dirman activate zzz")
+  assert zsh == "_files"
+
+  fish = run_request(
+    capsys, _MOLPRO_DIRMAN_COMPLETE="complete_fish", _TYPER_COMPLETE_FISH_ACTION="get-args",
+    _TYPER_COMPLETE_ARGS="molpro_dirman create --prefixes h",
+  )
+  assert fish == "H\tHardware"
@@ -5,6 +5,7 @@ import json
 
 from pathlib import Path
 from . import config
+from tests.fixtures import *
 
 
 def test_config_version():
@@ -102,3 +103,59 @@ def test_prefixes_rules():
 
   assert len(defs) == len(config.Prefixes.as_dict())
   json.dumps(config.Prefixes.as_dict())
+
+
+def test_settings_loaded_once():
+  assert config.settings() is config.settings()
+  assert config.settings().config_file is None  # No config file written
+  assert config.settings().prefixes == config.DEFAULT_PREFIXES
+
+
+def test_settings_from_config_file(isolated_config_file, tmp_path):
+  isolated_config_file.write_text(f"""
+project_roots = ["{tmp_path / 'Projects'}", "{tmp_path / 'Archive'}"]
+symlink_directory = "{tmp_path}"
+
+[naming]
+main_symlink = "active"
+aux_symlink_prefix = "aux_"
+
+[prefixes.X]
+short = "Experimental"
+
+[walk]
+ignore = ["build/", "*.stl"]
+""")
+  settings = config.reload_settings()
+  assert settings.config_file == isolated_config_file
+  assert settings.project_roots == (tmp_path / "Projects", tmp_path / "Archive")
+  assert settings.symlink_directory == tmp_path
+  assert settings.ignore_patterns == ("build", "*.stl")
+  assert settings.prefixes["X"] == config.PrefixDescription(short="Experimental", long="Experimental")
+  assert settings.prefixes["D"] == config.DEFAULT_PREFIXES["D"]
+
+  assert config.symlink_name("T-1234567", is_main=False) == "aux_T-1234567"
+  assert config.Config.matches_symlink_regex("active")
+  assert config.Config.matches_symlink_regex("aux_T-1234567")
+  assert not config.Config.matches_symlink_regex("current_project")
+
+
+def test_settings_env_overrides(isolated_config_file, tmp_path, monkeypatch):
+  isolated_config_file.write_text('project_roots = ["/nowhere"]')
+  monkeypatch.setenv(config.PROJECT_ROOTS_ENV, f"{tmp_path / 'a'}{os.pathsep}{tmp_path / 'b'}")
+  monkeypatch.setenv(config.SYMLINK_DIRECTORY_ENV, str(tmp_path))
+  assert config.settings().project_roots == (tmp_path / "a", tmp_path / "b")
+  assert config.settings().symlink_directory == tmp_path
+
+
+def test_settings_invalid(isolated_config_file):
+  for text in (
+    "project_roots = 'not a list'",
+    "[naming]\nmain_symlnk = 'typo'",
+    "[prefixes.XY]\nshort = 'Too long'",
+    "[prefixes.X]\nlong = 'No short description'",
+    "not toml",
+  ):
+    isolated_config_file.write_text(text)
+    with pytest.raises(config.InvalidConfig):
+      config.reload_settings()
@@ -0,0 +1,36 @@
+# Test dependency-free CLI fast paths
+
+import sys
+import subprocess
+
+from . import fastpath
+from tests.fixtures import *
+
+
+def test_run_fast_path_no_match(capsys):
+  assert fastpath.run_fast_path([]) is False
+  assert fastpath.run_fast_path(["active"]) is False
+  assert fastpath.run_fast_path(["active", "--plain", "--rescan"]) is False
+  assert capsys.readouterr().out == ""
+
+
+def test_active_plain(populated_dir, mock_base_directories, capsys):
+  mock_base_directories(populated_dir)
+
+  assert fastpath.run_fast_path(["active", "--plain"]) is True
+  assert capsys.readouterr().out.splitlines() == [
+    "current_project\tDO-4256663",
+    "project_DT-1234567\tDT-1234567",
+    "project_T-1234567\tT-1234567",
+  ]
+
+
+def test_fast_path_imports_stay_light():
+  result = subprocess.run(
+    [sys.executable, "-c", "import sys, molpro_dirman.fastpath; print(sorted(sys.modules))"],
+    capture_output=True, text=True, check=True,
+    env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+  )
+  loaded = result.stdout
+  for heavy in ("'typer'", "'rich'", "'InquirerPy'", "'sqlite3'"):
+    assert heavy not in loaded
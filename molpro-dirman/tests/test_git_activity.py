@@ -0,0 +1,223 @@
+# Test git-aware activity timestamps, against repositories made with the git CLI
+
+import shutil
+import subprocess
+
+from . import git_activity, walk, index
+from tests.fixtures import *
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs the git CLI to build test repositories")
+
+OLD = 1_600_000_000
+
+
+def git(repo: Path, *args: str) -> str:
+  return subprocess.run(
+    ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+    cwd=repo, check=True, capture_output=True, text=True,
+  ).stdout
+
+
+def make_repo(repo: Path) -> Path:
+  os.makedirs(repo / "src" / "deep")
+  (repo / "README.md").write_text("# Repo\n")
+  (repo / "src" / "main.c").write_text("int main() {}\n")
+  (repo / "src" / "deep" / "util.c").write_text("\n")
+  git(repo, "init", "-q")
+  git(repo, "add", ".")
+  git(repo, "commit", "-q", "-m", "Initial")
+  return repo
+
+
+def age_everything(path: Path) -> None:
+  "Make every file, directory and git metadata file look untouched for years"
+  for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+    for name in filenames + dirnames:
+      os.utime(os.path.join(dirpath, name), (OLD, OLD), follow_symlinks=False)
+  os.utime(path, (OLD, OLD))
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_read_index_matches_ls_files(tmp_path, version):
+  repo = make_repo(tmp_path / "repo")
+  (repo / "new.txt").write_text("")
+  git(repo, "add", "--intent-to-add", "new.txt")  # Sets the extended flags bit, in index v3+
+  git(repo, "update-index", "--index-version", str(version))
+
+  entries = git_activity.read_index(repo / ".git")
+  assert [name.decode() for name, *_ in entries] == git(repo, "ls-files").split()
+
+
+def test_read_index_rejects_corrupt(tmp_path):
+  repo = make_repo(tmp_path / "repo")
+  data = (repo / ".git" / "index").read_bytes()
+  (repo / ".git" / "index").write_bytes(data[:40])
+  assert git_activity.read_index(repo / ".git") is None
+  assert git_activity.repository_activity(repo) is None
+
+  (repo / ".git" / "index").write_bytes(b"nope" + data[4:])
+  assert git_activity.read_index(repo / ".git") is None
+
+
+def test_repository_activity_modified_file(tmp_path):
+  repo = make_repo(tmp_path / "repo")
+  age_everything(repo)
+  assert git_activity.repository_activity(repo) == OLD
+
+  (repo / "src" / "deep" / "util.c").write_text("changed\n")
+  os.utime(repo / "src" / "deep" / "util.c", (OLD, OLD + 500))
+  assert git_activity.repository_activity(repo) == OLD + 500
+
+  # Reads don't count, only modifications
+  os.utime(repo / "README.md", (OLD + 9000, OLD))
+  assert git_activity.repository_activity(repo) == OLD + 500
+
+
+def test_repository_activity_ignores_untracked_outputs(tmp_path):
+  repo = make_repo(tmp_path / "repo")
+  os.makedirs(repo / "build" / "objs")
+  (repo / "build" / "objs" / "main.o").write_text("")
+  age_everything(repo)
+  os.utime(repo / "build" / "objs" / "main.o", (OLD + 100, OLD + 100))
+  assert git_activity.repository_activity(repo) == OLD
+
+
+def test_repository_activity_added_and_committed(tmp_path):
+  repo = make_repo(tmp_path / "repo")
+  age_everything(repo)
+
+  (repo / "src" / "deep" / "new.c").write_text("")  # Untracked, but its directory's mtime changes
+  os.utime(repo / "src" / "deep", (OLD, OLD + 200))
+  assert git_activity.repository_activity(repo) == OLD + 200
+
+  age_everything(repo)
+  os.utime(repo / ".git" / "logs" / "HEAD", (OLD, OLD + 300))  # eg: a commit or checkout
+  assert git_activity.repository_activity(repo) == OLD + 300
+
+
+def test_repository_activity_worktree_gitfile(tmp_path):
+  repo = make_repo(tmp_path / "repo")
+  git(repo, "worktree", "add", "-q", str(tmp_path / "worktree"))
+  assert (tmp_path / "worktree" / ".git").is_file()
+  assert git_activity.repository_activity(tmp_path / "worktree") is not None
+
+
+def test_project_with_subrepository(tmp_path):
+  project = tmp_path / "D-0000001"
+  make_repo(project / "firmware")
+  (project / "notes").mkdir()
+  (project / "notes" / "todo.txt").write_text("")
+  age_everything(project)
+
+  assert git_activity.project_repositories(project) == ["firmware"]
+  assert walk.project_activity(project) == OLD
+
+  age_everything(project)  # Walking notes/ can bump its atime
+  os.utime(project / "notes" / "todo.txt", (OLD + 50, OLD + 50))
+  assert walk.project_activity(project) == OLD + 50
+
+  (project / "firmware" / "README.md").write_text("edited\n")
+  age_everything(project)
+  os.utime(project / "firmware" / "README.md", (OLD, OLD + 70))
+  assert walk.project_activity(project) == OLD + 70
+
+
+def test_index_uses_git_activity(tmp_path):
+  project = make_repo(tmp_path / "D-0000002")
+  os.makedirs(project / "build")
+  (project / "build" / "out.bin").write_text("")
+  age_everything(project)
+  os.utime(project / "build" / "out.bin", (OLD + 999, OLD + 999))
+
+  with index.ActivityIndex() as idx:
+    assert idx.project_timestamp(project) == OLD
+    assert idx.project_timestamp(project) == walk.project_activity(project)
+
+
+def test_unreadable_index_falls_back_to_walk(tmp_path):
+  project = make_repo(tmp_path / "D-0000003")
+  (project / ".git" / "index").write_bytes(b"garbage")
+  (project / "untracked.txt").write_text("")
+  age_everything(project)
+  os.utime(project / "untracked.txt", (OLD + 10, OLD + 10))
+  assert git_activity.project_repositories(project) == [""]
+  assert walk.project_activity(project) >= OLD + 10  # Only a walk sees untracked files
+
+
+def test_index_top_projects_skips_unchanged_repository(tmp_path):
+  repo_project = make_repo(tmp_path / "D-0000004")
+  recent_project = tmp_path / "D-0000005"
+  recent_project.mkdir()
+  (recent_project / "notes.txt").write_text("")
+  age_everything(repo_project)
+  paths = [repo_project, recent_project]
+
+  with index.ActivityIndex() as idx:
+    idx.project_timestamps(paths)
+
+    walked = []
+    project_timestamp = idx.project_timestamp
+    idx.project_timestamp = lambda path, **kwargs: walked.append(path) or project_timestamp(path, **kwargs)
+    assert idx.top_projects(paths, 1)[0][0] == recent_project
+    assert walked == [recent_project]  # The repository is queued on its cached timestamp, never reaching the front
+
+
+def test_index_caches_repository_activity(tmp_path, monkeypatch):
+  project = make_repo(tmp_path / "D-0000006")
+  age_everything(project)
+  reads = []
+  monkeypatch.setattr(index, "repository_state", lambda path: reads.append(path) or git_activity.repository_state(path))
+
+  with index.ActivityIndex() as idx:
+    assert idx.project_timestamp(project) == OLD
+    assert idx.project_timestamp(project) == OLD
+    assert reads == [project]  # Tracked files aren't re-stat'd while the git metadata and directories are unchanged
+
+    (project / "src" / "main.c").write_text("int main() { return 1; }\n")
+    git(project, "add", "src/main.c")
+    assert idx.project_timestamp(project) > OLD
+    assert len(reads) == 2
+
+    idx.project_timestamp(project, rescan=True)
+    assert len(reads) == 3
+
+    idx.forget_project(project)
+    assert idx.conn.execute("SELECT COUNT(*) FROM repositories").fetchone()[0] == 0
+
+
+def test_index_sees_edited_tracked_file(tmp_path):
+  project = make_repo(tmp_path / "D-0000007")
+  age_everything(project)
+  with index.ActivityIndex() as idx:
+    assert idx.project_timestamp(project) == OLD
+
+    saved = project / "src" / "deep" / ".util.c.swp"  # Saved as editors do - written aside, then renamed over it
+    saved.write_text("int util;\n")
+    os.utime(saved, (OLD, OLD + 400))
+    os.replace(saved, project / "src" / "deep" / "util.c")
+    assert idx.project_timestamp(project) >= OLD + 400
+
+    (project / "src" / "new.c").write_text("")  # Untracked, but in a tracked directory
+    assert idx.project_timestamp(project) > OLD + 400
+
+
+def test_watcher_keeps_git_project_edits(tmp_path, mock_base_directories):
+  from . import watch
+
+  mock_base_directories(tmp_path)
+  project = make_repo(tmp_path / "home" / "Projects" / "D-0000008")
+  age_everything(project)
+  with index.ActivityIndex() as idx:
+    watcher = watch.InotifyWatcher(idx)
+    try:
+      watcher.start()
+      assert idx.cached_timestamp(project) == OLD
+
+      with open(project / "src" / "main.c", "r+b") as fd:  # Edited in place - no directory or git metadata changes
+        fd.write(b"/")
+      os.utime(project / "src" / "main.c", (OLD, OLD + 600))
+      watcher.apply(watcher.inotify.read(timeout=1))
+      assert idx.cached_timestamp(project) == OLD + 600
+      assert idx.project_timestamp(project) == OLD + 600
+    finally:
+      watcher.close()
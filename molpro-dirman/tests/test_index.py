@@ -0,0 +1,189 @@
+# Test persistent activity index
+
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta
+from shutil import rmtree
+
+from . import index, config
+from tests.fixtures import *
+
+
+def full_walk_timestamp(path: Path) -> float:
+  return max(max(obj.stat().st_atime, obj.stat().st_mtime) for obj in path.rglob('*'))
+
+
+def test_index_matches_full_walk(datetimed_dir, isolated_cache_directory):
+  with index.ActivityIndex() as idx:
+    for key in (datetimed_dir / "home" / "Projects").iterdir():
+      assert idx.project_timestamp(key) == full_walk_timestamp(key)
+      assert idx.cached_timestamp(key) == full_walk_timestamp(key)
+
+  assert (isolated_cache_directory / "activity.sqlite3").exists()
+
+
+def test_index_persists_between_instances(datetimed_dir):
+  project = datetimed_dir / "home" / "Projects" / "DO-4256663"
+  with index.ActivityIndex() as idx:
+    first = idx.project_timestamp(project)
+
+  with index.ActivityIndex() as idx:
+    assert idx.cached_timestamp(project) == first
+    assert idx.project_timestamp(project) == first
+
+
+def test_index_detects_new_entries(datetimed_dir):
+  project = datetimed_dir / "home" / "Projects" / "T-1234567"
+  with index.ActivityIndex() as idx:
+    before = idx.project_timestamp(project)
+
+    future = (datetime.now() + timedelta(days=400)).timestamp()
+    (project / "new_file").write_text("awoo")
+    os.utime(project / "new_file", (future, future))
+
+    after = idx.project_timestamp(project)
+    assert after > before
+    assert after == future
+
+
+def test_index_rescan_picks_up_in_place_edits(datetimed_dir):
+  project = datetimed_dir / "home" / "Projects" / "APJ-1234567"
+  with index.ActivityIndex() as idx:
+    before = idx.project_timestamp(project)
+
+    # Changing a file's times doesn't touch its directory's mtime, so only a rescan will see it
+    future = (datetime.now() + timedelta(days=400)).timestamp()
+    os.utime(project / "README.md", (future, future))
+    assert idx.project_timestamp(project) == before
+    assert idx.project_timestamp(project, rescan=True) == future
+
+
+def test_index_forgets_removed_subdirectories(datetimed_dir):
+  project = datetimed_dir / "home" / "Projects" / "DT-1234567"
+  os.mkdir(project / "subdir")
+  (project / "subdir" / "file").write_text("awoo")
+
+  with index.ActivityIndex() as idx:
+    idx.project_timestamp(project)
+    assert str(project / "subdir") in idx._cached_directories(str(project))
+
+    rmtree(project / "subdir")
+    assert idx.project_timestamp(project) == full_walk_timestamp(project)
+    assert str(project / "subdir") not in idx._cached_directories(str(project))
+
+
+def test_index_empty_project(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  with index.ActivityIndex() as idx:
+    assert idx.project_timestamp(project) == max(project.stat().st_atime, project.stat().st_mtime)
+
+
+def test_index_list_subdirectories(structured_dir):
+  projects_dir = structured_dir / "home" / "Projects"
+  with index.ActivityIndex() as idx:
+    output = idx.list_subdirectories(projects_dir)
+    assert set(output) == set(k for k in projects_dir.iterdir() if k.is_dir())
+
+    os.mkdir(projects_dir / "S-7654321")
+    (projects_dir / "not_a_dir").write_text("")
+    assert projects_dir / "S-7654321" in idx.list_subdirectories(projects_dir)
+    assert projects_dir / "not_a_dir" not in idx.list_subdirectories(projects_dir)
+
+
+def test_index_schema_version_mismatch(isolated_cache_directory, monkeypatch):
+  with index.ActivityIndex() as idx:
+    idx.conn.execute("INSERT INTO projects (path, last_activity) VALUES ('x', 1.0)")
+    idx.conn.commit()
+
+  monkeypatch.setattr(index, "SCHEMA_VERSION", index.SCHEMA_VERSION + 1)
+  with index.ActivityIndex() as idx:
+    assert idx.cached_timestamp(Path("x")) is None
+
+
+def test_index_project_timestamps_parallel(datetimed_dir):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    expected = [idx.project_timestamp(p) for p in paths]
+
+  with index.ActivityIndex() as idx:
+    assert idx.project_timestamps(paths, jobs=4) == expected
+    assert idx.project_timestamps(list(reversed(paths)), rescan=True, jobs=4) == list(reversed(expected))
+    assert idx.project_timestamps(paths, jobs=1) == expected
+    assert idx.project_timestamps([], jobs=4) == []
+    assert len(idx._connections) > 1
+
+
+def test_index_iter_project_timestamps(datetimed_dir):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    expected = dict(zip(paths, idx.project_timestamps(paths)))
+
+  with index.ActivityIndex() as idx:
+    assert dict(idx.iter_project_timestamps(paths, jobs=4)) == expected
+    assert list(idx.iter_project_timestamps(paths, jobs=1)) == list(expected.items())
+    assert list(idx.iter_project_timestamps([], jobs=4)) == []
+
+    # Abandoning the iterator early doesn't wait on the scans that hadn't started
+    scans = idx.iter_project_timestamps(paths, rescan=True, jobs=2)
+    assert next(scans)[0] in expected
+    scans.close()
+
+
+def test_index_top_projects_matches_full_scan(datetimed_dir):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    ranked = sorted(zip(paths, idx.project_timestamps(paths)), key=lambda pair: pair[1], reverse=True)
+
+  with index.ActivityIndex() as idx:
+    for count in (1, 3, len(paths), len(paths) + 5):
+      assert idx.top_projects(paths, count) == ranked[:count]
+    assert idx.top_projects(paths, 2, rescan=True) == ranked[:2]
+
+
+def test_index_top_projects_walks_few_projects(datetimed_dir, monkeypatch):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    idx.project_timestamps(paths)
+
+    walked = []
+    project_timestamp = idx.project_timestamp
+    monkeypatch.setattr(idx, "project_timestamp", lambda path, **kwargs: walked.append(path) or project_timestamp(path, **kwargs))
+    idx.top_projects(paths, 1)
+    assert len(walked) == 1  # Only the front of the queue is confirmed
+
+    # A project whose root changed is walked up front, whatever its cached timestamp
+    walked.clear()
+    (paths[-1] / "new_file").touch()
+    top = idx.top_projects(paths, 1)
+    assert paths[-1] in walked
+    assert top[0][0] == paths[-1]
+
+
+def test_index_top_projects_unindexed(datetimed_dir):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    top = idx.top_projects(paths, 2)
+    assert top == sorted(zip(paths, idx.project_timestamps(paths)), key=lambda pair: pair[1], reverse=True)[:2]
+
+
+def test_index_serves_projects_kept_live_by_watcher(datetimed_dir):
+  import subprocess
+  project = datetimed_dir / "home" / "Projects" / "DO-4256663"
+  with index.ActivityIndex() as idx:
+    timestamp = idx.project_timestamp(project)
+    idx.set_watched([project])
+    assert idx.live_timestamps() == {}  # No watcher heartbeat yet
+
+    idx.heartbeat()
+    assert idx.live_timestamps() == {str(project): timestamp}
+    idx.project_timestamp = MagicMock(side_effect=AssertionError("Walked a project kept live by the watcher"))
+    assert list(idx.iter_project_timestamps([project])) == [(project, timestamp)]
+    assert idx.top_projects([project], 1) == [(project, timestamp)]
+
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    idx.heartbeat(pid=exited.pid)
+    assert idx.live_timestamps() == {}  # Watcher died
+
+    idx.heartbeat()
+    idx.stop_watching()
+    assert idx.live_timestamps() == {}
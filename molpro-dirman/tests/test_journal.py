@@ -0,0 +1,125 @@
+# Test the write-ahead journal of serial events, and flushing it to the stand-in registry
+
+from molpro_dirman import errors
+from . import journal, sync, sync_server, local_write, config
+from tests.fixtures import *
+
+
+@pytest.fixture
+def registry():
+  server = sync_server.RegistryServer()
+  server.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def registry_configured(monkeypatch):
+  "Events are only journalled while a registry is configured"
+  monkeypatch.setenv("MPDMAN_REGISTRY_URL", "http://127.0.0.1:9")
+
+
+def test_append_and_pending():
+  events = [journal.make_event("create", f"D-{n:07d}", "Title") for n in range(3)]
+  journal.Journal().append(*events[:2])
+  journal.record(events[2])
+  assert journal.Journal().pending() == events
+
+
+def test_make_event_rejects_unknown_type():
+  with pytest.raises(ValueError):
+    journal.make_event("explode", "D-0000001")
+
+
+def test_torn_final_line_ignored():
+  event = journal.make_event("create", "D-0000001")
+  journal.record(event)
+  with open(journal.Journal().path, "a") as fd:
+    fd.write('{"id": "abc", "type": "cre')  # Crashed mid-append
+  assert journal.Journal().pending() == [event]
+
+
+def test_compact_drops_flushed_and_cancelled():
+  created = journal.make_event("create", "D-0000001")
+  kept = journal.make_event("create", "D-0000002")
+  deleted = journal.make_event("delete", "D-0000001")
+  flushed = journal.make_event("create", "D-0000003")
+  journal.record(created, kept, flushed, deleted)
+
+  assert journal.Journal().compact({flushed["id"]}) == 1
+  assert journal.Journal().pending() == [kept]
+
+
+def test_compact_keeps_recreate_after_delete():
+  events = [
+    journal.make_event("create", "D-0000001"),
+    journal.make_event("delete", "D-0000001"),
+    journal.make_event("create", "D-0000001"),
+  ]
+  journal.record(*events)
+  assert journal.Journal().compact() == 1
+  assert journal.Journal().pending() == events[2:]
+
+
+def test_flush_in_batches(registry):
+  journal.record(*(journal.make_event("create", f"D-{n:07d}", "Batch") for n in range(25)))
+
+  assert journal.flush(registry.url, batch_size=10) == 25
+  assert registry.request_count == 3
+  assert len(registry.store.serials) == 25
+  assert journal.Journal().pending() == []
+
+  # Sync already knows about them - nothing is re-pushed
+  assert sync.SyncState.load(registry.url).taken_serials("D") == set(range(25))
+
+
+def test_flush_replay_is_idempotent(registry):
+  events = [journal.make_event("create", "D-0000001"), journal.make_event("rename", "D-0000002", old_name="D-0000001")]
+  registry.store.apply_events(events[:1])  # Applied, but the acknowledgement was lost
+  journal.record(*events)
+
+  assert journal.flush(registry.url) == 2
+  assert list(registry.store.serials) == ["D-0000002"]
+  assert registry.store.apply_events(events) == {"applied": [], "duplicate": [event["id"] for event in events]}
+
+
+def test_flush_offline_keeps_events():
+  event = journal.make_event("create", "D-0000001")
+  journal.record(event)
+  with pytest.raises(errors.RegistryError):
+    journal.flush("http://127.0.0.1:9")
+  assert journal.Journal().pending() == [event]
+
+
+def test_create_project_journals_serial(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  project_path = local_write.create_project(["D"], "Journalled", "", 7654321)
+  assert [(event["type"], event["name"], event["title"]) for event in journal.Journal().pending()] == [
+    ("create", project_path.parts[-1], "Journalled"),
+  ]
+
+
+def test_create_projects_journals_every_serial(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  project_paths = local_write.create_projects(["D"], "Bulk", "", 5)
+  assert [event["name"] for event in journal.Journal().pending()] == [path.parts[-1] for path in project_paths]
+
+
+def test_no_registry_journals_nothing(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.delenv("MPDMAN_REGISTRY_URL", raising=False)
+  local_write.create_projects(["D"], "Unregistered", "", 3)
+  assert not config.Config.journal_path().exists()
+
+
+def test_schedule_flush_needs_registry(monkeypatch):
+  popen = MagicMock()
+  monkeypatch.setattr(journal.subprocess, "Popen", popen)
+  monkeypatch.delenv("MPDMAN_REGISTRY_URL", raising=False)
+  journal.schedule_flush()
+  popen.assert_not_called()
+
+  monkeypatch.setenv("MPDMAN_REGISTRY_URL", "http://127.0.0.1:9")
+  journal.schedule_flush()
+  popen.assert_called_once()
@@ -41,6 +41,12 @@ def test_last_modified(datetimed_dir):
   assert output2.index("DO-4256663") < output2.index("T-1234567")
 
 
+def test_last_modified_approximate(datetimed_dir):
+  project = datetimed_dir / "home" / "Projects" / "DO-4256663"
+  assert local_read.last_modified(project, depth=50, budget_ms=60_000) == local_read.last_modified(project)
+  assert local_read.last_modified(project, budget_ms=1e-9).startswith(local_read.LOWER_BOUND_MARK)
+
+
 def test_project_list_paths(populated_dir):
   config.Config.base_project_directory = MagicMock(
     return_value=populated_dir / "home" / "Projects"
@@ -163,3 +169,46 @@ def test_project_is_valid_path(populated_dir):
 
   assert local_read.Project.is_valid_path(populated_dir / "home" / "Documents") is False
   assert local_read.Project.is_valid_path(populated_dir / "fake_path" / "Projects") is False
+
+
+def test_project_is_valid_path_roots_and_project_directories(archive_root, structured_dir):
+  primary = structured_dir / "home" / "Projects"
+  assert local_read.Project.is_valid_path(primary) is False
+  assert local_read.Project.is_valid_path(archive_root) is False
+  assert local_read.Project.is_valid_path(primary / "DO-4256663") is True  # In the catalog
+  assert local_read.Project.is_valid_path(archive_root / "HO-7654321") is True
+  assert local_read.Project.is_valid_path(primary / "DO-0000000") is False  # Not in the catalog
+  assert local_read.Project.is_valid_path(archive_root / "DO-4256663") is False  # In the catalog, under another root
+
+
+def test_project_list_paths_multiple_roots(archive_root, structured_dir):
+  names = local_read.Project.list_names()
+  assert sorted(names) == sorted(
+    [path.parts[-1] for path in (structured_dir / "home" / "Projects").iterdir()] + ["HO-7654321", "T-7777777"]
+  )
+  assert local_read.Project.taken_serials("T") == {1234567, 7777777}
+
+
+def test_project_list_paths_skips_unavailable_root(archive_root, structured_dir):
+  rmtree(archive_root)
+  assert "HO-7654321" not in local_read.Project.list_names()
+  assert "DO-4256663" in local_read.Project.list_names()
+
+
+def test_project_roots_lookup(archive_root, structured_dir):
+  primary = structured_dir / "home" / "Projects"
+  assert local_read.Project.is_valid_path(archive_root / "HO-7654321") is True
+  assert local_read.Project.root_of(archive_root / "HO-7654321" / "README.md") == archive_root
+  assert local_read.Project.root_of(structured_dir / "home" / "Documents") is None
+  assert local_read.Project.path_of("HO-7654321") == archive_root / "HO-7654321"
+  assert local_read.Project.path_of("DO-4256663") == primary / "DO-4256663"
+  assert local_read.Project.path_of("S-0000001") == primary / "S-0000001"  # Not yet created - would go in the first root
+
+
+def test_project_title_keeps_atime(structured_dir):
+  path = structured_dir / "home" / "Projects" / "DO-4256663"
+  with open(path / "README.md", "w") as fd:
+    fd.write("# Motor controller\n")
+  os.utime(path / "README.md", (1000000000, 1000000000))
+  assert local_read.project_title(path) == "Motor controller"
+  assert os.stat(path / "README.md").st_atime == 1000000000
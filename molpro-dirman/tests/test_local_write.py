@@ -1,5 +1,6 @@
 # Test active system interaction methods
 
+import multiprocessing
 from unittest.mock import MagicMock
 
 from . import local_write, config
@@ -338,3 +339,100 @@ def test_create_project_already_exists(structured_dir, mock_base_directories):
   mock_base_directories(structured_dir)
   with pytest.raises(local_write.ProjectAlreadyExists):
     local_write.create_project(['T'], "A pre-existing project", "This should fail, huh?", serial=1234567)
+
+
+def test_serial_allocator_avoids_taken(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  allocator = local_write.SerialAllocator(['T'])
+  assert allocator.taken == {1234567}
+  assert local_write.SerialAllocator(['D', 'T']).taken == {1234567}
+  assert local_write.SerialAllocator(['O', 'D']).taken == {4256663}
+
+  serials = [allocator.allocate() for _ in range(1000)]
+  assert len(set(serials)) == 1000
+  assert 1234567 not in serials
+  assert all(0 < s < local_write.SERIAL_SPACE for s in serials)
+
+
+def test_serial_allocator_dense(monkeypatch):
+  monkeypatch.setattr(local_write, "SERIAL_SPACE", 100)
+  allocator = local_write.SerialAllocator(['S'], taken=set(range(1, 95)))
+
+  serials = {allocator.allocate() for _ in range(5)}
+  assert serials == {95, 96, 97, 98, 99}
+  with pytest.raises(local_write.SerialGenerationError):
+    allocator.allocate()
+
+
+def test_generate_random_serial_single_listing(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.setattr(local_write.Project, "is_valid_path", MagicMock(side_effect=AssertionError("probed")))
+  assert local_write.generate_random_serial(['T']) != 1234567
+
+
+def test_create_projects(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  output = local_write.create_projects(['S', 'D'], "Batch intake", "", count=25)
+
+  assert len(set(output)) == 25
+  assert all(p.parts[-1].startswith("DS-") and (p / "README.md").exists() for p in output)
+  assert all("# Batch intake\n" in (p / "README.md").read_text() for p in output)
+
+
+def _create_in_process(results, count: int, serial=None):
+  created = []
+  for _ in range(count):
+    try:
+      created.append(local_write.create_project(['S'], "Stress test", "Concurrent", serial).parts[-1])
+    except local_write.ProjectAlreadyExists:
+      created.append(None)
+  results.put(created)
+
+
+def test_create_project_concurrent_processes(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.setattr(local_write, "SERIAL_SPACE", 400)  # Small serial space, so processes collide often
+  ctx = multiprocessing.get_context("fork")
+  results = ctx.Queue()
+
+  random_workers = [ctx.Process(target=_create_in_process, args=(results, 25)) for _ in range(8)]
+  fixed_workers = [ctx.Process(target=_create_in_process, args=(results, 1, 7654321)) for _ in range(4)]
+  for worker in random_workers + fixed_workers:
+    worker.start()
+  outputs = [results.get(timeout=60) for _ in random_workers + fixed_workers]
+  for worker in random_workers + fixed_workers:
+    worker.join(timeout=60)
+    assert worker.exitcode == 0
+
+  created = [name for output in outputs for name in output if name is not None]
+  assert len(created) == len(set(created)) == 8 * 25 + 1
+  assert created.count("S-7654321") == 1
+
+  projects_dir = structured_dir / "home" / "Projects"
+  on_disk = [k for k in projects_dir.iterdir() if k.is_dir() and k.parts[-1].startswith("S-")]
+  assert set(k.parts[-1] for k in on_disk) == set(created)
+  for project in on_disk:
+    assert sorted(k.parts[-1] for k in project.iterdir()) == ["README.md"]
+    assert (project / "README.md").read_text() == f"# Stress test\n## {project.parts[-1]}\n\n\nConcurrent"
+
+
+def test_create_project_cleans_up_failed_write(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.setattr(local_write, "write_text_atomic", MagicMock(side_effect=OSError("disk full")))
+
+  with pytest.raises(OSError):
+    local_write.create_project(['S'], "Doomed", "", serial=1111111)
+  assert not (structured_dir / "home" / "Projects" / "S-1111111").exists()
+
+
+def test_write_text_atomic(tmp_path):
+  local_write.write_text_atomic(tmp_path / "file.md", "awoo")
+  local_write.write_text_atomic(tmp_path / "file.md", "awoo2")
+  assert (tmp_path / "file.md").read_text() == "awoo2"
+  assert [k.parts[-1] for k in tmp_path.iterdir()] == ["file.md"]
+
+
+def test_create_project_exists_in_other_root(archive_root):
+  with pytest.raises(local_write.ProjectAlreadyExists):
+    local_write.create_project(['H', 'O'], "Archived elsewhere", "This should fail too", serial=7654321)
+  assert not (archive_root.parent / "home" / "Projects" / "HO-7654321").exists()
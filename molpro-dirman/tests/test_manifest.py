@@ -0,0 +1,109 @@
+# Test symlink manifest
+
+from unittest.mock import MagicMock
+
+from . import manifest, local_read, local_write, config
+from tests.fixtures import *
+
+
+def link_names(links: list[Path]) -> set[str]:
+  return set(key.parts[-1] for key in links)
+
+
+def test_manifest_bootstrapped_by_scan(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  assert manifest.SymlinkManifest.load() is None
+
+  local_read.Project.all_symlinks()
+  loaded = manifest.SymlinkManifest.load()
+  assert loaded.links == {
+    "current_project": str(populated_dir / "home" / "Projects" / "DO-4256663"),
+    "project_T-1234567": str(populated_dir / "home" / "Projects" / "T-1234567"),
+    "project_DT-1234567": str(populated_dir / "home" / "Projects" / "DT-1234567"),
+  }
+
+
+def test_manifest_used_instead_of_scan(populated_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(populated_dir)
+  local_read.Project.all_symlinks()
+
+  monkeypatch.setattr(local_read.Project, "scan_symlinks", MagicMock(side_effect=AssertionError("scanned")))
+  local_write.symlink_project(populated_dir / "home" / "Projects" / "APJ-1234567", is_main=False)
+  local_write.unlink_specific(populated_dir / "home" / "Projects" / "DT-1234567")
+  local_write.move_main_to_aux()
+
+  assert link_names(local_read.Project.all_symlinks()) == {
+    "project_DO-4256663", "project_T-1234567", "project_APJ-1234567"
+  }
+
+
+def test_manifest_external_changes(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  local_read.Project.all_symlinks()
+
+  # Removed / retargeted outside mpdman - picked up by the readlink check on each manifest entry
+  os.remove(populated_dir / "home" / "project_T-1234567")
+  os.remove(populated_dir / "home" / "current_project")
+  os.symlink(populated_dir / "home" / "Projects" / "APJ-1234567", populated_dir / "home" / "current_project")
+  assert link_names(local_read.Project.all_symlinks()) == {"current_project", "project_DT-1234567"}
+  assert manifest.SymlinkManifest.load().links["current_project"] == str(populated_dir / "home" / "Projects" / "APJ-1234567")
+
+  # Created outside mpdman - only found by a rescan
+  os.symlink(populated_dir / "home" / "Projects" / "T-1234567", populated_dir / "home" / "project_T-1234567")
+  assert link_names(local_read.Project.all_symlinks()) == {"current_project", "project_DT-1234567"}
+  assert link_names(local_read.Project.all_symlinks(rescan=True)) == {
+    "current_project", "project_DT-1234567", "project_T-1234567"
+  }
+
+
+def test_manifest_reconcile_changes(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  assert local_read.Project.reconcile_symlinks() == {
+    "added": ["current_project", "project_DT-1234567", "project_T-1234567"],
+    "removed": [],
+    "retargeted": [],
+  }
+  assert local_read.Project.reconcile_symlinks() == {"added": [], "removed": [], "retargeted": []}
+
+  os.remove(populated_dir / "home" / "project_T-1234567")
+  os.remove(populated_dir / "home" / "current_project")
+  os.symlink(populated_dir / "home" / "Projects" / "APJ-1234567", populated_dir / "home" / "current_project")
+  assert local_read.Project.reconcile_symlinks() == {
+    "added": [],
+    "removed": ["project_T-1234567"],
+    "retargeted": ["current_project"],
+  }
+
+
+def test_manifest_other_symlink_directory(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  local_read.Project.all_symlinks()
+  assert manifest.SymlinkManifest.load() is not None
+
+  config.Config.base_symlink_directory = MagicMock(return_value=populated_dir / "home" / "Documents")
+  assert manifest.SymlinkManifest.load() is None
+  assert local_read.Project.all_symlinks() == []
+
+
+def test_manifest_not_created_by_writes(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  local_write.symlink_project(structured_dir / "home" / "Projects" / "DO-4256663", is_main=True)
+  assert manifest.SymlinkManifest.load() is None
+  assert link_names(local_read.Project.all_symlinks()) == {"current_project"}
+
+
+def test_manifest_concurrent_updates(structured_dir, mock_base_directories):
+  from concurrent.futures import ThreadPoolExecutor
+
+  mock_base_directories(structured_dir)
+  local_read.Project.all_symlinks()  # Build the (empty) manifest
+  target = structured_dir / "home" / "Projects" / "DO-4256663"
+
+  def link(n: int):
+    symlink_path = structured_dir / "home" / f"project_T-{n:07d}"
+    os.symlink(target, symlink_path)
+    manifest.record_symlink(symlink_path)
+
+  with ThreadPoolExecutor(max_workers=16) as pool:
+    list(pool.map(link, range(64)))
+  assert len(manifest.SymlinkManifest.load().links) == 64
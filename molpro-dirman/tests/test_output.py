@@ -0,0 +1,67 @@
+# Test the machine-readable record formats
+
+import io
+import json
+from datetime import datetime
+
+from . import output
+from tests.fixtures import *
+
+
+def written(output_format: str, sections: dict[str, list[dict]] | None = None, records: list[dict] = ()) -> str:
+  stream = io.StringIO()
+  with output.RecordWriter(output_format, stream, sections=sections is not None) as writer:
+    for section, section_records in (sections or {None: records}).items():
+      if section is not None:
+        writer.section(section)
+      for record in section_records:
+        writer.write(record)
+  return stream.getvalue()
+
+
+def test_project_record(structured_dir):
+  path = structured_dir / "home" / "Projects" / "DO-4256663"
+  with open(path / "README.md", "w") as fd:
+    fd.write("# Motor controller\n")
+  record = output.project_record(path, 1700000000.5, symlinks=["project_DO-4256663", "current_project"])
+
+  assert record == {
+    "name": "DO-4256663",
+    "prefixes": ["D", "O"],
+    "serial": 4256663,
+    "title": "Motor controller",
+    "last_activity": record["last_activity"],
+    "complete": True,
+    "symlinks": ["current_project", "project_DO-4256663"],
+    "root": str(path.parent),
+  }
+  assert datetime.fromisoformat(record["last_activity"]).timestamp() == 1700000000
+  assert tuple(record) == output.RECORD_FIELDS
+
+
+def test_json_documents():
+  records = [{"name": "A-1234567"}, {"name": "B-1234567"}]
+  assert json.loads(written("json", records=records)) == records
+  assert json.loads(written("json", records=[])) == []
+  assert json.loads(written("json", {"active": [], "projects": records})) == {"active": [], "projects": records}
+  assert json.loads(written("json", {"active": records[:1], "projects": records})) == {"active": records[:1], "projects": records}
+
+
+def test_ndjson_and_tsv_rows(structured_dir):
+  record = output.project_record(structured_dir / "home" / "Projects" / "T-1234567", 0, complete=False, symlinks=["a", "b"])
+  record["title"] = "Tabs\tand\nnewlines"
+
+  assert [json.loads(line) for line in written("ndjson", records=[record, record]).splitlines()] == [record, record]
+  assert json.loads(written("ndjson", {"active": [record]}))["section"] == "active"
+
+  header, row = written("tsv", records=[record]).splitlines()
+  assert header.split("\t") == list(output.RECORD_FIELDS)
+  assert row.split("\t") == [
+    "T-1234567", "T", "1234567", "Tabs and newlines", record["last_activity"], "false", "a,b", record["root"],
+  ]
+  assert written("tsv", {"projects": [record]}).splitlines()[1].startswith("projects\tT-1234567\t")
+
+
+def test_table_has_no_record_writer():
+  with pytest.raises(ValueError):
+    output.RecordWriter("table")
@@ -0,0 +1,66 @@
+# Test --profile instrumentation: phases, syscall counts and reports
+
+import json
+import pstats
+
+from . import profiling
+from tests.fixtures import *
+
+
+def test_phase_is_noop_when_disabled():
+  assert profiling.phase("anything") is profiling.phase("else")
+  with profiling.phase("anything"):
+    pass
+
+
+def test_profiled_phases_and_syscalls(datetimed_dir, capsys):
+  with profiling.profiled("json") as profiler:
+    with profiling.phase("outer"):
+      os.stat(datetimed_dir)
+      with profiling.phase("inner"):
+        os.listdir(datetimed_dir)
+        with os.scandir(datetimed_dir) as it:
+          [entry.stat() for entry in it]
+    with profiling.phase("outer"):
+      pass
+    os.lstat(datetimed_dir)
+  assert profiling.phase("after") is profiling._NULL_PHASE
+
+  phases = {row["phase"]: row for row in profiler.report()["phases"]}
+  assert list(phases) == ["outer", "outer > inner", profiling.UNPHASED]
+  assert phases["outer"]["calls"] == 2
+  assert phases["outer"]["stat"] == 1
+  assert phases["outer > inner"]["listdir"] == 1
+  assert phases["outer > inner"]["scandir"] == 1
+  assert phases["outer > inner"]["stat"] == len(os.listdir(datetimed_dir))
+  assert phases[profiling.UNPHASED]["lstat"] == 1
+
+  report = json.loads(capsys.readouterr().err)
+  assert [row["phase"] for row in report["phases"]] == list(phases)
+
+
+def test_profiled_restores_os():
+  originals = {name: getattr(os, name) for name in profiling.COUNTED_CALLS}
+  with pytest.raises(RuntimeError):
+    with profiling.profiled("json"):
+      raise RuntimeError
+  assert {name: getattr(os, name) for name in profiling.COUNTED_CALLS} == originals
+
+
+def test_profiled_table(capsys):
+  with profiling.profiled("table"):
+    with profiling.phase("render"):
+      pass
+  assert "render" in capsys.readouterr().err
+
+
+def test_profiled_rejects_unknown_format():
+  with pytest.raises(ValueError):
+    with profiling.profiled("xml"):
+      pass
+
+
+def test_cprofiled_dumps_stats(tmp_path):
+  with profiling.cprofiled(str(tmp_path / "out.prof")):
+    sorted(range(1000))
+  assert pstats.Stats(str(tmp_path / "out.prof")).total_calls > 0
@@ -0,0 +1,56 @@
+# Test shell prompt segment and its cache
+
+from unittest.mock import MagicMock
+
+from . import prompt, local_read
+from tests.fixtures import *
+
+
+def test_format_segment():
+  assert prompt.format_segment("DO-4256663", 2) == "DO-4256663"
+  assert prompt.format_segment("DO-4256663", 2, show_aux=True) == "DO-4256663 +2"
+  assert prompt.format_segment("DO-4256663", 0, show_aux=True) == "DO-4256663"
+  assert prompt.format_segment("", 1, show_aux=True) == "+1"
+  assert prompt.format_segment("", 0, show_aux=True) == ""
+
+
+def test_prompt_segment(populated_dir, mock_base_directories, isolated_cache_directory):
+  mock_base_directories(populated_dir)
+  cache_file = str(isolated_cache_directory / "prompt")
+
+  assert prompt.prompt_segment(cache_file=cache_file) == "DO-4256663"
+  assert prompt.prompt_segment(show_aux=True, cache_file=cache_file) == "DO-4256663 +2"
+
+
+def test_prompt_segment_cache_hit(populated_dir, mock_base_directories, isolated_cache_directory, monkeypatch):
+  mock_base_directories(populated_dir)
+  cache_file = str(isolated_cache_directory / "prompt")
+  prompt.prompt_segment(cache_file=cache_file)
+
+  monkeypatch.setattr(local_read.Project, "all_symlinks", MagicMock(side_effect=AssertionError("cache missed")))
+  assert prompt.prompt_segment(show_aux=True, cache_file=cache_file) == "DO-4256663 +2"
+
+
+def test_prompt_segment_cache_invalidated(populated_dir, mock_base_directories, isolated_cache_directory):
+  mock_base_directories(populated_dir)
+  cache_file = str(isolated_cache_directory / "prompt")
+  assert prompt.prompt_segment(show_aux=True, cache_file=cache_file) == "DO-4256663 +2"
+
+  os.remove(populated_dir / "home" / "current_project")
+  assert prompt.prompt_segment(show_aux=True, cache_file=cache_file) == "+2"
+
+  os.symlink(
+    populated_dir / "home" / "Projects" / "APJ-1234567",
+    populated_dir / "home" / "current_project",
+    target_is_directory=True
+  )
+  assert prompt.prompt_segment(show_aux=True, cache_file=cache_file) == "APJ-1234567 +2"
+
+
+def test_prompt_segment_corrupt_cache(populated_dir, mock_base_directories, isolated_cache_directory):
+  mock_base_directories(populated_dir)
+  cache_file = isolated_cache_directory / "prompt"
+  cache_file.write_text("garbage")
+
+  assert prompt.prompt_segment(cache_file=str(cache_file)) == "DO-4256663"
+  assert cache_file.read_text().split("\0")[2] == "DO-4256663"
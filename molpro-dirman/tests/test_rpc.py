@@ -0,0 +1,22 @@
+# Test the daemon client's fallbacks
+
+import socket
+
+from . import rpc, config
+from tests.fixtures import *
+
+
+def test_daemon_call_without_daemon():
+  assert rpc.daemon_call("ls") is None
+
+  stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  stale.bind(str(config.Config.socket_path()))
+  stale.close()
+  assert rpc.daemon_call("ls") is None
+  assert rpc.daemon_call("activate", {"project": "DO-4256663"}, idempotent=False) is None
+
+
+def test_daemon_call_disabled(monkeypatch):
+  monkeypatch.setenv(rpc.NO_DAEMON_ENV, "1")
+  monkeypatch.setattr(rpc, "DaemonClient", MagicMock(side_effect=AssertionError("Connected with the daemon disabled")))
+  assert rpc.daemon_call("ls") is None
@@ -0,0 +1,109 @@
+# Test full-text project search
+
+from typing import Optional
+
+from . import search, cli
+from tests.fixtures import *
+
+
+def write_readme(project: Path, title: str, description: str = "", mtime: Optional[float] = None) -> None:
+  readme = project / "README.md"
+  readme.write_text(f"# {title}\n\n{description}\n")
+  if mtime is not None:
+    os.utime(readme, (mtime, mtime))
+
+
+@pytest.fixture
+def readme_dir(structured_dir) -> Path:
+  projects = structured_dir / "home" / "Projects"
+  write_readme(projects / "T-1234567", "Motor controller", "Brushless motor driver board", 1_000_000)
+  write_readme(projects / "DO-4256663", "Motorbike stand", "Laser cut stand for a motorbike", 2_000_000)
+  write_readme(projects / "APJ-1234567", "Fursuit head", "Foam base, motor driven ears", 3_000_000)
+  yield projects
+
+
+def paths(results) -> list[str]:
+  return [result.path.parts[-1] for result in results]
+
+
+def test_tokenize():
+  assert search.tokenize("DO-4256663: Motor_Controller, v2!") == {"do", "4256663", "motor", "controller", "v2"}
+
+
+def test_search_and_terms_ranked_by_recency(readme_dir):
+  with search.SearchIndex() as idx:
+    assert idx.refresh(readme_dir.iterdir()) == 5
+    assert paths(idx.search("motor")) == ["APJ-1234567", "T-1234567"]
+    assert paths(idx.search("motor driver")) == ["T-1234567"]
+    assert paths(idx.search("MOTOR ears")) == ["APJ-1234567"]
+    assert idx.search("motor stand") == []
+    assert idx.search("") == []
+
+
+def test_search_prefix_terms(readme_dir):
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    assert paths(idx.search("motor*")) == ["APJ-1234567", "DO-4256663", "T-1234567"]
+    assert paths(idx.search("motor* las*")) == ["DO-4256663"]
+    assert paths(idx.search("motor*", limit=1)) == ["APJ-1234567"]
+
+
+def test_search_titles_and_names(readme_dir):
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    assert [r.title for r in idx.search("fursuit")] == ["Fursuit head"]
+    assert paths(idx.search("4256663")) == ["DO-4256663"]
+    assert paths(idx.search("abcdef")) == ["ABCDEF-4567890"]  # No README, still found by name
+
+
+def test_search_title_after_front_matter(readme_dir):
+  (readme_dir / "T-1234567" / "README.md").write_text("<!-- generated -->\n\n# Motor controller\n")
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    assert [r.title for r in idx.search("generated")] == ["Motor controller"]
+
+
+def test_refresh_is_incremental(readme_dir):
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    assert idx.refresh(readme_dir.iterdir()) == 0
+
+    write_readme(readme_dir / "T-1234567", "Servo tester", mtime=4_000_000)
+    assert idx.refresh(readme_dir.iterdir()) == 1
+    assert paths(idx.search("servo")) == ["T-1234567"]
+    assert paths(idx.search("motor")) == ["APJ-1234567"]
+
+  with search.SearchIndex() as idx:  # Persisted between instances
+    assert idx.refresh(readme_dir.iterdir()) == 0
+    assert paths(idx.search("servo")) == ["T-1234567"]
+
+
+def test_refresh_forgets_removed_projects(readme_dir):
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    idx.refresh(p for p in readme_dir.iterdir() if p.name != "APJ-1234567")
+    assert paths(idx.search("motor")) == ["T-1234567"]
+    assert idx.conn.execute("SELECT COUNT(*) FROM postings WHERE path LIKE '%APJ%'").fetchone()[0] == 0
+
+
+def test_search_filenames(readme_dir):
+  (readme_dir / "DT-1234567" / "enclosure.step").write_text("")
+  with search.SearchIndex() as idx:
+    idx.refresh(readme_dir.iterdir())
+    assert idx.search("enclosure") == []
+    idx.refresh(readme_dir.iterdir(), files=True)
+    assert paths(idx.search("enclosure", files=True)) == ["DT-1234567"]
+    assert idx.refresh(readme_dir.iterdir(), files=True) == 0
+
+
+def test_search_command(readme_dir, mock_base_directories):
+  from typer.testing import CliRunner
+
+  mock_base_directories(readme_dir.parent.parent)
+  result = CliRunner().invoke(cli.app, ["search", "motor*", "--limit", "2"], env={"COLUMNS": "200"})
+  assert result.exit_code == 0, result.output
+  assert "Fursuit head" in result.output and "Motorbike stand" in result.output
+  assert "Motor controller" not in result.output
+
+  result = CliRunner().invoke(cli.app, ["search", "nonexistent"], env={"COLUMNS": "200"})
+  assert "No matching projects" in result.output
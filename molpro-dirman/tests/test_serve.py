@@ -0,0 +1,182 @@
+# Test the daemon answering commands over its Unix socket
+
+import json
+import socket
+import threading
+from contextlib import contextmanager
+from typer.testing import CliRunner
+
+from . import serve, rpc, index, cli, config
+from tests.fixtures import *
+
+
+@contextmanager
+def running_daemon(**kwargs):
+  "The daemon serving in a background thread, listening before this yields"
+  stop, ready = threading.Event(), threading.Event()
+  errors = []
+
+  def run():
+    try:
+      serve.serve(stop=stop, ready=lambda _: ready.set(), **kwargs)
+    except BaseException as e:
+      errors.append(e)
+      ready.set()
+
+  thread = threading.Thread(target=run)
+  thread.start()
+  assert ready.wait(10)
+  try:
+    assert not errors, errors
+    yield
+  finally:
+    stop.set()
+    thread.join(10)
+  assert not errors, errors
+
+
+def test_daemon_queries(populated_dir, mock_base_directories):
+  mock_base_directories(populated_dir)
+  projects = populated_dir / "home" / "Projects"
+  with running_daemon(), rpc.DaemonClient() as client:
+    listed = client.call("ls")["projects"]
+    with index.ActivityIndex() as idx:
+      assert {p["name"]: p["last_activity"] for p in listed} == {
+        path.parts[-1]: idx.project_timestamp(path) for path in projects.iterdir()
+      }
+    assert [p["last_activity"] for p in listed] == sorted((p["last_activity"] for p in listed), reverse=True)
+    assert client.call("ls", top=2)["projects"] == listed[:2]
+
+    active = client.call("active")
+    assert active["main"] == "DO-4256663"
+    assert sorted(link["project"] for link in active["links"]) == ["DO-4256663", "DT-1234567", "T-1234567"]
+    assert client.call("status") == {**active, "projects": listed}
+
+  assert not config.Config.socket_path().exists()
+
+
+def test_daemon_commands(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  with running_daemon(), rpc.DaemonClient() as client:
+    assert client.call("active")["main"] is None
+    client.call("activate", project="DO-4256663")
+    assert client.call("active")["main"] == "DO-4256663"  # Not served from the snapshot taken before
+    with pytest.raises(rpc.errors.ProjectAlreadySymLinked):
+      client.call("activate", project="DO-4256663")
+
+    assert client.call("deactivate") == {"removed": [str(structured_dir / "home" / "current_project")]}
+    assert client.call("active")["main"] is None
+
+    created = client.call("create", prefixes=["S"], title="Made by the daemon", serial=7654321)["paths"]
+    assert created == [str(structured_dir / "home" / "Projects" / "S-7654321")]
+    assert "S-7654321" in [p["name"] for p in client.call("ls")["projects"]]
+
+
+def test_daemon_errors(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  with running_daemon(), rpc.DaemonClient() as client:
+    with pytest.raises(rpc.DaemonError, match="Unknown method"):
+      client.call("rm_rf")
+    with pytest.raises(rpc.DaemonError, match="Invalid params"):
+      client.call("ls", sort="name")
+
+    client.file.write(b"{not json\n")
+    client.file.flush()
+    assert json.loads(client.file.readline())["error"]["code"] == rpc.PARSE_ERROR
+    assert client.call("active")["main"] is None  # The connection is still usable
+
+
+def test_daemon_replaces_stale_socket(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  stale.bind(str(config.Config.socket_path()))
+  stale.close()  # Socket file left behind, nothing listening
+
+  with running_daemon(), rpc.DaemonClient() as client:
+    assert len(client.call("ls")["projects"]) == 5
+
+
+def test_state_rebuilt_only_after_changes(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "ls"}).encode()
+  with index.ActivityIndex() as idx:
+    state = serve.DaemonState(idx)
+    first = serve.respond(state, request)
+    for _ in range(100):
+      assert serve.respond(state, request) == first
+    assert state.refreshes == 1
+
+    state.invalidate()
+    serve.respond(state, request)
+    assert state.refreshes == 2
+
+
+def test_daemon_connections_bounded(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  with index.ActivityIndex() as idx:
+    state = serve.DaemonState(idx)
+    server = serve.DaemonServer(config.Config.socket_path(), state)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    try:
+      for _ in range(30):
+        state.invalidate()  # Rescanned by each client's handler thread, with a pool of scan workers
+        with rpc.DaemonClient() as client:
+          assert len(client.call("ls")["projects"]) == 5
+      assert len(idx._connections) <= 2  # Handlers still finishing, at most - not one per client (or scan worker)
+    finally:
+      server.shutdown()
+      server.server_close()
+      thread.join()
+
+
+def test_daemon_refuses_other_settings(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  request = {"jsonrpc": "2.0", "id": 1, "method": "ls", "settings": "other"}
+  with index.ActivityIndex() as idx:
+    response = json.loads(serve.respond(serve.DaemonState(idx), json.dumps(request).encode()))
+    assert response["error"]["code"] == rpc.SETTINGS_MISMATCH
+
+  with running_daemon():
+    monkeypatch.setattr(rpc, "settings_stamp", lambda: "other")  # eg: MPDMAN_PROJECT_ROOTS set for one command
+    assert rpc.daemon_call("activate", {"project": "DO-4256663"}, idempotent=False) is None
+    assert not (structured_dir / "home" / "current_project").exists()
+
+
+def test_daemon_reloads_edited_config(structured_dir, mock_base_directories, isolated_config_file):
+  mock_base_directories(structured_dir)
+  request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "ls"}).encode()
+  with index.ActivityIndex() as idx:
+    state = serve.DaemonState(idx)
+    serve.respond(state, request)
+    assert config.settings().main_symlink_name == "current_project"
+
+    isolated_config_file.write_text('[naming]\nmain_symlink = "active_project"\n')
+    serve.respond(state, request)
+    assert config.settings().main_symlink_name == "active_project"
+    assert state.settings == rpc.settings_stamp()
+
+
+def test_cli_uses_daemon(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  runner = CliRunner()
+  failing = MagicMock(side_effect=AssertionError("Ran in-process with a daemon running"))
+  monkeypatch.setattr(cli, "symlink_project", failing)
+  monkeypatch.setattr(cli, "activity_timestamps", failing)
+
+  with running_daemon():
+    result = runner.invoke(cli.app, ["activate", "DO-4256663"], env={"COLUMNS": "200"})
+    assert "Linked 'DO-4256663'" in result.output
+    result = runner.invoke(cli.app, ["status"], env={"COLUMNS": "200"})
+    assert result.exit_code == 0, result.output
+    assert "current_project" in result.output and "APJ-1234567" in result.output
+    result = runner.invoke(cli.app, ["activate", "DO-4256663"], env={"COLUMNS": "200"})
+    assert "already symlinked" in result.output
+    monkeypatch.setattr(cli, "all_symlink_names", failing)
+    records = json.loads(runner.invoke(cli.app, ["status", "--format", "json"]).output)
+    assert [r["name"] for r in records["active"]] == ["DO-4256663"]
+    assert {r["name"]: r["symlinks"] for r in records["projects"]}["DO-4256663"] == ["current_project"]
+
+  monkeypatch.undo()
+  result = runner.invoke(cli.app, ["ls"], env={"COLUMNS": "200"})  # No daemon - in-process as usual
+  assert "APJ-1234567" in result.output
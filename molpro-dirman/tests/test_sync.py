@@ -0,0 +1,95 @@
+# Test serial registry sync, against the local stand-in registry
+
+from molpro_dirman import errors
+from . import sync, sync_server, local_write
+from tests.fixtures import *
+
+
+@pytest.fixture
+def registry():
+  server = sync_server.RegistryServer()
+  server.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+def make_projects(base: Path, names: list[str]) -> None:
+  for name in names:
+    os.mkdir(base / name)
+    (base / name / "README.md").write_text(f"# Title of {name}\n## {name}\n")
+
+
+def test_sync_pushes_local_serials(structured_dir, mock_base_directories, registry):
+  mock_base_directories(structured_dir)
+  (structured_dir / "home" / "Projects" / "DO-4256663" / "README.md").write_text("# MolPro Dirman\n## DO-4256663\n")
+
+  report = sync.sync(registry.url)
+  assert report.pushed == ["ABCDEF-4567890", "APJ-1234567", "DO-4256663", "DT-1234567", "T-1234567"]
+  assert report.pulled == []
+  assert registry.store.serials["DO-4256663"]["title"] == "MolPro Dirman"
+  assert registry.store.serials["T-1234567"]["title"] == ""
+
+
+def test_sync_thousands_in_few_round_trips(structured_dir, mock_base_directories, registry):
+  mock_base_directories(structured_dir)
+  make_projects(structured_dir / "home" / "Projects", [f"D-{n:07d}" for n in range(5000)])
+
+  report = sync.sync(registry.url)
+  assert len(report.pushed) == 5005
+  assert report.round_trips == 1 + 3  # One (empty) pull page, then 3 push batches of up to 2000
+  assert registry.request_count == report.round_trips
+
+  # Nothing changed - a single pull round trip
+  report = sync.sync(registry.url)
+  assert report.pushed == [] and report.pulled == []
+  assert report.round_trips == 1
+
+
+def test_sync_pulls_remote_serials(structured_dir, mock_base_directories, registry, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.setattr(sync, "PULL_PAGE_SIZE", 100)
+  registry.store.register([{"name": f"S-{n:07d}", "title": "Elsewhere"} for n in range(250)])
+
+  report = sync.sync(registry.url)
+  assert len(report.pulled) == 250
+  assert report.round_trips == 3 + 1
+
+  # Only the delta is pulled next time
+  registry.store.register([{"name": "S-7777777", "title": "New"}])
+  report = sync.sync(registry.url)
+  assert report.pulled == ["S-7777777"]
+  assert report.round_trips == 1
+
+
+def test_sync_dry_run(structured_dir, mock_base_directories, registry):
+  mock_base_directories(structured_dir)
+  report = sync.sync(registry.url, dry_run=True)
+  assert len(report.pushed) == 5
+  assert registry.store.serials == {}
+  assert sync.SyncState.load(registry.url).serials == {}
+
+
+def test_allocator_avoids_registry_serials(structured_dir, mock_base_directories, registry, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.setattr(local_write, "SERIAL_SPACE", 100)
+  monkeypatch.setenv("MPDMAN_REGISTRY_URL", registry.url)
+  registry.store.register([{"name": f"S-{n:07d}"} for n in range(1, 99)])
+  sync.sync()
+
+  assert local_write.SerialAllocator(['S']).allocate() == 99
+
+
+def test_sync_errors(structured_dir, mock_base_directories, monkeypatch):
+  mock_base_directories(structured_dir)
+  monkeypatch.delenv("MPDMAN_REGISTRY_URL", raising=False)
+  with pytest.raises(errors.RegistryError):
+    sync.sync()
+  with pytest.raises(errors.RegistryError):
+    sync.sync("ftp://example.com")
+
+  server = sync_server.RegistryServer()
+  url = server.url
+  server.server_close()
+  with pytest.raises(errors.RegistryError):
+    sync.sync(url)
@@ -0,0 +1,137 @@
+# Test directory walking helpers
+
+from datetime import datetime, timedelta
+
+from . import walk
+from tests.fixtures import *
+
+
+def set_times(path: Path, days_ago: int) -> float:
+  timestamp = (datetime.now() - timedelta(days=days_ago)).timestamp()
+  os.utime(path, (timestamp, timestamp), follow_symlinks=False)
+  return timestamp
+
+
+def test_walk_activity_matches_full_walk(populated_dir):
+  for key in (populated_dir / "home" / "Projects").iterdir():
+    children = list(key.rglob('*'))
+    expected = max(max(obj.lstat().st_atime, obj.lstat().st_mtime) for obj in children) if children else None
+    assert walk.walk_activity(key, patterns=()) == expected
+
+
+def test_walk_activity_empty(structured_dir):
+  assert walk.walk_activity(structured_dir / "home" / "Projects" / "T-1234567") is None
+
+
+def test_walk_activity_prunes_ignored(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  (project / "README.md").write_text("awoo")
+  readme_time = set_times(project / "README.md", 30)
+
+  os.makedirs(project / "node_modules" / "leftpad")
+  (project / "node_modules" / "leftpad" / "index.js").write_text("")
+  os.makedirs(project / "src" / ".git" / "objects" / "ab")
+  (project / "src" / ".git" / "objects" / "ab" / "cdef").write_text("")
+  for key in [
+    project / "node_modules" / "leftpad" / "index.js",
+    project / "node_modules" / "leftpad",
+    project / "node_modules",
+    project / "src" / ".git" / "objects" / "ab" / "cdef",
+    project / "src" / ".git" / "objects" / "ab",
+    project / "src" / ".git" / "objects",
+  ]:
+    set_times(key, 1)
+
+  git_time = set_times(project / "src" / ".git", 10)
+  set_times(project / "src", 60)
+
+  assert walk.walk_activity(project) == git_time
+  assert walk.walk_activity(project, patterns=()) > git_time
+  assert walk.walk_activity(project, patterns=["src", "node_modules"]) == readme_time
+
+
+def test_walk_activity_does_not_follow_symlinks(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  other = structured_dir / "home" / "Documents"
+  (other / "recent").write_text("")
+  set_times(other / "recent", 0)
+
+  os.symlink(other, project / "docs", target_is_directory=True)
+  link_time = set_times(project / "docs", 20)
+  assert walk.walk_activity(project) == link_time
+
+
+def test_ignore_patterns(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  assert walk.ignore_patterns(project) == walk.DEFAULT_IGNORE_PATTERNS
+
+  (project / walk.IGNORE_FILENAME).write_text("# Comment\n\nbuild/\n  renders/cache \n")
+  assert walk.ignore_patterns(project) == walk.DEFAULT_IGNORE_PATTERNS + ("build", "renders/cache")
+
+
+def test_ignore_patterns_unreadable_file(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  (project / walk.IGNORE_FILENAME).write_bytes(b"\xff\xfe build\n")
+  assert walk.ignore_patterns(project) == walk.DEFAULT_IGNORE_PATTERNS
+  (project / walk.IGNORE_FILENAME).unlink()
+  (project / walk.IGNORE_FILENAME).mkdir()  # Read fails with IsADirectoryError, as it would with PermissionError
+  assert walk.ignore_patterns(project) == walk.DEFAULT_IGNORE_PATTERNS
+  assert walk.walk_activity(project) > 0
+
+
+def test_is_ignored():
+  patterns = ("node_modules", ".git/objects", "*-backups", "renders/cache")
+  assert walk.is_ignored("node_modules", patterns)
+  assert walk.is_ignored("web/node_modules", patterns)
+  assert walk.is_ignored(".git/objects", patterns)
+  assert walk.is_ignored("src/.git/objects", patterns)
+  assert walk.is_ignored("pcb/board-backups", patterns)
+  assert walk.is_ignored("renders/cache", patterns)
+  assert not walk.is_ignored(".git", patterns)
+  assert not walk.is_ignored("objects", patterns)
+  assert not walk.is_ignored("cache", patterns)
+  assert not walk.is_ignored("node_modules_notes", patterns)
+
+
+def test_bounded_walk_depth(tmp_path):
+  project = tmp_path / "D-0000001"
+  os.makedirs(project / "a" / "b")
+  (project / "a" / "b" / "deep").write_text("")
+
+  def reset_times() -> list[float]:  # Walking a directory can bump its atime, so reset before each walk
+    return [set_times(project / "a" / "b" / "deep", 1), set_times(project / "a" / "b", 5), set_times(project / "a", 10)]
+
+  deep_time, b_time, a_time = reset_times()
+  assert walk.bounded_walk_activity(project, max_depth=1) == (a_time, True)
+  deep_time, b_time, a_time = reset_times()
+  assert walk.bounded_walk_activity(project, max_depth=2) == (b_time, True)
+  deep_time, b_time, a_time = reset_times()
+  assert walk.bounded_walk_activity(project) == (deep_time, True)
+  deep_time, b_time, a_time = reset_times()
+  assert walk.approximate_activity(project, max_depth=1) == (a_time, True)
+
+
+def test_bounded_walk_deadline(structured_dir):
+  project = structured_dir / "home" / "Projects" / "DO-4256663"
+  (project / "README.md").write_text("")
+  readme_time = set_times(project / "README.md", 3)
+
+  assert walk.bounded_walk_activity(project, deadline=0) == (None, False)  # Already expired
+  timestamp, complete = walk.approximate_activity(project, budget_ms=60_000)
+  assert complete and timestamp == readme_time
+
+  timestamp, complete = walk.approximate_activity(project, budget_ms=1e-9)
+  assert not complete
+  assert timestamp == walk.entry_activity(os.stat(project))  # Nothing walked - falls back to the directory itself
+
+
+def test_approximate_activities_keeps_order(datetimed_dir):
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  expected = [(walk.walk_activity(path) or walk.entry_activity(os.stat(path)), True) for path in paths]
+  assert walk.approximate_activities(paths, budget_ms=60_000, jobs=4) == expected
+  assert walk.approximate_activities(paths, jobs=1) == expected
+
+
+def test_map_per_root(archive_root, structured_dir):
+  paths = sorted((structured_dir / "home" / "Projects").iterdir()) + sorted(archive_root.iterdir())
+  assert dict(walk.map_per_root(lambda path: path.name, paths, jobs=2)) == {path: path.name for path in paths}
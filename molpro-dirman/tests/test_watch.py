@@ -0,0 +1,135 @@
+# Test the watcher keeping the activity index live
+
+import time
+import threading
+from shutil import rmtree
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from . import watch, index, local_read
+from tests.fixtures import *
+
+
+def wait_for(predicate, timeout: float = 10) -> None:
+  deadline = time.monotonic() + timeout
+  while not predicate():
+    assert time.monotonic() < deadline, "Timed out waiting for the watcher"
+    time.sleep(0.05)
+
+
+@contextmanager
+def running_watcher(**kwargs):
+  "A watcher running in a background thread, started (and its projects indexed) before this yields"
+  stop, started = threading.Event(), threading.Event()
+  watchers, errors = [], []
+
+  def run():
+    try:
+      with watch.start_watcher(**kwargs) as watcher:
+        watchers.append(watcher)
+        started.set()
+        watcher.run(stop)
+    except BaseException as e:
+      errors.append(e)
+      started.set()
+
+  thread = threading.Thread(target=run)
+  thread.start()
+  assert started.wait(10)
+  try:
+    assert not errors, errors
+    yield watchers[0]
+  finally:
+    stop.set()
+    thread.join(10)
+  assert not errors, errors
+
+
+def live(idx: index.ActivityIndex) -> set[str]:
+  return {Path(path).parts[-1] for path in idx.live_timestamps()}
+
+
+def future_timestamp(days: int) -> float:
+  return (datetime.now() + timedelta(days=days)).timestamp()
+
+
+def test_watcher_keeps_index_live(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  project = datetimed_dir / "home" / "Projects" / "DT-1234567"
+  with running_watcher() as watcher, index.ActivityIndex() as idx:
+    assert isinstance(watcher, watch.InotifyWatcher)
+    wait_for(lambda: len(live(idx)) == 5)
+
+    edited = future_timestamp(500)  # Edited in place - the directory's mtime doesn't change
+    with open(project / "README.md", "r+b") as fd:
+      fd.write(b"#")
+    os.utime(project / "README.md", (edited, edited))
+    wait_for(lambda: idx.cached_timestamp(project) == edited)
+
+    created = future_timestamp(600)  # In a new subdirectory, which is watched as it appears
+    os.mkdir(project / "renders")
+    (project / "renders" / "render.png").write_bytes(b"png")
+    os.utime(project / "renders" / "render.png", (created, created))
+    wait_for(lambda: idx.cached_timestamp(project) == created)
+    assert idx.project_timestamps([project]) == [created]
+
+  with index.ActivityIndex() as idx:
+    assert idx.live_timestamps() == {}  # Stopped - projects are walked again
+
+
+def test_watcher_follows_projects_and_symlinks(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  projects = datetimed_dir / "home" / "Projects"
+  assert local_read.Project.all_symlinks() == []  # Builds the (empty) symlink manifest
+  with running_watcher(), index.ActivityIndex() as idx:
+    wait_for(lambda: len(live(idx)) == 5)
+    os.mkdir(projects / "S-7654321")
+    rmtree(projects / "T-1234567")
+    wait_for(lambda: "S-7654321" in live(idx) and "T-1234567" not in live(idx))
+    assert idx.cached_timestamp(projects / "T-1234567") is None
+
+    os.symlink(projects / "DO-4256663", datetimed_dir / "home" / "project_DO-4256663")  # Made by hand, not mpdman
+    wait_for(lambda: local_read.Project.all_symlinks() == [datetimed_dir / "home" / "project_DO-4256663"])
+
+
+def test_watcher_degrades_past_watch_budget(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  with running_watcher(max_watches=3) as watcher, index.ActivityIndex() as idx:  # The root and symlink dir, plus one
+    wait_for(lambda: len(live(idx)) == 1)
+    assert len(watcher.unwatched) == 4
+    assert "didn't fit" in watcher.describe()
+
+    paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+    assert idx.project_timestamps(paths) == [idx.project_timestamp(path) for path in paths]  # The rest are walked
+
+
+def test_polling_watcher(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  project = datetimed_dir / "home" / "Projects" / "DO-4256663"
+  with running_watcher(poll_interval=0.1) as watcher, index.ActivityIndex() as idx:
+    assert isinstance(watcher, watch.PollingWatcher)
+    wait_for(lambda: len(live(idx)) == 5)
+
+    created = future_timestamp(500)
+    (project / "new_file").write_text("awoo")
+    os.utime(project / "new_file", (created, created))
+    wait_for(lambda: idx.cached_timestamp(project) == created)
+
+
+def test_reindex_closes_worker_connections(datetimed_dir, mock_base_directories):
+  mock_base_directories(datetimed_dir)
+  paths = sorted((datetimed_dir / "home" / "Projects").iterdir())
+  with index.ActivityIndex() as idx:
+    watcher = watch.PollingWatcher(idx)
+    for _ in range(20):
+      watch.reindex(idx, paths)
+      watcher.poll()
+    assert len(idx._connections) == 1  # Just this thread's - each batch's workers are gone, and so are theirs
+
+
+def test_only_one_watcher(structured_dir, mock_base_directories):
+  mock_base_directories(structured_dir)
+  with running_watcher(poll_interval=60):
+    with pytest.raises(watch.WatcherAlreadyRunning):
+      with watch.start_watcher(poll_interval=60):
+        pass